@@ -0,0 +1 @@
+"""Бенчмарки конвейера обработки отзывов с локальными заглушками внешних API"""
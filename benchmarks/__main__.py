@@ -0,0 +1,91 @@
+"""
+Запуск бенчмарков конвейера обработки отзывов
+
+    python -m benchmarks                                  # все сценарии на 1k/10k/100k отзывов
+    python -m benchmarks --scenario handler --reviews 1000 10000 --workers 16
+    python -m benchmarks --llm-latency 1.5 --error-rate 0.02 --rate-limit-rate 0.01 --json bench.json
+
+Каждый прогон выполняется в отдельном процессе с временной БД, поэтому
+пиковая память и состояние БД не переходят между прогонами.
+"""
+from pathlib import Path
+from typing import List
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.environment import add_common_arguments, configure_environment, fault_profile
+from benchmarks.report import format_report
+
+SCENARIOS = ("handler", "scheduler")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Бенчмарки WB Reviews Agent")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--reviews", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="размеры наборов синтетических отзывов")
+    add_common_arguments(parser)
+    parser.add_argument("--run-one", nargs=2, metavar=("SCENARIO", "REVIEWS"), help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_one(args: argparse.Namespace):
+    """Один прогон в текущем процессе (вызывается в дочернем процессе)"""
+    scenario, count = args.run_one[0], int(args.run_one[1])
+    with tempfile.TemporaryDirectory(prefix="wb_bench_") as workdir:
+        sockets = configure_environment(workdir, args.workers, args.keep_rate_limits, args.overrides)
+        from benchmarks.scenarios import run_scenario
+        result = asyncio.run(run_scenario(
+            scenario, count,
+            wb=fault_profile(args, args.wb_latency),
+            llm=fault_profile(args, args.llm_latency),
+            telegram=fault_profile(args, args.tg_latency),
+            sockets=sockets,
+            outbox_timeout=args.outbox_timeout
+        ))
+    Path(args.result_file).write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+
+
+def main(argv: List[str]):
+    """Запуск выбранных сценариев, каждый прогон - в отдельном процессе"""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.run_one:
+        run_one(args)
+        return
+    
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = []
+    for scenario in scenarios:
+        for count in args.reviews:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+                result_path = result_file.name
+            try:
+                print(f"▶ {scenario}: {count} отзывов...", flush=True)
+                process = subprocess.run(
+                    [sys.executable, "-m", "benchmarks", *argv,
+                     "--run-one", scenario, str(count), "--result-file", result_path]
+                )
+                if process.returncode != 0:
+                    print(f"✗ {scenario}: {count} отзывов - прогон завершился с кодом {process.returncode}")
+                    continue
+                results.append(json.loads(Path(result_path).read_text(encoding="utf-8")))
+            finally:
+                os.unlink(result_path)
+    
+    print(format_report(results))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nРезультаты сохранены: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
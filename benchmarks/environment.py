@@ -0,0 +1,85 @@
+"""Окружение прогона бенчмарка: адреса заглушек, временная БД, лимиты"""
+from typing import Dict, List
+import argparse
+import os
+
+from benchmarks.fake_services import FaultProfile, bind_socket, socket_url
+
+
+def add_common_arguments(parser: argparse.ArgumentParser):
+    """Аргументы заглушек и настроек приложения, общие для бенчмарков и воспроизведения"""
+    parser.add_argument("--workers", type=int, default=32, help="REVIEW_PROCESSING_WORKERS")
+    parser.add_argument("--wb-latency", type=float, default=0.05, help="задержка заглушки WB, секунды")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="задержка заглушки OpenRouter, секунды")
+    parser.add_argument("--tg-latency", type=float, default=0.05, help="задержка заглушки Telegram, секунды")
+    parser.add_argument("--jitter", type=float, default=0.5, help="случайная добавка к задержке, доля от задержки")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500 во всех заглушках")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429 во всех заглушках")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After в ответах 429, секунды")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="не снимать лимиты частоты запросов из конфигурации")
+    parser.add_argument("--outbox-timeout", type=float, default=300.0,
+                        help="предельное ожидание разбора очереди публикации, секунды")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="переопределение настройки приложения (можно повторять)")
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в JSON")
+
+
+def fault_profile(args: argparse.Namespace, latency: float) -> FaultProfile:
+    """Профиль заглушки из аргументов"""
+    return FaultProfile(
+        latency=latency,
+        jitter=latency * args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after
+    )
+
+
+def configure_environment(workdir: str, workers: int, keep_rate_limits: bool = False,
+                          overrides: List[str] = ()) -> Dict:
+    """
+    Настройки приложения для прогона (до импорта config)
+    
+    Args:
+        workdir: Временный каталог для БД и кэша ответов
+        workers: REVIEW_PROCESSING_WORKERS
+        keep_rate_limits: Не снимать лимиты частоты запросов
+        overrides: Переопределения настроек в виде KEY=VALUE
+    
+    Returns:
+        Сокеты заглушек по именам wb, llm, telegram
+    """
+    sockets = {name: bind_socket() for name in ("wb", "llm", "telegram")}
+    env = {
+        "WB_API_URL": socket_url(sockets["wb"]),
+        "OPENROUTER_API_URL": socket_url(sockets["llm"]) + "/api/v1/chat/completions",
+        "TELEGRAM_API_BASE_URL": socket_url(sockets["telegram"]) + "/bot",
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "RESPONSE_CACHE_PATH": f"{workdir}/response_cache.db",
+        "REVIEW_PROCESSING_WORKERS": str(workers),
+        "OUTBOX_WORKERS": str(max(2, workers // 4)),
+        "OUTBOX_BACKOFF_BASE": "0.5",
+        "OUTBOX_BACKOFF_MAX": "5",
+        "OUTBOX_POLL_INTERVAL": "0.2",
+        "TELEGRAM_DIGEST_ENABLED": "false",
+        "SCHEDULER_PROFILE_ENABLED": "false",
+        "TRAFFIC_RECORD_PATH": ""
+    }
+    if not keep_rate_limits:
+        # 0 - без ограничения частоты: меряется сам конвейер, а не лимиты
+        env.update({
+            "WB_READ_RATE_LIMIT": "0",
+            "WB_WRITE_RATE_LIMIT": "0",
+            "OPENROUTER_RATE_LIMIT": "0",
+            "TELEGRAM_CHAT_RATE_LIMIT": "0",
+            "TELEGRAM_GROUP_RATE_LIMIT": "0"
+        })
+    for override in overrides:
+        key, _, value = override.partition("=")
+        env[key.strip()] = value.strip()
+    os.environ.update(env)
+    for key in ("WB_API_KEY", "OPENROUTER_API_KEY", "TELEGRAM_BOT_TOKEN"):
+        os.environ.setdefault(key, "bench")
+    os.environ.setdefault("TELEGRAM_CHAT_ID", "-1001")
+    return sockets
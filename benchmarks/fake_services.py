@@ -0,0 +1,276 @@
+"""Локальные заглушки WB API, OpenRouter и Telegram Bot API для бенчмарков"""
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+import asyncio
+import json
+import random
+import re
+import socket
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+WORDS = (
+    "товар пришел быстро упаковка целая качество отличное размер подошел цвет как на фото "
+    "ткань тонкая шов разошелся после стирки запах сильный курьер опоздал доставка долгая "
+    "продавец ответил вернуть деньги брак не соответствует описанию рекомендую всем спасибо"
+).split()
+
+
+class FaultProfile:
+    """Задержка и доля ошибок заглушки"""
+    
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: int = 1):
+        """
+        Args:
+            latency: Задержка ответа, секунды
+            jitter: Случайная добавка к задержке (0..jitter), секунды
+            error_rate: Доля ответов 500
+            rate_limit_rate: Доля ответов 429
+            retry_after: Retry-After в ответах 429, секунды
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+    
+    async def delay(self):
+        """Имитация задержки сети и обработки"""
+        await asyncio.sleep(self.latency + (random.random() * self.jitter if self.jitter else 0.0))
+    
+    def fault(self) -> Optional[int]:
+        """Код ошибки для очередного запроса (429, 500) или None"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+def synthetic_reviews(count: int, seed: int = 42, hours: float = 1.0) -> List[Dict]:
+    """
+    Синтетические отзывы в формате WB API, по возрастанию даты
+    
+    Около трети отзывов - отрицательные, часть положительных - без текста
+    (для них срабатывают шаблонные ответы).
+    
+    Args:
+        count: Количество отзывов
+        seed: Зерно генератора (одинаковый набор между запусками)
+        hours: Отзывы равномерно распределены за последние hours часов
+    
+    Returns:
+        Список отзывов
+    """
+    rng = random.Random(seed)
+    started = datetime.now(timezone.utc) - timedelta(hours=hours)
+    step = hours * 3600 / max(count, 1)
+    reviews = []
+    for index in range(count):
+        rating = rng.choices((1, 2, 3, 4, 5), weights=(10, 8, 12, 20, 50))[0]
+        has_text = rating < 4 or rng.random() > 0.3
+        reviews.append({
+            "id": f"bench-{seed}-{index}",
+            "productId": str(1000 + index % 500),
+            "nmId": 100000 + index % 500,
+            "supplierArticle": f"ART-{index % 500}",
+            "rating": rating,
+            "text": " ".join(rng.choices(WORDS, k=rng.randint(5, 80))) if has_text else "",
+            "pros": " ".join(rng.choices(WORDS, k=rng.randint(0, 10))) if has_text else "",
+            "cons": " ".join(rng.choices(WORDS, k=rng.randint(0, 10))) if rating < 4 else "",
+            "author": f"Покупатель {index}",
+            "createdDate": (started + timedelta(seconds=index * step)).isoformat().replace("+00:00", "Z")
+        })
+    return reviews
+
+
+def _with_faults(app: FastAPI, profile: FaultProfile, error_body=None):
+    """Задержка и ошибки для всех маршрутов заглушки"""
+    
+    @app.middleware("http")
+    async def faults(request: Request, call_next):
+        await profile.delay()
+        status = profile.fault()
+        if status == 429:
+            body = error_body(429, profile.retry_after) if error_body else {"detail": "Too Many Requests"}
+            return JSONResponse(body, status_code=429, headers={"Retry-After": str(profile.retry_after)})
+        if status == 500:
+            body = error_body(500, None) if error_body else {"detail": "Internal Server Error"}
+            return JSONResponse(body, status_code=500)
+        return await call_next(request)
+    
+    return app
+
+
+class FakeWB:
+    """Заглушка WB API: выдача отзывов (take/skip/dateFrom) и прием ответов"""
+    
+    def __init__(self, reviews: List[Dict], profile: FaultProfile):
+        self.reviews = reviews
+        self.timestamps = [
+            int(datetime.fromisoformat(review["createdDate"].replace("Z", "+00:00")).timestamp())
+            for review in reviews
+        ]
+        self.answered: Set[str] = set()
+        self.app = _with_faults(FastAPI(), profile)
+        self.app.add_api_route("/api/v1/feedbacks", self.feedbacks, methods=["GET"])
+        self.app.add_api_route("/api/v1/feedbacks/{review_id}/answer", self.answer, methods=["POST"])
+    
+    async def feedbacks(self, take: int = 1000, skip: int = 0, dateFrom: Optional[int] = None,
+                        isAnswered: str = "false"):
+        answered = isAnswered == "true"
+        start = bisect_left(self.timestamps, dateFrom) if dateFrom else 0
+        page: List[Dict] = []
+        for review in islice(self.reviews, start, None):
+            if (review["id"] in self.answered) != answered:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            page.append(review)
+            if len(page) >= take:
+                break
+        return {"data": {"feedbacks": page}, "error": False}
+    
+    async def answer(self, review_id: str, request: Request):
+        await request.json()
+        self.answered.add(review_id)
+        return {"data": None, "error": False}
+
+
+class FakeOpenRouter:
+    """
+    Заглушка OpenRouter: обычные, пакетные (JSON) и потоковые (SSE) ответы
+    
+    С записанными ответами (см. benchmarks.replay) отдает ответ на отзыв
+    с тем же рейтингом и выдерживает его записанное время генерации.
+    """
+    
+    BATCH_REVIEWS = re.compile(r"Отзывы \(JSON\):\n(.*?)\n\n", re.S)
+    RATING = re.compile(r"Рейтинг отзыва: (\d)")
+    
+    def __init__(self, profile: FaultProfile, reply: str = "Спасибо за отзыв! Нам очень жаль, что так вышло.",
+                 recorded: Optional[Dict[int, List[Tuple[str, float]]]] = None):
+        """
+        Args:
+            profile: Задержка и ошибки
+            reply: Ответ без записанного трафика
+            recorded: Записанные ответы по рейтингу: [(текст, время генерации в секундах), ...]
+        """
+        self.reply = reply
+        self.recorded = {rating: replies for rating, replies in (recorded or {}).items() if replies}
+        self.app = _with_faults(FastAPI(), profile)
+        self.app.add_api_route("/api/v1/chat/completions", self.completions, methods=["POST"])
+    
+    def _pick(self, rating: Optional[int]) -> Tuple[str, float]:
+        """Ответ и время генерации для отзыва с указанным рейтингом"""
+        if not self.recorded:
+            return self.reply, 0.0
+        replies = self.recorded.get(rating) or random.choice(list(self.recorded.values()))
+        return random.choice(replies)
+    
+    async def completions(self, request: Request):
+        payload = await request.json()
+        prompt = payload["messages"][-1]["content"]
+        
+        if payload.get("response_format", {}).get("type") == "json_object":
+            match = self.BATCH_REVIEWS.search(prompt)
+            items = json.loads(match.group(1)) if match else []
+            replies = {item["id"]: self._pick(item.get("rating")) for item in items}
+            await asyncio.sleep(max((latency for _, latency in replies.values()), default=0.0))
+            content = json.dumps({review_id: text for review_id, (text, _) in replies.items()}, ensure_ascii=False)
+            return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+        
+        match = self.RATING.search(prompt)
+        text, latency = self._pick(int(match.group(1)) if match else None)
+        
+        if payload.get("stream"):
+            async def events():
+                words = text.split(" ")
+                for word in words:
+                    await asyncio.sleep(latency / len(words))
+                    yield f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        
+        await asyncio.sleep(latency)
+        return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+class FakeTelegram:
+    """Заглушка Telegram Bot API (getMe, sendMessage, editMessageText)"""
+    
+    def __init__(self, profile: FaultProfile):
+        self.sent = 0
+        self.edited = 0
+        self.app = _with_faults(FastAPI(), profile, error_body=self._error)
+        self.app.add_api_route("/bot{token}/{method}", self.call, methods=["GET", "POST"])
+    
+    @staticmethod
+    def _error(status: int, retry_after: Optional[int]) -> Dict:
+        if status == 429:
+            return {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                    "parameters": {"retry_after": retry_after}}
+        return {"ok": False, "error_code": status, "description": "Internal Server Error"}
+    
+    def _message(self, message_id: int, chat_id, text: str) -> Dict:
+        return {"message_id": message_id, "date": int(time.time()), "text": text,
+                "chat": {"id": int(chat_id), "type": "group", "title": "bench"}}
+    
+    async def call(self, token: str, method: str, request: Request):
+        # PTB отправляет параметры как application/x-www-form-urlencoded
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "sendMessage":
+            self.sent += 1
+            result = self._message(self.sent, form.get("chat_id", 0), form.get("text", ""))
+        elif method == "editMessageText":
+            self.edited += 1
+            result = self._message(int(form.get("message_id", 0)), form.get("chat_id", 0), form.get("text", ""))
+        else:
+            result = True
+        return {"ok": True, "result": result}
+
+
+def bind_socket() -> socket.socket:
+    """Сокет на свободном локальном порту (порт известен до запуска сервера)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def socket_url(sock: socket.socket) -> str:
+    """Базовый адрес сервера на сокете"""
+    host, port = sock.getsockname()
+    return f"http://{host}:{port}"
+
+
+class FakeServer:
+    """Uvicorn-сервер заглушки в текущем цикле событий"""
+    
+    def __init__(self, app: FastAPI, sock: socket.socket):
+        self.sock = sock
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off", access_log=False))
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Запуск и ожидание готовности"""
+        self._task = asyncio.create_task(self.server.serve(sockets=[self.sock]))
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+    
+    async def stop(self):
+        """Остановка сервера"""
+        self.server.should_exit = True
+        if self._task:
+            await self._task
@@ -0,0 +1,192 @@
+"""
+Воспроизведение записанного трафика (TRAFFIC_RECORD_PATH) через конвейер обработки
+
+    python -m benchmarks.replay traffic.jsonl.gz --speed 60
+    python -m benchmarks.replay traffic.jsonl.gz --speed 10 --workers 16 --window 5 --json replay.json
+
+Отзывы поступают в ReviewHandler в темпе записи, ускоренном в --speed раз:
+момент поступления - дата создания отзыва (--clock created) или момент,
+когда он был получен из WB (--clock captured). Отзывы, пришедшие за одно
+окно --window, обрабатываются одним пакетом - как страница при загрузке
+из WB. Заглушка OpenRouter отдает записанные ответы с записанным временем
+генерации; WB и Telegram - заглушки с задержками из аргументов.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.environment import add_common_arguments, configure_environment, fault_profile
+from benchmarks.report import format_report
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay",
+                                     description="Воспроизведение записанного трафика WB Reviews Agent")
+    parser.add_argument("path", help="файл записи (gzip JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно темпа записи")
+    parser.add_argument("--clock", choices=("created", "captured"), default="created",
+                        help="момент поступления отзыва: дата создания или момент получения из WB")
+    parser.add_argument("--window", type=float, default=1.0,
+                        help="окно сбора отзывов в пакет, секунды времени воспроизведения")
+    parser.add_argument("--limit", type=int, help="воспроизвести только первые N отзывов")
+    add_common_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _arrival(record: Dict, clock: str) -> float:
+    """Момент поступления отзыва (Unix-время)"""
+    if clock == "created":
+        value = record["feedback"].get("createdDate") or record["feedback"].get("date")
+        try:
+            created = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            return created.timestamp()
+        except ValueError:
+            pass
+    return record["t"]
+
+
+def load_traffic(path: str, clock: str, limit: Optional[int] = None) -> Tuple[List[Tuple[float, Dict]], Dict]:
+    """
+    Отзывы в порядке поступления и записанные ответы ИИ по рейтингу
+    
+    Один и тот же отзыв мог быть записан несколько раз (повторная загрузка
+    страницы) - воспроизводится первое появление.
+    
+    Returns:
+        ([(момент поступления, отзыв WB), ...], {рейтинг: [(ответ, время генерации, с), ...]})
+    """
+    from services.traffic_recorder import read_traffic, WB_FEEDBACK, LLM_RESPONSE
+    
+    arrivals: Dict[str, Tuple[float, Dict]] = {}
+    replies: Dict[int, List[Tuple[str, float]]] = {}
+    for record in read_traffic(path):
+        if record["kind"] == WB_FEEDBACK:
+            arrivals.setdefault(record["feedback"]["id"], (_arrival(record, clock), record["feedback"]))
+        elif record["kind"] == LLM_RESPONSE and record.get("text"):
+            replies.setdefault(record["rating"], []).append((record["text"], record["latency_ms"] / 1000))
+    feedbacks = sorted(arrivals.values(), key=lambda item: item[0])
+    return feedbacks[:limit] if limit else feedbacks, replies
+
+
+def describe_traffic(feedbacks: List[Tuple[float, Dict]]) -> Dict:
+    """Распределение рейтингов, длина текстов и длительность записи"""
+    if not feedbacks:
+        return {"reviews": 0}
+    lengths = sorted(len(feedback.get("text") or "") for _, feedback in feedbacks)
+    return {
+        "reviews": len(feedbacks),
+        "recorded_seconds": round(feedbacks[-1][0] - feedbacks[0][0], 1),
+        "ratings": dict(sorted(Counter(feedback.get("rating") for _, feedback in feedbacks).items())),
+        "text_length_p50": lengths[len(lengths) // 2],
+        "text_length_max": lengths[-1]
+    }
+
+
+async def replay(feedbacks: List[Tuple[float, Dict]], replies: Dict, args: argparse.Namespace,
+                 sockets: Dict) -> Dict:
+    """
+    Воспроизведение отзывов через ReviewHandler
+    
+    Пакеты ставятся в очередь по расписанию записи, а обработчик разбирает
+    их по одному; отставание - сколько пакет ждал начала обработки.
+    """
+    from database.db import AsyncSessionLocal
+    from handlers.review_handler import ReviewHandler
+    from benchmarks.fake_services import FakeOpenRouter, FakeTelegram, FakeWB
+    from benchmarks.scenarios import bench_services, collect_results, drain_outbox
+    
+    fakes = {
+        "wb": FakeWB([], fault_profile(args, args.wb_latency)),
+        "llm": FakeOpenRouter(fault_profile(args, args.llm_latency if not replies else 0.0), recorded=replies),
+        "telegram": FakeTelegram(fault_profile(args, args.tg_latency))
+    }
+    queue: asyncio.Queue = asyncio.Queue()
+    lags: List[float] = []
+    
+    async def produce(started: float):
+        first = feedbacks[0][0]
+        batch: List[Dict] = []
+        window_end = args.window
+        for arrival, feedback in feedbacks:
+            offset = (arrival - first) / args.speed
+            if offset >= window_end and batch:
+                await asyncio.sleep(max(0.0, started + window_end - time.perf_counter()))
+                queue.put_nowait((time.perf_counter(), batch))
+                batch = []
+                window_end = (offset // args.window + 1) * args.window
+            batch.append(feedback)
+        if batch:
+            await asyncio.sleep(max(0.0, started + window_end - time.perf_counter()))
+            queue.put_nowait((time.perf_counter(), batch))
+        queue.put_nowait(None)
+    
+    async with bench_services({name: fake.app for name, fake in fakes.items()}, sockets) as (services, recorder):
+        started = time.perf_counter()
+        producer = asyncio.create_task(produce(started))
+        backlog = 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            queued_at, batch = item
+            lags.append(time.perf_counter() - queued_at)
+            backlog = max(backlog, queue.qsize())
+            async with AsyncSessionLocal() as db:
+                await ReviewHandler(db, services).process_reviews(batch)
+        await producer
+        pipeline_seconds = time.perf_counter() - started
+        drain_seconds = await drain_outbox(args.outbox_timeout)
+    
+    return {
+        "scenario": f"replay x{args.speed:g}",
+        "reviews": len(feedbacks),
+        "workers": args.workers,
+        "pipeline_seconds": round(pipeline_seconds, 2),
+        "replay_seconds": round((feedbacks[-1][0] - feedbacks[0][0]) / args.speed, 2),
+        "max_lag_seconds": round(max(lags, default=0.0), 2),
+        "max_backlog_batches": backlog,
+        "outbox_drain_seconds": round(drain_seconds, 2),
+        **await collect_results(recorder, pipeline_seconds)
+    }
+
+
+def main(argv: List[str]):
+    """Загрузка записи и воспроизведение"""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    with tempfile.TemporaryDirectory(prefix="wb_replay_") as workdir:
+        # config читается при первом импорте - окружение готовится до загрузки записи
+        sockets = configure_environment(workdir, args.workers, args.keep_rate_limits, args.overrides)
+        feedbacks, replies = load_traffic(args.path, args.clock, args.limit)
+        if not feedbacks:
+            print(f"В {args.path} нет записанных отзывов")
+            return
+        traffic = describe_traffic(feedbacks)
+        print(f"▶ Воспроизведение: {json.dumps(traffic, ensure_ascii=False)}, "
+              f"записанных ответов ИИ: {sum(len(items) for items in replies.values())}", flush=True)
+        result = asyncio.run(replay(feedbacks, replies, args, sockets))
+    result["traffic"] = traffic
+    
+    print(format_report([result]))
+    print(f"   отставание от записи: до {result['max_lag_seconds']}с, "
+          f"пакетов в очереди: до {result['max_backlog_batches']}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nРезультаты сохранены: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
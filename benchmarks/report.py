@@ -0,0 +1,83 @@
+"""Сбор замеров и отчет бенчмарков"""
+from typing import Dict, List, Sequence
+import math
+import resource
+import sys
+
+
+def percentile(values: Sequence[float], share: float) -> float:
+    """
+    Перцентиль отсортированной выборки (ближайший ранг)
+    
+    Args:
+        values: Отсортированные значения
+        share: Доля от 0 до 1 (0.95 - p95)
+    
+    Returns:
+        Значение перцентиля (0 для пустой выборки)
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(share * len(values)) - 1))
+    return values[index]
+
+
+def summarize(values: List[float]) -> Dict:
+    """Количество, p50/p95/p99 и максимум выборки в миллисекундах"""
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0
+    }
+
+
+class StageRecorder:
+    """Все замеры этапов за прогон (подписчик services.metrics.add_stage_observer)"""
+    
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+    
+    def observe(self, stage: str, duration: float):
+        """Учет замера этапа (секунды)"""
+        self.samples.setdefault(stage, []).append(duration * 1000)
+    
+    def summary(self) -> Dict[str, Dict]:
+        """Перцентили по каждому этапу"""
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def peak_rss_mb() -> float:
+    """Пиковый объем резидентной памяти процесса, МБ"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def format_report(results: List[Dict]) -> str:
+    """
+    Текстовый отчет по результатам прогонов
+    
+    Args:
+        results: Результаты run_scenario
+    
+    Returns:
+        Таблица пропускной способности и перцентилей этапов
+    """
+    lines = []
+    for result in results:
+        lines.append(
+            f"\n== {result['scenario']}: {result['reviews']} отзывов =="
+            f"\n   обработано: {result['routed']} за {result['pipeline_seconds']}с "
+            f"({result['reviews_per_second']} отз/с), очередь публикации разобрана за {result['outbox_drain_seconds']}с"
+            f"\n   пиковая память: {result['peak_rss_mb']} МБ, ошибок: {result['failures'] or 'нет'}"
+        )
+        lines.append(f"   {'этап':<14}{'кол-во':>9}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}{'max, мс':>11}")
+        for stage, stats in result["stages"].items():
+            lines.append(
+                f"   {stage:<14}{stats['count']:>9}{stats['p50_ms']:>11}{stats['p95_ms']:>11}"
+                f"{stats['p99_ms']:>11}{stats['max_ms']:>11}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""
+Сценарии бенчмарков
+
+Модуль импортирует конфигурацию приложения, поэтому импортируется только
+после configure_environment (адреса заглушек, временная БД, лимиты).
+"""
+from contextlib import asynccontextmanager
+from typing import Dict
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, select
+
+from config import settings
+from database.db import AsyncSessionLocal, init_db
+from database.models import Review, PublishJob, ReviewTimeline, ReviewStatus, PublishJobStatus
+from handlers.publish_worker import publish_worker_pool
+from handlers.review_handler import ReviewHandler
+from handlers.timeline import timeline_recorder
+from scheduler.tasks import check_new_reviews
+from services.container import ServiceContainer
+from services.http_clients import init_http_clients, close_http_clients
+from services.metrics import FAILURES, add_stage_observer, remove_stage_observer
+from services.response_cache import response_cache
+from benchmarks.fake_services import FakeOpenRouter, FakeServer, FakeTelegram, FakeWB, FaultProfile, synthetic_reviews
+from benchmarks.report import StageRecorder, peak_rss_mb, summarize
+
+logger = logging.getLogger(__name__)
+
+
+async def drain_outbox(timeout: float) -> float:
+    """
+    Ожидание разбора очереди публикации
+    
+    Returns:
+        Время ожидания в секундах
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        async with AsyncSessionLocal() as db:
+            pending = await db.scalar(
+                select(func.count(PublishJob.id)).where(
+                    PublishJob.status.in_((PublishJobStatus.PENDING, PublishJobStatus.IN_PROGRESS))
+                )
+            )
+        if not pending:
+            break
+        await asyncio.sleep(0.1)
+    else:
+        logger.warning(f"Очередь публикации не разобрана за {timeout:.0f}с")
+    return time.perf_counter() - started
+
+
+async def _review_latencies() -> Dict:
+    """Перцентили полного времени обработки отзыва (по хронологиям)"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(ReviewTimeline.total_ms))
+        return summarize([float(value) for value in result.scalars()])
+
+
+def _failures() -> Dict[str, int]:
+    """Счетчики ошибок по типам за прогон"""
+    return {
+        sample.labels["type"]: int(sample.value)
+        for metric in FAILURES.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total") and sample.value
+    }
+
+
+async def run_scenario(scenario: str, count: int, wb: FaultProfile, llm: FaultProfile, telegram: FaultProfile,
+                       sockets: Dict, outbox_timeout: float = 300.0) -> Dict:
+    """
+    Прогон сценария на синтетических отзывах
+    
+    handler - ReviewHandler.process_reviews со всем списком отзывов (без загрузки из WB);
+    scheduler - check_new_reviews: постраничная загрузка из заглушки WB и обработка.
+    В обоих сценариях после маршрутизации ожидается разбор очереди публикации.
+    
+    Args:
+        scenario: handler или scheduler
+        count: Количество синтетических отзывов
+        wb: Профиль задержек и ошибок заглушки WB
+        llm: Профиль заглушки OpenRouter
+        telegram: Профиль заглушки Telegram
+        sockets: Сокеты заглушек по именам wb, llm, telegram (см. configure_environment)
+        outbox_timeout: Предельное ожидание разбора очереди публикации, секунды
+    
+    Returns:
+        Пропускная способность, перцентили этапов, пиковая память и ошибки
+    """
+    reviews = synthetic_reviews(count)
+    fake_wb = FakeWB(reviews if scenario == "scheduler" else [], wb)
+    fakes = {"wb": fake_wb.app, "llm": FakeOpenRouter(llm).app, "telegram": FakeTelegram(telegram).app}
+    
+    async with bench_services(fakes, sockets) as (services, recorder):
+        started = time.perf_counter()
+        if scenario == "handler":
+            async with AsyncSessionLocal() as db:
+                await ReviewHandler(db, services).process_reviews(reviews)
+        else:
+            await check_new_reviews(services)
+        pipeline_seconds = time.perf_counter() - started
+        drain_seconds = await drain_outbox(outbox_timeout) if settings.OUTBOX_ENABLED else 0.0
+    
+    return {
+        "scenario": scenario,
+        "reviews": count,
+        "workers": settings.REVIEW_PROCESSING_WORKERS,
+        "pipeline_seconds": round(pipeline_seconds, 2),
+        "outbox_drain_seconds": round(drain_seconds, 2),
+        **await collect_results(recorder, pipeline_seconds)
+    }
+
+
+@asynccontextmanager
+async def bench_services(fakes: Dict, sockets: Dict):
+    """
+    Заглушки, сервисы приложения и воркеры публикации на время прогона
+    
+    Args:
+        fakes: ASGI-приложения заглушек по именам wb, llm, telegram
+        sockets: Сокеты заглушек по тем же именам
+    
+    Yields:
+        (контейнер сервисов, сборщик замеров этапов)
+    """
+    servers = [FakeServer(fakes[name], sockets[name]) for name in ("wb", "llm", "telegram")]
+    for server in servers:
+        await server.start()
+    
+    init_db()
+    await init_http_clients()
+    services = ServiceContainer()
+    await services.telegram_service.application.initialize()
+    if settings.OUTBOX_ENABLED:
+        await publish_worker_pool.start(wb_service=services.wb_service, sellers=services.sellers)
+    
+    recorder = StageRecorder()
+    add_stage_observer(recorder.observe)
+    try:
+        yield services, recorder
+    finally:
+        remove_stage_observer(recorder.observe)
+        await publish_worker_pool.stop()
+        await timeline_recorder.flush()
+        await services.telegram_service.application.shutdown()
+        await close_http_clients()
+        response_cache.close()
+        for server in servers:
+            await server.stop()
+
+
+async def collect_results(recorder: StageRecorder, pipeline_seconds: float) -> Dict:
+    """
+    Итоги прогона: обработанные отзывы, перцентили этапов, память, ошибки
+    
+    Args:
+        recorder: Сборщик замеров этапов прогона
+        pipeline_seconds: Время маршрутизации отзывов (без разбора очереди публикации)
+    """
+    async with AsyncSessionLocal() as db:
+        routed = await db.scalar(select(func.count(Review.id)).where(Review.status != ReviewStatus.NEW))
+    
+    stages = recorder.summary()
+    stages["review_total"] = await _review_latencies()
+    return {
+        "routed": routed,
+        "reviews_per_second": round(routed / pipeline_seconds, 1) if pipeline_seconds else 0.0,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "failures": _failures()
+    }
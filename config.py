@@ -1,29 +1,113 @@
 """Конфигурация приложения"""
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 
 class Settings(BaseSettings):
     """Настройки приложения из переменных окружения"""
     
     # Wildberries API
-    WB_API_KEY: str
+    WB_API_KEY: Optional[str] = None  # ключ единственного кабинета; для нескольких - продавцы в БД (init_db.py --add-seller)
     WB_API_URL: str = "https://suppliers-api.wildberries.ru"
+    WB_PAGE_SIZE: int = 1000  # размер страницы при постраничной загрузке отзывов (take)
     
     # OpenRouter API
     OPENROUTER_API_KEY: str
     OPENROUTER_MODEL: str = "openai/gpt-4o-mini"
     OPENROUTER_API_URL: str = "https://openrouter.ai/api/v1/chat/completions"
+    AI_BATCH_SIZE: int = 1  # отзывов в одном запросе к ИИ (1 - без пакетной генерации)
+    AI_BATCH_TOKEN_BUDGET: int = 4000  # оценка токенов на пакетный запрос (промпт + ответы)
+    AI_BATCH_RESPONSE_TOKENS: int = 250  # резерв токенов на ответ для одного отзыва в пакете
+    AI_STREAMING_ENABLED: bool = True  # потоковая генерация при перегенерации из Telegram
+    AI_PROMPT_TOKEN_BUDGET: int = 1200  # оценка токенов промпта, сверх которой поля отзыва сокращаются
+    AI_MAX_TOKENS: int = 300  # лимит токенов ответа по умолчанию
+    AI_MAX_TOKENS_BY_RATING: Dict[int, int] = {1: 350, 2: 350, 3: 300, 4: 250, 5: 250}  # лимит ответа по рейтингу (JSON в .env)
+    
+    # Очередь публикации ответов (outbox)
+    OUTBOX_ENABLED: bool = True  # False - публикация сразу в обработчике, без повторов
+    OUTBOX_WORKERS: int = 2
+    OUTBOX_MAX_ATTEMPTS: int = 8  # после исчерпания задача переходит в dead
+    OUTBOX_BACKOFF_BASE: float = 30.0  # секунды, удваивается с каждой попыткой
+    OUTBOX_BACKOFF_MAX: float = 3600.0
+    OUTBOX_POLL_INTERVAL: float = 5.0  # секунды
+    OUTBOX_LEASE_SECONDS: int = 120  # после этого задача зависшего воркера снова доступна
+    
+    # Шаблонные ответы без ИИ (для высоких оценок без текста)
+    TEMPLATE_RESPONSES_ENABLED: bool = True
+    TEMPLATE_RESPONSES_MIN_RATING: int = 4
+    TEMPLATE_RESPONSES_PATH: Optional[str] = None  # JSON {"5": ["...", ...], "4": [...]}, по умолчанию встроенные шаблоны
+    
+    # Кэш ответов ИИ
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_PATH: str = "./response_cache.db"  # SQLite-файл постоянного уровня кэша
+    RESPONSE_CACHE_TTL: int = 604800  # секунды (7 дней)
+    RESPONSE_CACHE_MEMORY_SIZE: int = 1000  # ключей в LRU-кэше в памяти
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000  # ключей в постоянном кэше
+    RESPONSE_CACHE_VARIANTS: int = 3  # сколько вариантов ответа хранится и чередуется на один ключ
+    RESPONSE_CACHE_MAX_TEXT_LENGTH: int = 200  # кэшируются только короткие отзывы
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_CHAT_ID: str
+    TELEGRAM_API_BASE_URL: str = "https://api.telegram.org/bot"  # адрес Bot API (локальный Bot API сервер, бенчмарки)
+    TELEGRAM_MODE: Literal["polling", "webhook"] = "polling"  # способ получения обновлений от Telegram
+    TELEGRAM_WEBHOOK_URL: Optional[str] = None  # публичный адрес приложения (https://...), без него вебхук не регистрируется
+    TELEGRAM_WEBHOOK_PATH: str = "/telegram/webhook"  # путь эндпоинта вебхука в приложении
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None  # обязателен в режиме webhook, сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+    TELEGRAM_CONCURRENT_UPDATES: int = 8  # одновременно обрабатываемых обновлений (1 - последовательно)
+    TELEGRAM_DIGEST_ENABLED: bool = False  # объединять карточки отзывов, пришедших в пределах окна, в одну листаемую
+    TELEGRAM_DIGEST_WINDOW: float = 30.0  # окно сбора карточек в дайджест, секунды
+    TELEGRAM_DIGEST_MAX_SIZE: int = 50  # дайджест отправляется досрочно при накоплении стольких отзывов
+    TELEGRAM_STREAM_EDIT_INTERVAL: float = 1.0  # минимальный интервал правок карточки при потоковой перегенерации, секунды
+    
+    # HTTP-клиенты (общий пул соединений для WB и OpenRouter)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # секунды
+    HTTP2_ENABLED: bool = False
+    
+    # Ограничение частоты исходящих запросов (запросов в секунду, 0 - без ограничения)
+    WB_READ_RATE_LIMIT: float = 1.0
+    WB_WRITE_RATE_LIMIT: float = 3.0
+    OPENROUTER_RATE_LIMIT: float = 10.0
+    TELEGRAM_CHAT_RATE_LIMIT: float = 1.0  # сообщений в секунду в личный чат
+    TELEGRAM_GROUP_RATE_LIMIT: float = 0.33  # в группы (отрицательный ID чата) Telegram допускает около 20 сообщений в минуту
+    RATE_LIMIT_MAX_RETRIES: int = 3  # повторов после ответа 429
+    RATE_LIMIT_MAX_RETRY_AFTER: float = 60.0  # верхняя граница ожидания по Retry-After, секунды
+    LLM_MAX_CONCURRENCY: int = 32  # одновременных запросов к OpenRouter, делятся между продавцами по весам (0 - без ограничения)
     
     # Database
     DATABASE_URL: str = "sqlite:///./wb_reviews.db"
+    DB_BULK_CHUNK_SIZE: int = 500  # размер чанка для пакетных IN-запросов и вставок
+    DATABASE_READ_URL: Optional[str] = None  # БД для GET-эндпоинтов (по умолчанию DATABASE_URL)
+    DB_READ_POOL_SIZE: int = 5  # соединений в пуле чтения
+    
+    # Профиль SQLite (применяется при подключении, только для SQLite)
+    SQLITE_TUNING_ENABLED: bool = True  # WAL, synchronous=NORMAL, busy_timeout, mmap и кэш страниц
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # ожидание снятия блокировки вместо ошибки "database is locked"
+    SQLITE_MMAP_SIZE: int = 268435456  # байт файла БД, читаемых через mmap (256 МБ)
+    SQLITE_CACHE_SIZE_KB: int = 65536  # кэш страниц на соединение (64 МБ)
     
     # Scheduler
     SCHEDULER_INTERVAL: int = 3600  # секунды (1 час)
+    SYNC_INITIAL_LOOKBACK_HOURS: int = 2  # глубина первой загрузки, пока нет сохраненной отметки синхронизации
+    SYNC_STRANDED_GRACE_SECONDS: int = 300  # отзывы, оставшиеся в статусе NEW дольше (сбой, ошибка маршрутизации), маршрутизируются повторно
+    SCHEDULER_SELLER_CONCURRENCY: int = 8  # продавцов, отзывы которых загружаются одновременно
+    LEADER_ELECTION_ENABLED: bool = True  # планировщик и polling Telegram - только в процессе, владеющем арендой в БД
+    LEADER_LEASE_SECONDS: float = 15.0  # срок аренды: столько ждут другие процессы после падения ведущего
+    LEADER_HEARTBEAT_INTERVAL: float = 5.0  # интервал продления аренды (и попыток захвата), секунды
+    
+    # Мониторинг
+    METRICS_ENABLED: bool = True  # эндпоинт /metrics в формате Prometheus
+    TIMELINE_ENABLED: bool = True  # хронология этапов обработки каждого отзыва (/reviews/{id}/timeline)
+    TIMELINE_FLUSH_SIZE: int = 200  # хронологии записываются в БД пачками
+    TIMELINE_RETENTION_DAYS: int = 30  # хронологии старше удаляются при проверке отзывов (0 - хранить все)
+    SCHEDULER_PROFILE_ENABLED: bool = False  # профилирование запусков планировщика (pyinstrument, без него - cProfile)
+    SCHEDULER_PROFILE_DIR: str = "profiles"
+    TRAFFIC_RECORD_PATH: Optional[str] = None  # запись обезличенного трафика WB/OpenRouter (gzip JSONL) для benchmarks.replay
+    
+    # Обработка отзывов
+    REVIEW_PROCESSING_WORKERS: int = 1  # 1 - последовательная обработка, >1 - конкурентный конвейер
     
     class Config:
         env_file = ".env"
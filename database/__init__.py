@@ -1,6 +1,10 @@
 """Модуль работы с базой данных"""
 from .db import get_db, init_db
-from .models import Review, Response, TelegramNotification
+from . import counters  # noqa: F401 - регистрация учета статусов
+from .models import (
+    Seller, Review, Response, TelegramNotification, SyncState, PublishJob, StatusCounter, ReviewTimeline, Lease
+)
 
-__all__ = ["get_db", "init_db", "Review", "Response", "TelegramNotification"]
+__all__ = ["get_db", "init_db", "Seller", "Review", "Response", "TelegramNotification", "SyncState", "PublishJob",
+           "StatusCounter", "ReviewTimeline", "Lease"]
 
@@ -0,0 +1,116 @@
+"""Счетчики записей по статусам, обновляемые в транзакции изменения статуса"""
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from typing import Dict, Tuple
+import logging
+
+from .db import get_insert
+from .models import Review, Response, StatusCounter
+
+logger = logging.getLogger(__name__)
+
+REVIEWS = "reviews"
+RESPONSES = "responses"
+
+_TRACKED = {Review: REVIEWS, Response: RESPONSES}
+
+
+def _status_key(value) -> str:
+    """Значение статуса для ключа счетчика"""
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def bump_counters(db: Session, deltas: Dict[Tuple[str, str], int]):
+    """
+    Изменение счетчиков на заданные величины (в текущей транзакции)
+    
+    Args:
+        db: Сессия БД
+        deltas: Приращения по ключу (сущность, статус)
+    """
+    rows = [
+        {"entity": entity, "status": status, "count": delta}
+        for (entity, status), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    
+    insert = get_insert(db)
+    stmt = insert(StatusCounter).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity", "status"],
+        set_={"count": StatusCounter.count + stmt.excluded.count}
+    )
+    db.connection().execute(stmt)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_status_changes(session: Session, flush_context):
+    """Учет изменений статусов отзывов и ответов при каждом flush"""
+    deltas: Dict[Tuple[str, str], int] = {}
+    
+    def add(entity: str, status, delta: int):
+        if status is None:
+            return
+        key = (entity, _status_key(status))
+        deltas[key] = deltas.get(key, 0) + delta
+    
+    for obj in session.new:
+        entity = _TRACKED.get(type(obj))
+        if entity:
+            add(entity, obj.status, 1)
+    
+    for obj in session.deleted:
+        entity = _TRACKED.get(type(obj))
+        if entity:
+            history = inspect(obj).attrs.status.history
+            add(entity, (history.deleted or history.unchanged or [None])[0], -1)
+    
+    for obj in session.dirty:
+        entity = _TRACKED.get(type(obj))
+        if not entity:
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.added and history.deleted and history.added[0] != history.deleted[0]:
+            add(entity, history.deleted[0], -1)
+            add(entity, history.added[0], 1)
+    
+    bump_counters(session, deltas)
+
+
+def read_counters(db: Session) -> Dict[str, Dict[str, int]]:
+    """
+    Текущие значения счетчиков одним запросом
+    
+    Returns:
+        Счетчики {сущность: {статус: количество}}
+    """
+    counters: Dict[str, Dict[str, int]] = {REVIEWS: {}, RESPONSES: {}}
+    for entity, status, count in db.query(StatusCounter.entity, StatusCounter.status, StatusCounter.count):
+        counters.setdefault(entity, {})[status] = count
+    return counters
+
+
+def recount(db: Session) -> Dict[str, Dict[str, int]]:
+    """
+    Точный пересчет по таблицам (GROUP BY status) с сохранением в счетчики
+    
+    Returns:
+        Счетчики {сущность: {статус: количество}}
+    """
+    counters: Dict[str, Dict[str, int]] = {}
+    for model, entity in _TRACKED.items():
+        counters[entity] = {
+            _status_key(status): count
+            for status, count in db.query(model.status, func.count()).group_by(model.status)
+        }
+    
+    db.query(StatusCounter).delete(synchronize_session=False)
+    db.add_all(
+        StatusCounter(entity=entity, status=status, count=count)
+        for entity, statuses in counters.items()
+        for status, count in statuses.items()
+    )
+    db.commit()
+    logger.info("Счетчики статусов пересчитаны")
+    return counters
@@ -1,18 +1,100 @@
 """Подключение к базе данных"""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
+
+def _is_sqlite(url: str) -> bool:
+    """Проверка, что URL указывает на SQLite"""
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    """Проверка, что URL указывает на SQLite в памяти"""
+    return _is_sqlite(url) and (url.split("://", 1)[-1] in ("", "/", "/:memory:") or "mode=memory" in url)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool = False):
+    """
+    Настройка соединения SQLite под рабочую нагрузку
+    
+    WAL позволяет читателям работать параллельно с писателем,
+    synchronous=NORMAL в режиме WAL безопасен и убирает fsync на каждый коммит,
+    busy_timeout заставляет ждать блокировку вместо немедленной ошибки.
+    
+    Args:
+        dbapi_connection: DBAPI-соединение (sqlite3 или адаптер aiosqlite)
+        read_only: Запретить запись в соединении (пул чтения)
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        if settings.SQLITE_TUNING_ENABLED:
+            if not read_only:
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _configure_sqlite(sync_engine, read_only: bool = False):
+    """Регистрация PRAGMA-настроек на событие подключения движка SQLite"""
+    if sync_engine.dialect.name != "sqlite":
+        return
+    
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only=read_only)
+
+
 # Создание движка БД
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if _is_sqlite(settings.DATABASE_URL) else {}
 )
+_configure_sqlite(engine)
 
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Отдельный пул только для чтения (GET-эндпоинты API): в режиме WAL читатели
+# не ждут писателя, а запросы API не занимают соединения загрузки отзывов.
+# Для БД в памяти отдельный пул увидел бы пустую базу, поэтому используется основной движок.
+_read_url = settings.DATABASE_READ_URL or settings.DATABASE_URL
+if _is_sqlite_memory(_read_url):
+    read_engine = engine
+else:
+    read_engine = create_engine(
+        _read_url,
+        connect_args={"check_same_thread": False} if _is_sqlite(_read_url) else {},
+        pool_size=settings.DB_READ_POOL_SIZE
+    )
+    _configure_sqlite(read_engine, read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def _async_database_url(url: str) -> str:
+    """URL БД с асинхронным драйвером (aiosqlite для SQLite, asyncpg для PostgreSQL)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+# Асинхронный движок и сессии для кода, работающего в event loop
+# (обработчик отзывов, планировщик, воркеры публикации)
+async_engine = create_async_engine(_async_database_url(settings.DATABASE_URL))
+_configure_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
@@ -26,8 +108,80 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """Генератор сессии БД только для чтения (GET-эндпоинты)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """Генератор асинхронной сессии БД для зависимостей FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_insert(db):
+    """
+    Конструктор INSERT с поддержкой ON CONFLICT для диалекта текущей БД
+    
+    Args:
+        db: Сессия или движок БД
+    
+    Returns:
+        Функция insert() диалекта (SQLite или PostgreSQL)
+    """
+    dialect = db.get_bind().dialect.name if hasattr(db, "get_bind") else db.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT не поддерживается для БД {dialect}")
+    return insert
+
+
+def _upgrade_schema():
+    """
+    Добавление в существующие таблицы колонок и индексов, появившихся в моделях позже
+    
+    create_all не изменяет уже созданные таблицы, поэтому новые (nullable)
+    колонки добавляются через ALTER TABLE, а индексы - через CREATE INDEX.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+
 def init_db():
     """Инициализация БД - создание всех таблиц"""
-    from .models import Review, Response, TelegramNotification
+    from .models import (
+        Seller, Review, Response, TelegramNotification, SyncState, PublishJob, StatusCounter, ReviewTimeline, Lease
+    )
+    from .counters import recount
+    from .sellers import ensure_default_seller
+    _upgrade_schema()
     Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    try:
+        # Первичное заполнение счетчиков статусов для уже существующих данных
+        if not db.query(StatusCounter).first():
+            recount(db)
+        # Продавец из WB_API_KEY для установок, работавших с одним кабинетом
+        ensure_default_seller(db)
+    finally:
+        db.close()
 
@@ -0,0 +1,90 @@
+"""Аренда ролей процессов (ведущий процесс) с истечением и продлением"""
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+
+from .db import get_insert
+from .models import Lease
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = "leader"
+
+
+def acquire_lease(db: Session, name: str, holder: str, ttl: float) -> bool:
+    """
+    Захват или продление аренды
+    
+    Аренда достается процессу, если ее еще нет, она уже принадлежит ему
+    или истекла. Захват выполняется условными INSERT/UPDATE, поэтому
+    из нескольких процессов аренду получает только один. Коммит выполняет
+    вызывающий код.
+    
+    Args:
+        db: Сессия БД
+        name: Имя аренды
+        holder: Идентификатор процесса
+        ttl: Срок аренды в секундах (до следующего продления)
+    
+    Returns:
+        True, если аренда принадлежит процессу до now + ttl
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    
+    insert = get_insert(db)
+    created = db.execute(
+        insert(Lease).values(
+            name=name, holder=holder, expires_at=expires_at, heartbeat_at=now, acquired_at=now
+        ).on_conflict_do_nothing(index_elements=["name"])
+    )
+    if created.rowcount == 1:
+        return True
+    
+    renewed = db.execute(
+        update(Lease).where(Lease.name == name, Lease.holder == holder).values(
+            expires_at=expires_at, heartbeat_at=now
+        ).execution_options(synchronize_session=False)
+    )
+    if renewed.rowcount != 1:
+        renewed = db.execute(
+            update(Lease).where(Lease.name == name, Lease.expires_at < now).values(
+                holder=holder, expires_at=expires_at, heartbeat_at=now, acquired_at=now
+            ).execution_options(synchronize_session=False)
+        )
+    return renewed.rowcount == 1
+
+
+def release_lease(db: Session, name: str, holder: str):
+    """
+    Досрочное освобождение аренды (при остановке процесса)
+    
+    Другой процесс захватывает ее при следующей попытке, не дожидаясь истечения.
+    Коммит выполняет вызывающий код.
+    
+    Args:
+        db: Сессия БД
+        name: Имя аренды
+        holder: Идентификатор процесса
+    """
+    db.execute(
+        update(Lease).where(Lease.name == name, Lease.holder == holder).values(
+            expires_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False)
+    )
+
+
+def get_lease(db: Session, name: str) -> Optional[Lease]:
+    """
+    Текущая аренда
+    
+    Args:
+        db: Сессия БД
+        name: Имя аренды
+    
+    Returns:
+        Аренда или None, если ее еще никто не захватывал
+    """
+    return db.get(Lease, name)
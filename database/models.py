@@ -1,6 +1,6 @@
 """Модели базы данных"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, ForeignKey, Boolean, Index, Enum as SQLEnum
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 import enum
 from .db import Base
@@ -21,12 +21,44 @@ class ResponseStatus(str, enum.Enum):
     PUBLISHED = "published"
 
 
+class PublishJobStatus(str, enum.Enum):
+    """Статусы задач публикации"""
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    DEAD = "dead"
+
+
+class ResponseRoute(str, enum.Enum):
+    """Способ получения текста ответа"""
+    LLM = "llm"
+    TEMPLATE = "template"
+
+
+class Seller(Base):
+    """Модель продавца (кабинета WB) со своим API-ключом и лимитами"""
+    __tablename__ = "sellers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    wb_api_key = Column(Text, nullable=False)
+    wb_read_rate_limit = Column(Float, nullable=True)  # запросов в секунду, по умолчанию WB_READ_RATE_LIMIT
+    wb_write_rate_limit = Column(Float, nullable=True)  # по умолчанию WB_WRITE_RATE_LIMIT
+    llm_weight = Column(Integer, default=1, nullable=False)  # доля в общей емкости OpenRouter относительно других продавцов
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Связи
+    reviews = relationship("Review", back_populates="seller")
+
+
 class Review(Base):
     """Модель отзыва из Wildberries"""
     __tablename__ = "reviews"
     
     id = Column(Integer, primary_key=True, index=True)
     wb_review_id = Column(String, unique=True, index=True, nullable=False)
+    seller_id = Column(Integer, ForeignKey("sellers.id"), nullable=True, index=True)
     product_id = Column(String, index=True)
     nm_id = Column(String, index=True)
     supplier_article = Column(String)
@@ -36,12 +68,26 @@ class Review(Base):
     cons = Column(Text)
     author = Column(String)
     date = Column(DateTime)
-    status = Column(SQLEnum(ReviewStatus), default=ReviewStatus.NEW, nullable=False)
+    # active_history: при смене статуса прежнее значение догружается, даже если атрибут
+    # истек после коммита - по нему обновляются счетчики (см. database.counters)
+    status = column_property(
+        Column(SQLEnum(ReviewStatus), default=ReviewStatus.NEW, nullable=False), active_history=True
+    )
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Связи
+    seller = relationship("Seller", back_populates="reviews")
     responses = relationship("Response", back_populates="review", cascade="all, delete-orphan")
     telegram_notifications = relationship("TelegramNotification", back_populates="review", cascade="all, delete-orphan")
+    
+    # Составные индексы для keyset-пагинации по (created_at, id) с фильтрами
+    __table_args__ = (
+        Index("ix_reviews_created_at_id", "created_at", "id"),
+        Index("ix_reviews_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_reviews_nm_id_created_at_id", "nm_id", "created_at", "id"),
+        Index("ix_reviews_rating_created_at_id", "rating", "created_at", "id"),
+        Index("ix_reviews_seller_id_created_at_id", "seller_id", "created_at", "id"),
+    )
 
 
 class Response(Base):
@@ -51,8 +97,14 @@ class Response(Base):
     id = Column(Integer, primary_key=True, index=True)
     review_id = Column(Integer, ForeignKey("reviews.id"), nullable=False)
     text = Column(Text, nullable=False)
-    status = Column(SQLEnum(ResponseStatus), default=ResponseStatus.DRAFT, nullable=False)
+    status = column_property(
+        Column(SQLEnum(ResponseStatus), default=ResponseStatus.DRAFT, nullable=False), active_history=True
+    )
     is_manual_edit = Column(Boolean, default=False, nullable=False)
+    route = Column(SQLEnum(ResponseRoute), default=ResponseRoute.LLM, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)  # оценка токенов промпта
+    max_tokens = Column(Integer, nullable=True)  # лимит токенов ответа
+    generation_ms = Column(Integer, nullable=True)  # время генерации ответа ИИ
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     published_at = Column(DateTime, nullable=True)
     
@@ -75,3 +127,61 @@ class TelegramNotification(Base):
     # Связи
     review = relationship("Review", back_populates="telegram_notifications")
 
+
+
+class SyncState(Base):
+    """Модель состояния инкрементальной синхронизации с источником отзывов"""
+    __tablename__ = "sync_state"
+    
+    source = Column(String, primary_key=True)
+    last_review_date = Column(DateTime, nullable=True)
+    last_review_id = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class PublishJob(Base):
+    """Модель задачи публикации ответа в WB (outbox)"""
+    __tablename__ = "publish_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    review_id = Column(Integer, ForeignKey("reviews.id"), nullable=False, index=True)
+    response_id = Column(Integer, ForeignKey("responses.id"), nullable=False)
+    status = Column(SQLEnum(PublishJobStatus), default=PublishJobStatus.PENDING, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class StatusCounter(Base):
+    """Модель счетчика записей по статусам (для быстрой статистики)"""
+    __tablename__ = "status_counters"
+    
+    entity = Column(String, primary_key=True)  # reviews, responses
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class ReviewTimeline(Base):
+    """Модель хронологии этапов обработки отзыва"""
+    __tablename__ = "review_timelines"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    review_id = Column(Integer, ForeignKey("reviews.id"), nullable=False, index=True)
+    started_at = Column(DateTime, nullable=False)  # начало обработки пакета, в который попал отзыв
+    total_ms = Column(Integer, nullable=False)
+    spans = Column(Text, nullable=False)  # JSON: [[этап, начало_мс, длительность_мс], ...]
+    failed = Column(Boolean, default=False, nullable=False)
+
+
+class Lease(Base):
+    """Модель аренды роли (ведущий процесс) с продлением по heartbeat"""
+    __tablename__ = "leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # идентификатор процесса-владельца
+    expires_at = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
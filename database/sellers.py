@@ -0,0 +1,122 @@
+"""Продавцы (кабинеты WB), обслуживаемые одним процессом"""
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import logging
+
+from config import settings
+from .db import get_insert
+from .models import Seller, Review, SyncState
+from .sync_state import WB_FEEDBACKS_SOURCE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SELLER_NAME = "default"
+
+
+def seller_sync_source(seller_id: int) -> str:
+    """Имя источника отметки синхронизации отзывов продавца"""
+    return f"{WB_FEEDBACKS_SOURCE}:{seller_id}"
+
+
+def get_active_sellers(db: Session) -> List[Seller]:
+    """
+    Продавцы, отзывы которых загружает планировщик
+    
+    Args:
+        db: Сессия БД
+    
+    Returns:
+        Активные продавцы в порядке добавления
+    """
+    return db.query(Seller).filter(Seller.is_active.is_(True)).order_by(Seller.id).all()
+
+
+def add_seller(db: Session, name: str, wb_api_key: str, llm_weight: int = 1,
+               wb_read_rate_limit: Optional[float] = None,
+               wb_write_rate_limit: Optional[float] = None) -> Seller:
+    """
+    Добавление продавца
+    
+    Args:
+        db: Сессия БД
+        name: Уникальное имя продавца
+        wb_api_key: API-ключ кабинета WB
+        llm_weight: Доля в общей емкости OpenRouter
+        wb_read_rate_limit: Лимит чтения WB API (по умолчанию WB_READ_RATE_LIMIT)
+        wb_write_rate_limit: Лимит публикации в WB API (по умолчанию WB_WRITE_RATE_LIMIT)
+    
+    Returns:
+        Созданный продавец
+    """
+    seller = Seller(
+        name=name,
+        wb_api_key=wb_api_key,
+        llm_weight=max(1, llm_weight),
+        wb_read_rate_limit=wb_read_rate_limit,
+        wb_write_rate_limit=wb_write_rate_limit
+    )
+    db.add(seller)
+    db.commit()
+    logger.info(f"Добавлен продавец {name} (ID {seller.id})")
+    return seller
+
+
+def ensure_default_seller(db: Session) -> Optional[Seller]:
+    """
+    Создание продавца из WB_API_KEY при первом запуске с таблицей продавцов
+    
+    Продавец создается, только если задан WB_API_KEY или есть данные
+    установки с одним кабинетом: отзывы без продавца привязываются к нему,
+    а отметка синхронизации wb_feedbacks переносится в его источник -
+    загрузка продолжается с того же места. Без WB_API_KEY такой продавец
+    создается отключенным. Несколько процессов (--workers) могут вызвать
+    функцию одновременно: продавец вставляется с insert-or-ignore по имени,
+    перенос выполняет только процесс, который его создал.
+    
+    Args:
+        db: Сессия БД
+    
+    Returns:
+        Созданный продавец или None, если продавцы уже есть или создавать его не нужно
+    """
+    if db.query(Seller.id).first():
+        return None
+    
+    legacy_state = db.get(SyncState, WB_FEEDBACKS_SOURCE)
+    has_legacy_reviews = db.query(Review.id).filter(Review.seller_id.is_(None)).first() is not None
+    if not settings.WB_API_KEY and legacy_state is None and not has_legacy_reviews:
+        return None
+    
+    insert = get_insert(db)
+    created = db.execute(
+        insert(Seller).values(
+            name=DEFAULT_SELLER_NAME,
+            wb_api_key=settings.WB_API_KEY or "",
+            is_active=bool(settings.WB_API_KEY),
+            llm_weight=1
+        ).on_conflict_do_nothing(index_elements=["name"])
+    )
+    if created.rowcount != 1:
+        db.rollback()
+        return None
+    seller = db.query(Seller).filter(Seller.name == DEFAULT_SELLER_NAME).one()
+    
+    db.execute(update(Review).where(Review.seller_id.is_(None)).values(seller_id=seller.id))
+    if legacy_state is not None:
+        db.execute(
+            insert(SyncState).values(
+                source=seller_sync_source(seller.id),
+                last_review_date=legacy_state.last_review_date,
+                last_review_id=legacy_state.last_review_id
+            ).on_conflict_do_nothing(index_elements=["source"])
+        )
+    db.commit()
+    if seller.is_active:
+        logger.info(f"Создан продавец {DEFAULT_SELLER_NAME} из WB_API_KEY (ID {seller.id})")
+    else:
+        logger.warning(
+            f"Отзывы без продавца привязаны к отключенному продавцу {DEFAULT_SELLER_NAME} (ID {seller.id}): "
+            f"WB_API_KEY не задан"
+        )
+    return seller
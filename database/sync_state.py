@@ -0,0 +1,54 @@
+"""Отметки инкрементальной синхронизации с источниками отзывов"""
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+import logging
+
+from .models import SyncState
+
+logger = logging.getLogger(__name__)
+
+WB_FEEDBACKS_SOURCE = "wb_feedbacks"
+
+
+def get_sync_state(db: Session, source: str) -> Optional[SyncState]:
+    """
+    Получение отметки синхронизации источника
+    
+    Args:
+        db: Сессия БД
+        source: Имя источника
+    
+    Returns:
+        Состояние синхронизации или None, если источник еще не синхронизировался
+    """
+    return db.get(SyncState, source)
+
+
+def advance_sync_state(db: Session, source: str, review_date: Optional[datetime], review_id: Optional[str]):
+    """
+    Сдвиг отметки синхронизации вперед
+    
+    Отметка только растет: более старые значения игнорируются. Коммит не
+    выполняется - отметка фиксируется в одной транзакции с пакетом отзывов.
+    
+    Args:
+        db: Сессия БД
+        source: Имя источника
+        review_date: Дата последнего обработанного отзыва
+        review_id: WB ID последнего обработанного отзыва
+    """
+    if review_date is None:
+        return
+    
+    state = db.get(SyncState, source)
+    if state is None:
+        state = SyncState(source=source)
+        db.add(state)
+    elif state.last_review_date is not None and \
+            (state.last_review_date, state.last_review_id or "") >= (review_date, review_id or ""):
+        return
+    
+    state.last_review_date = review_date
+    state.last_review_id = review_id
+    logger.debug(f"Отметка синхронизации {source}: {review_date.isoformat()} ({review_id})")
@@ -0,0 +1,227 @@
+"""Сборка карточек отзывов в листаемый дайджест Telegram"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Review, ReviewStatus, Response, ResponseStatus, TelegramNotification
+from services.telegram_service import TelegramService
+from services.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+def review_card_data(review: Review) -> Dict:
+    """Данные отзыва для карточки Telegram"""
+    return {
+        "rating": review.rating,
+        "author": review.author or "Неизвестно",
+        "date": review.date.isoformat() if review.date else "",
+        "supplier_article": review.supplier_article or "N/A",
+        "nm_id": review.nm_id or "N/A",
+        "text": review.text or "",
+        "pros": review.pros or "",
+        "cons": review.cons or ""
+    }
+
+
+async def card_review_ids(db: AsyncSession, message_id) -> List[int]:
+    """
+    Отзывы, показанные в сообщении Telegram, в порядке страниц
+    
+    Args:
+        db: Сессия БД
+        message_id: ID сообщения с карточкой
+    
+    Returns:
+        Список ID отзывов (один - обычная карточка, несколько - дайджест)
+    """
+    result = await db.execute(
+        select(TelegramNotification.review_id).where(
+            TelegramNotification.message_id == str(message_id)
+        ).order_by(TelegramNotification.id)
+    )
+    return list(dict.fromkeys(result.scalars()))
+
+
+class CardDigest:
+    """
+    Буфер карточек отрицательных отзывов
+    
+    Отзывы, пришедшие в пределах TELEGRAM_DIGEST_WINDOW, отправляются одним
+    сообщением с постраничной навигацией. Все отзывы дайджеста получают
+    TelegramNotification с общим message_id - по нему восстанавливается
+    порядок страниц.
+    
+    Если дайджест отправить не удалось, отзывы отправляются отдельными
+    карточками, а не отправленные и так возвращаются в буфер до следующего окна.
+    Буфер хранится только в памяти: отзывы, оставшиеся без карточки после
+    перезапуска, находит recover() по отсутствию TelegramNotification.
+    """
+    
+    def __init__(self):
+        self._pending: List[int] = []
+        self._telegram_service: Optional[TelegramService] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._stopping = False
+    
+    def add(self, review_id: int, telegram_service: TelegramService):
+        """
+        Добавление отзыва в текущий дайджест
+        
+        Args:
+            review_id: ID отзыва с сохраненным черновиком ответа
+            telegram_service: Сервис, через который будет отправлен дайджест
+        """
+        self._pending.append(review_id)
+        self._telegram_service = telegram_service
+        if len(self._pending) >= settings.TELEGRAM_DIGEST_MAX_SIZE:
+            if self._timer:
+                self._timer.cancel()
+            self._timer = None
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+    
+    def _start_flush(self):
+        """Отправка в фоне; задача сохраняется, чтобы дождаться ее при остановке"""
+        task = asyncio.create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _flush_later(self):
+        """Отправка дайджеста по истечении окна сбора"""
+        await asyncio.sleep(settings.TELEGRAM_DIGEST_WINDOW)
+        self._timer = None
+        self._start_flush()
+    
+    async def flush(self):
+        """Отправка накопленных отзывов одной карточкой"""
+        review_ids, self._pending = self._pending, []
+        if not review_ids:
+            return
+        
+        if await self._send(review_ids):
+            return
+        
+        failed = review_ids
+        if len(review_ids) > 1:
+            logger.warning(f"Дайджест из {len(review_ids)} отзывов не отправлен, отправка отдельными карточками")
+            failed = [review_id for review_id in review_ids if not await self._send([review_id])]
+        if failed:
+            self._requeue(failed)
+    
+    async def _send(self, review_ids: List[int]) -> bool:
+        """
+        Отправка карточки: дайджест из нескольких отзывов или обычная карточка
+        
+        Args:
+            review_ids: Отзывы карточки (первый показывается сразу)
+        
+        Returns:
+            True, если карточка отправлена (или отзыв уже удален и отправлять нечего)
+        """
+        async with AsyncSessionLocal() as db:
+            try:
+                first = await db.get(Review, review_ids[0])
+                if first is None:
+                    logger.warning(f"Отзыв {review_ids[0]} не найден, карточка не отправляется")
+                    return len(review_ids) == 1
+                result = await db.execute(
+                    select(Response).where(Response.review_id == first.id).order_by(Response.created_at.desc()).limit(1)
+                )
+                response = result.scalars().first()
+                page = (0, len(review_ids)) if len(review_ids) > 1 else None
+                
+                message_id = await self._telegram_service.send_review_card(
+                    review_data=review_card_data(first),
+                    draft_response=response.text if response else "",
+                    review_id=first.id,
+                    nm_id=first.nm_id or "N/A",
+                    page=page
+                )
+                if not message_id:
+                    return False
+                
+                for review_id in review_ids:
+                    db.add(TelegramNotification(review_id=review_id, message_id=str(message_id), status="sent"))
+                await db.commit()
+                if page:
+                    logger.info(f"Дайджест из {len(review_ids)} отзывов отправлен в Telegram (message_id: {message_id})")
+                else:
+                    logger.info(f"Карточка отзыва {first.id} отправлена в Telegram")
+                return True
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Ошибка при отправке карточки отзывов {review_ids}: {e}")
+                return False
+    
+    def _requeue(self, review_ids: List[int]):
+        """Возврат неотправленных отзывов в буфер до следующего окна"""
+        if self._stopping:
+            logger.error(f"Карточки отзывов {review_ids} не отправлены в Telegram при остановке")
+            return
+        logger.warning(f"Карточки отзывов {review_ids} не отправлены, повтор через {settings.TELEGRAM_DIGEST_WINDOW} с")
+        self._pending[:0] = review_ids
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+    
+    async def recover(self, telegram_service: TelegramService) -> int:
+        """
+        Повторная отправка карточек отзывов, оставшихся без уведомления
+        
+        Отзыв в статусе PENDING с черновиком, но без TelegramNotification,
+        остается без карточки, если процесс остановился с непустым буфером
+        или отправка не удалась. Черновики моложе SYNC_STRANDED_GRACE_SECONDS
+        пропускаются: их карточки могут еще отправляться.
+        
+        Args:
+            telegram_service: Сервис для отправки карточек
+        
+        Returns:
+            Количество отзывов, карточки которых отправлены повторно
+        """
+        threshold = datetime.utcnow() - timedelta(seconds=settings.SYNC_STRANDED_GRACE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            notified = select(TelegramNotification.id).where(TelegramNotification.review_id == Review.id)
+            result = await db.execute(
+                select(Review.id).join(Response, Response.review_id == Review.id).where(
+                    Review.status == ReviewStatus.PENDING,
+                    Response.status == ResponseStatus.DRAFT,
+                    Response.created_at < threshold,
+                    ~notified.exists()
+                ).distinct().order_by(Review.id)
+            )
+            review_ids = [review_id for review_id in result.scalars() if review_id not in self._pending]
+        
+        if not review_ids:
+            return 0
+        
+        logger.warning(f"Отзывы без карточки в Telegram: {len(review_ids)}, повторная отправка")
+        if settings.TELEGRAM_DIGEST_ENABLED:
+            for review_id in review_ids:
+                self.add(review_id, telegram_service)
+        else:
+            self._telegram_service = telegram_service
+            for review_id in review_ids:
+                await self._send([review_id])
+        return len(review_ids)
+    
+    async def stop(self):
+        """Отправка недособранного дайджеста при остановке приложения"""
+        self._stopping = True
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+
+
+card_digest = CardDigest()
+QUEUE_DEPTH.labels("telegram_digest").set_function(lambda: len(card_digest._pending))
@@ -0,0 +1,90 @@
+"""Статистика производительности конвейера обработки отзывов"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class PipelineStats:
+    """Счетчики и тайминги по этапам одного запуска обработки отзывов"""
+    
+    def __init__(self, total: int = 0, workers: int = 1):
+        self.total = total
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.stage_totals: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+        self.stage_max: Dict[str, float] = {}
+        self._started_at = time.perf_counter()
+        self._finished_at: Optional[float] = None
+    
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Замер длительности этапа обработки
+        
+        Args:
+            name: Название этапа (db, llm, wb_publish, telegram)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started)
+    
+    def record_stage(self, name: str, duration: float):
+        """Учет длительности этапа в секундах"""
+        self.stage_totals[name] = self.stage_totals.get(name, 0.0) + duration
+        self.stage_counts[name] = self.stage_counts.get(name, 0) + 1
+        self.stage_max[name] = max(self.stage_max.get(name, 0.0), duration)
+    
+    def finish(self):
+        """Фиксация окончания запуска"""
+        self._finished_at = time.perf_counter()
+    
+    @property
+    def elapsed(self) -> float:
+        """Длительность запуска в секундах"""
+        finished_at = self._finished_at or time.perf_counter()
+        return finished_at - self._started_at
+    
+    @property
+    def reviews_per_second(self) -> float:
+        """Пропускная способность: обработанных отзывов в секунду"""
+        elapsed = self.elapsed
+        return (self.processed + self.failed) / elapsed if elapsed > 0 else 0.0
+    
+    def as_dict(self) -> Dict:
+        """Статистика запуска в виде словаря (для API и логов)"""
+        return {
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "workers": self.workers,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "reviews_per_second": round(self.reviews_per_second, 2),
+            "stages": {
+                name: {
+                    "count": self.stage_counts[name],
+                    "total_seconds": round(total, 3),
+                    "avg_seconds": round(total / self.stage_counts[name], 3),
+                    "max_seconds": round(self.stage_max[name], 3)
+                }
+                for name, total in self.stage_totals.items()
+            }
+        }
+    
+    def summary(self) -> str:
+        """Краткая строка со статистикой для логов"""
+        stages = ", ".join(
+            f"{name}: {total:.2f}с/{self.stage_counts[name]}"
+            for name, total in self.stage_totals.items()
+        )
+        return (
+            f"Обработано {self.processed}/{self.total} отзывов (ошибок: {self.failed}, "
+            f"дублей: {self.duplicates}) "
+            f"за {self.elapsed:.2f}с, {self.reviews_per_second:.2f} отз/с, "
+            f"воркеров: {self.workers}. Этапы: {stages or 'нет данных'}"
+        )
@@ -0,0 +1,247 @@
+"""Фоновая публикация ответов в WB через таблицу outbox"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, or_, and_
+from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import random
+import logging
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import (
+    Review, Response, PublishJob, ReviewStatus, ResponseStatus, PublishJobStatus
+)
+from services.wb_service import WBService
+from services.sellers import SellerRegistry
+from services.metrics import record_failure
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_publish(db: AsyncSession, review: Review, response: Response) -> PublishJob:
+    """
+    Постановка ответа в очередь публикации
+    
+    Коммит не выполняется - задача фиксируется в одной транзакции
+    с ответом и статусом отзыва.
+    
+    Args:
+        db: Сессия БД
+        review: Отзыв
+        response: Одобренный ответ
+    
+    Returns:
+        Созданная задача публикации
+    """
+    response.status = ResponseStatus.APPROVED
+    review.status = ReviewStatus.PENDING
+    job = PublishJob(
+        review_id=review.id,
+        response_id=response.id,
+        status=PublishJobStatus.PENDING,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(job)
+    publish_worker_pool.notify()
+    return job
+
+
+def backoff_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором (с джиттером до 10%)"""
+    delay = min(settings.OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), settings.OUTBOX_BACKOFF_MAX)
+    return delay * (1 + random.random() * 0.1)
+
+
+class PublishWorkerPool:
+    """Пул фоновых воркеров, публикующих ответы из outbox"""
+    
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.OUTBOX_WORKERS
+        self.wb_service = WBService()
+        self.sellers: Optional[SellerRegistry] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+    
+    def notify(self):
+        """Пробуждение воркеров после постановки новой задачи"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def start(self, wb_service: Optional[WBService] = None, sellers: Optional[SellerRegistry] = None):
+        """
+        Запуск воркеров
+        
+        Args:
+            wb_service: Общий клиент WB из контейнера сервисов
+            sellers: Клиенты продавцов - ответ публикуется от имени кабинета отзыва
+        """
+        if self._tasks:
+            return
+        if wb_service is not None:
+            self.wb_service = wb_service
+        if sellers is not None:
+            self.sellers = sellers
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        await self.recover_stranded()
+        self._tasks = [asyncio.create_task(self._run(index)) for index in range(self.workers)]
+        logger.info(f"Воркеры публикации запущены: {self.workers}")
+    
+    async def stop(self):
+        """Остановка воркеров (текущие публикации завершаются)"""
+        self._stopping = True
+        self.notify()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Воркеры публикации остановлены")
+    
+    async def recover_stranded(self):
+        """
+        Постановка в очередь одобренных, но не опубликованных ответов
+        
+        Такие ответы остались от сбоев публикации до появления outbox
+        или при выключенном OUTBOX_ENABLED.
+        """
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(
+                    select(Response, Review).join(Review, Response.review_id == Review.id).where(
+                        Response.status == ResponseStatus.APPROVED,
+                        Review.status == ReviewStatus.PENDING,
+                        ~Response.id.in_(select(PublishJob.response_id))
+                    )
+                )
+                stranded = result.all()
+                for response, review in stranded:
+                    enqueue_publish(db, review, response)
+                await db.commit()
+                if stranded:
+                    logger.info(f"В очередь публикации добавлено зависших ответов: {len(stranded)}")
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Ошибка при восстановлении очереди публикации: {e}")
+    
+    async def _claim(self, db: AsyncSession) -> Optional[int]:
+        """
+        Захват очередной готовой к выполнению задачи
+        
+        Задача считается захваченной, если условный UPDATE изменил ровно
+        одну строку - так два воркера (или процесса) не возьмут одну задачу.
+        Попытка засчитывается при захвате: задача, на которой воркер падает
+        (аренда истекает без результата), тоже исчерпывает OUTBOX_MAX_ATTEMPTS.
+        
+        Returns:
+            ID задачи или None, если готовых задач нет
+        """
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(PublishJob.status == PublishJobStatus.PENDING, PublishJob.next_attempt_at <= now),
+            and_(PublishJob.status == PublishJobStatus.IN_PROGRESS, PublishJob.locked_until < now)
+        )
+        result = await db.execute(
+            select(PublishJob.id).where(claimable).order_by(PublishJob.next_attempt_at).limit(self.workers)
+        )
+        candidates = result.scalars().all()
+        
+        for job_id in candidates:
+            claimed = await db.execute(
+                update(PublishJob).where(PublishJob.id == job_id, claimable).values(
+                    status=PublishJobStatus.IN_PROGRESS,
+                    attempts=PublishJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                    updated_at=now
+                ).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if claimed.rowcount == 1:
+                return job_id
+        return None
+    
+    async def _run(self, index: int):
+        """Цикл воркера: захват задачи, публикация, ожидание новых задач"""
+        while not self._stopping:
+            async with AsyncSessionLocal() as db:
+                try:
+                    job_id = await self._claim(db)
+                    if job_id is not None:
+                        await self._publish(db, job_id)
+                        continue
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Ошибка воркера публикации {index}: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL)
+                self._wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _publish(self, db: AsyncSession, job_id: int):
+        """
+        Публикация ответа по задаче
+        
+        Args:
+            db: Сессия БД
+            job_id: ID захваченной задачи
+        """
+        job = await db.get(PublishJob, job_id)
+        review = await db.get(Review, job.review_id)
+        response = await db.get(Response, job.response_id)
+        
+        if review is None or response is None:
+            # Повтор не поможет: задача закрывается, иначе ее бы захватывали бесконечно
+            missing = "отзыв" if review is None else "ответ"
+            job.status = PublishJobStatus.DEAD
+            job.locked_until = None
+            job.last_error = f"Не найден {missing} задачи публикации"
+            await db.commit()
+            record_failure("publish_dead")
+            logger.error(f"Задача публикации {job.id}: не найден {missing}, задача закрыта")
+            return
+        
+        if review.status in (ReviewStatus.PUBLISHED, ReviewStatus.SKIPPED):
+            job.status = PublishJobStatus.DONE
+            await db.commit()
+            logger.info(f"Отзыв {review.id} уже {review.status.value}, задача публикации {job.id} закрыта")
+            return
+        
+        if job.attempts > settings.OUTBOX_MAX_ATTEMPTS:
+            # Предыдущие попытки не завершились: воркер падал, не дождавшись ответа WB
+            job.status = PublishJobStatus.DEAD
+            job.locked_until = None
+            job.last_error = "Публикация не завершилась за отведенное число попыток"
+            await db.commit()
+            record_failure("publish_dead")
+            logger.error(f"Задача публикации {job.id}: попытки исчерпаны без результата, задача закрыта")
+            return
+        
+        wb_service = await self.sellers.load(db, review.seller_id) if self.sellers else self.wb_service
+        success = await wb_service.post_response(review.wb_review_id, response.text)
+        job.locked_until = None
+        
+        if success:
+            job.status = PublishJobStatus.DONE
+            job.last_error = None
+            response.status = ResponseStatus.PUBLISHED
+            response.published_at = datetime.utcnow()
+            review.status = ReviewStatus.PUBLISHED
+            logger.info(f"Ответ на отзыв {review.id} опубликован (попытка {job.attempts})")
+        elif job.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            job.status = PublishJobStatus.DEAD
+            job.last_error = "WB API отклонил публикацию"
+            record_failure("publish_dead")
+            logger.error(f"Публикация ответа на отзыв {review.id} не удалась после {job.attempts} попыток")
+        else:
+            delay = backoff_delay(job.attempts)
+            job.status = PublishJobStatus.PENDING
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            job.last_error = "WB API отклонил публикацию"
+            logger.warning(f"Публикация ответа на отзыв {review.id} не удалась, повтор через {delay:.0f}с")
+        
+        await db.commit()
+
+
+publish_worker_pool = PublishWorkerPool()
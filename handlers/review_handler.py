@@ -1,115 +1,486 @@
 """Обработчик логики работы с отзывами"""
-from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncGenerator, Iterator, List, Dict, Optional, Tuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+import asyncio
+import copy
 import logging
+import time
 
-from database.models import Review, Response, TelegramNotification, ReviewStatus, ResponseStatus
-from services.wb_service import WBService
-from services.ai_service import AIService
-from services.telegram_service import TelegramService
+from config import settings
+from database.db import AsyncSessionLocal, get_insert
+from database.sync_state import advance_sync_state
+from database.counters import bump_counters, REVIEWS
+from database.models import Review, Response, TelegramNotification, ReviewStatus, ResponseStatus, ResponseRoute
+from services.container import ServiceContainer
+from services.rate_limiter import current_seller
+from services.metrics import QUEUE_DEPTH, record_failure, record_route
+from handlers.pipeline_stats import PipelineStats
+from handlers.publish_worker import enqueue_publish
+from handlers.card_digest import card_digest, card_review_ids, review_card_data
+from handlers.timeline import batch_timeline, review_timeline, span, timeline_recorder
 
 logger = logging.getLogger(__name__)
 
 
+def chunked(items: List, size: int) -> Iterator[List]:
+    """Разбиение списка на чанки фиксированного размера"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_review_date(value) -> Optional[datetime]:
+    """
+    Преобразование даты отзыва из WB API в datetime (UTC, без tzinfo)
+    
+    Args:
+        value: Дата в формате ISO, datetime или пустое значение
+    
+    Returns:
+        datetime или None, если дату не удалось распознать
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        date_obj = value
+    else:
+        try:
+            date_obj = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            logger.warning(f"Не удалось распознать дату отзыва: {value}")
+            return None
+    if date_obj.tzinfo is not None:
+        date_obj = date_obj.astimezone(timezone.utc).replace(tzinfo=None)
+    return date_obj
+
+
+def register_callbacks(services: ServiceContainer):
+    """
+    Регистрация обработчиков кнопок карточек в Telegram-боте контейнера
+    
+    Выполняется один раз при старте. Каждое нажатие обрабатывается
+    в собственной сессии БД.
+    
+    Args:
+        services: Общие сервисы процесса
+    """
+    def bind(action: str):
+        async def callback(review_id: int, update, context):
+            async with AsyncSessionLocal() as db:
+                handler = ReviewHandler(db, services)
+                await getattr(handler, f"_handle_{action}")(review_id, update, context)
+        return callback
+    
+    for action in ("publish", "regenerate", "edit_manual", "skip", "digest"):
+        services.telegram_service.register_callback_handler(action, bind(action))
+
+
 class ReviewHandler:
     """Обработчик отзывов"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, services: Optional[ServiceContainer] = None,
+                 seller_id: Optional[int] = None):
+        """
+        Args:
+            db: Сессия БД
+            services: Общие сервисы процесса (без контейнера создаются собственные,
+                например для разовых скриптов)
+            seller_id: Продавец, к которому относятся сохраняемые отзывы
+        """
         self.db = db
-        self.wb_service = WBService()
-        self.ai_service = AIService()
-        self.telegram_service = TelegramService()
-        self.telegram_service.initialize()
-        
-        # Регистрация обработчиков callback
-        self.telegram_service.register_callback_handler("publish", self._handle_publish)
-        self.telegram_service.register_callback_handler("regenerate", self._handle_regenerate)
-        self.telegram_service.register_callback_handler("edit_manual", self._handle_edit_manual)
-        self.telegram_service.register_callback_handler("skip", self._handle_skip)
+        self.services = services or ServiceContainer()
+        self.seller_id = seller_id
+        self.wb_service = self.services.sellers.get(seller_id)
+        self.ai_service = self.services.ai_service
+        self.template_responder = self.services.template_responder
+        self.telegram_service = self.services.telegram_service
+        self.stats: Optional[PipelineStats] = None
     
-    async def process_reviews(self, reviews_list: List[Dict]):
+    async def process_reviews(self, reviews_list: List[Dict], workers: Optional[int] = None,
+                              sync_source: Optional[str] = None) -> PipelineStats:
         """
         Обработка списка отзывов
         
+        Новые отзывы отбираются и сохраняются пакетно (см. ingest_reviews),
+        после чего маршрутизируются по рейтингу. При workers > 1 маршрутизация
+        выполняется конкурентно пулом воркеров, каждый отзыв - в собственной
+        сессии БД с изоляцией ошибок.
+        
         Args:
             reviews_list: Список отзывов из WB API
+            workers: Количество воркеров (по умолчанию REVIEW_PROCESSING_WORKERS)
+            sync_source: Источник, отметка синхронизации которого сдвигается вместе с пакетом
+        
+        Returns:
+            Статистика запуска (пропускная способность и тайминги этапов)
         """
-        for review_data in reviews_list:
-            try:
-                await self.process_review(review_data)
-            except Exception as e:
-                logger.error(f"Ошибка при обработке отзыва: {e}")
-                continue
+        workers = max(1, workers or settings.REVIEW_PROCESSING_WORKERS)
+        self.stats = PipelineStats(total=len(reviews_list), workers=workers)
+        
+        await self._process_batch(reviews_list, workers, sync_source)
+        
+        self.stats.finish()
+        logger.info(self.stats.summary())
+        return self.stats
     
-    async def process_review(self, review_data: Dict):
+    async def process_review_stream(self, pages: AsyncGenerator[List[Dict], None], workers: Optional[int] = None,
+                                    sync_source: Optional[str] = None) -> PipelineStats:
         """
-        Обработка одного отзыва
+        Обработка отзывов, поступающих постранично
+        
+        Каждая страница сохраняется и маршрутизируется сразу по получении,
+        пока следующая страница загружается (см. WBService.iter_review_pages).
+        Генератор страниц закрывается и при ошибке обработки, чтобы фоновая
+        загрузка следующей страницы не осталась висеть.
         
         Args:
-            review_data: Данные отзыва из WB API
+            pages: Асинхронный генератор страниц отзывов из WB API
+            workers: Количество воркеров (по умолчанию REVIEW_PROCESSING_WORKERS)
+            sync_source: Источник, отметка синхронизации которого сдвигается после каждой страницы
+        
+        Returns:
+            Статистика запуска (пропускная способность и тайминги этапов)
+        """
+        workers = max(1, workers or settings.REVIEW_PROCESSING_WORKERS)
+        self.stats = PipelineStats(total=0, workers=workers)
+        
+        try:
+            async for page in pages:
+                self.stats.total += len(page)
+                await self._process_batch(page, workers, sync_source)
+        finally:
+            await pages.aclose()
+        
+        self.stats.finish()
+        logger.info(self.stats.summary())
+        return self.stats
+    
+    async def _process_batch(self, reviews_list: List[Dict], workers: int, sync_source: Optional[str]):
+        """
+        Сохранение и маршрутизация одного пакета отзывов
+        
+        Args:
+            reviews_list: Список отзывов из WB API
+            workers: Количество воркеров
+            sync_source: Источник для сдвига отметки синхронизации
         """
-        # Парсинг данных отзыва
-        parsed_data = self.wb_service.parse_review(review_data)
-        wb_review_id = parsed_data["wb_review_id"]
+        with batch_timeline():
+            new_reviews = await self.ingest_reviews(reviews_list, sync_source=sync_source)
+            self.stats.duplicates += len(reviews_list) - len(new_reviews)
+            await self._route_reviews(new_reviews, workers)
         
-        # Проверка, существует ли отзыв в БД
-        existing_review = self.db.query(Review).filter(
-            Review.wb_review_id == wb_review_id
-        ).first()
+        await timeline_recorder.flush()
+    
+    async def _route_reviews(self, reviews: List[Review], workers: int):
+        """
+        Маршрутизация сохраненных отзывов с изоляцией ошибок
         
-        if existing_review:
-            logger.info(f"Отзыв {wb_review_id} уже обработан, пропускаем")
-            return
+        Args:
+            reviews: Отзывы в статусе NEW
+            workers: Количество воркеров
+        """
+        drafts, draft_usage = await self._pregenerate_responses(reviews) if settings.AI_BATCH_SIZE > 1 else ({}, {})
+        
+        if workers == 1:
+            for review_id in [review.id for review in reviews]:
+                try:
+                    # get() перечитывает отзыв, если он устарел после rollback предыдущего
+                    review = await self.db.get(Review, review_id)
+                    await self.route_review(review, draft=drafts.get(review_id), usage=draft_usage.get(review_id))
+                    self.stats.processed += 1
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке отзыва {review_id}: {e}")
+                    await self.db.rollback()
+                    self.stats.failed += 1
+                    record_failure("review")
+                    continue
+        else:
+            await self._process_concurrently([review.id for review in reviews], workers, drafts, draft_usage)
+    
+    async def route_stranded(self, workers: Optional[int] = None) -> PipelineStats:
+        """
+        Повторная маршрутизация отзывов, оставшихся в статусе NEW
+        
+        Отметка синхронизации сдвигается при сохранении отзывов, до их
+        маршрутизации. Если процесс упал или маршрутизация отзыва завершилась
+        ошибкой, повторная загрузка его уже не вернет - такие отзывы старше
+        SYNC_STRANDED_GRACE_SECONDS подхватываются здесь (перед каждой загрузкой).
+        
+        Args:
+            workers: Количество воркеров (по умолчанию REVIEW_PROCESSING_WORKERS)
+        
+        Returns:
+            Статистика повторной маршрутизации
+        """
+        workers = max(1, workers or settings.REVIEW_PROCESSING_WORKERS)
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.SYNC_STRANDED_GRACE_SECONDS)
+        seller_filter = Review.seller_id.is_(None) if self.seller_id is None else Review.seller_id == self.seller_id
+        
+        with batch_timeline():
+            result = await self.db.execute(
+                select(Review).where(
+                    Review.status == ReviewStatus.NEW, seller_filter, Review.created_at < cutoff
+                ).order_by(Review.id).limit(settings.DB_BULK_CHUNK_SIZE)
+            )
+            stranded = list(result.scalars().all())
+            self.stats = PipelineStats(total=len(stranded), workers=workers)
+            if stranded:
+                logger.warning(f"Повторная маршрутизация отзывов, оставшихся в статусе NEW: {len(stranded)}")
+                await self._route_reviews(stranded, workers)
+        
+        await timeline_recorder.flush()
+        self.stats.finish()
+        return self.stats
+    
+    async def _pregenerate_responses(self, reviews: List[Review]) -> Tuple[Dict[int, str], Dict[int, Dict]]:
+        """
+        Пакетная генерация ответов для отзывов, которым нужен ИИ
         
-        # Создание записи в БД
-        review = Review(
-            wb_review_id=wb_review_id,
-            product_id=parsed_data.get("product_id"),
-            nm_id=parsed_data.get("nm_id"),
-            supplier_article=parsed_data.get("supplier_article"),
-            rating=parsed_data.get("rating", 0),
-            text=parsed_data.get("text"),
-            pros=parsed_data.get("pros"),
-            cons=parsed_data.get("cons"),
-            author=parsed_data.get("author"),
-            date=parsed_data.get("date"),
-            status=ReviewStatus.NEW
+        Args:
+            reviews: Новые отзывы из БД
+        
+        Returns:
+            Сгенерированные ответы по ID отзыва (только успешные)
+            и оценки токенов/время генерации по ID отзыва
+        """
+        items = [
+            {
+                "id": str(review.id),
+                "review_text": review.text or "",
+                "rating": review.rating,
+                "pros": review.pros,
+                "cons": review.cons
+            }
+            for review in reviews
+            if not (review.rating >= 4 and self.template_responder.can_respond(
+                review.rating, review.text, review.pros, review.cons
+            ))
+        ]
+        if not items:
+            return {}, {}
+        
+        usage: Dict[str, Dict] = {}
+        with self._stage("llm"):
+            generated = await self.ai_service.generate_responses_batch(items, usage=usage)
+        return (
+            {int(review_id): text for review_id, text in generated.items() if text},
+            {int(review_id): item_usage for review_id, item_usage in usage.items()}
         )
-        self.db.add(review)
-        self.db.commit()
-        self.db.refresh(review)
+    
+    async def _process_concurrently(self, review_ids: List[int], workers: int,
+                                    drafts: Optional[Dict[int, str]] = None,
+                                    draft_usage: Optional[Dict[int, Dict]] = None):
+        """
+        Конкурентная маршрутизация сохраненных отзывов пулом воркеров
         
-        logger.info(f"Новый отзыв {review.id} (WB ID: {wb_review_id}) добавлен в БД")
+        Args:
+            review_ids: ID отзывов в нашей БД
+            workers: Количество воркеров
+            drafts: Заранее сгенерированные ответы по ID отзыва
+            draft_usage: Оценки токенов и время генерации этих ответов
+        """
+        drafts = drafts or {}
+        draft_usage = draft_usage or {}
+        queue: asyncio.Queue = asyncio.Queue()
+        for review_id in review_ids:
+            queue.put_nowait(review_id)
+        queue_depth = QUEUE_DEPTH.labels("review_workers")
+        queue_depth.inc(len(review_ids))
+        
+        async def worker():
+            while True:
+                try:
+                    review_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                queue_depth.dec()
+                
+                async with AsyncSessionLocal() as db:
+                    try:
+                        review = await db.get(Review, review_id)
+                        await self._for_session(db).route_review(
+                            review, draft=drafts.get(review_id), usage=draft_usage.get(review_id)
+                        )
+                        self.stats.processed += 1
+                    except Exception as e:
+                        logger.error(f"Ошибка при обработке отзыва {review_id}: {e}")
+                        await db.rollback()
+                        self.stats.failed += 1
+                        record_failure("review")
+        
+        await asyncio.gather(*(worker() for _ in range(min(workers, len(review_ids)))))
+    
+    def _for_session(self, db: AsyncSession) -> "ReviewHandler":
+        """Копия обработчика с теми же сервисами, но другой сессией БД"""
+        handler = copy.copy(self)
+        handler.db = db
+        return handler
+    
+    @contextmanager
+    def _stage(self, name: str):
+        """Замер этапа обработки в статистике текущего запуска и в хронологии отзыва"""
+        with self.stats.stage(name) if self.stats else nullcontext(), span(name):
+            yield
+    
+    def _build_review_row(self, parsed_data: Dict) -> Dict:
+        """Подготовка строки таблицы reviews из распарсенных данных отзыва"""
+        return {
+            "wb_review_id": parsed_data["wb_review_id"],
+            "seller_id": self.seller_id,
+            "product_id": parsed_data.get("product_id"),
+            "nm_id": parsed_data.get("nm_id"),
+            "supplier_article": parsed_data.get("supplier_article"),
+            "rating": parsed_data.get("rating", 0),
+            "text": parsed_data.get("text"),
+            "pros": parsed_data.get("pros"),
+            "cons": parsed_data.get("cons"),
+            "author": parsed_data.get("author"),
+            "date": parse_review_date(parsed_data.get("date")),
+            "status": ReviewStatus.NEW,
+            "created_at": datetime.utcnow()
+        }
+    
+    async def ingest_reviews(self, reviews_list: List[Dict], sync_source: Optional[str] = None) -> List[Review]:
+        """
+        Пакетное сохранение новых отзывов
         
-        # Маршрутизация по рейтингу
-        if review.rating >= 4:
-            await self.handle_positive_review(review)
-        else:
-            await self.handle_negative_review(review)
+        Уже известные wb_review_id отбираются одним IN-запросом на чанк,
+        новые строки вставляются одним INSERT на чанк с семантикой
+        insert-or-ignore по уникальному индексу wb_review_id, поэтому
+        параллельные запуски не создают дублей. Если указан sync_source,
+        его отметка синхронизации сдвигается в той же транзакции.
+        
+        Args:
+            reviews_list: Список отзывов из WB API
+            sync_source: Имя источника для сдвига отметки синхронизации
+        
+        Returns:
+            Список только что добавленных отзывов (в порядке вставки)
+        """
+        rows: Dict[str, Dict] = {}
+        for review_data in reviews_list:
+            parsed_data = self.wb_service.parse_review(review_data)
+            wb_review_id = parsed_data["wb_review_id"]
+            if not wb_review_id:
+                logger.warning(f"Отзыв без ID пропущен: {review_data}")
+                continue
+            rows.setdefault(wb_review_id, self._build_review_row(parsed_data))
+        
+        if not rows:
+            return []
+        
+        chunk_size = settings.DB_BULK_CHUNK_SIZE
+        
+        with self._stage("db"):
+            # Отбор уже известных отзывов
+            existing_ids = set()
+            for chunk in chunked(list(rows), chunk_size):
+                result = await self.db.execute(
+                    select(Review.wb_review_id).where(Review.wb_review_id.in_(chunk))
+                )
+                existing_ids.update(result.scalars())
+            
+            new_rows = [row for wb_review_id, row in rows.items() if wb_review_id not in existing_ids]
+            
+            # Пакетная вставка новых отзывов
+            insert = get_insert(self.db)
+            inserted_ids: List[int] = []
+            for chunk in chunked(new_rows, chunk_size):
+                stmt = insert(Review).values(chunk).on_conflict_do_nothing(
+                    index_elements=["wb_review_id"]
+                ).returning(Review.id)
+                inserted_ids.extend((await self.db.execute(stmt)).scalars().all())
+            await self.db.run_sync(bump_counters, {(REVIEWS, ReviewStatus.NEW.value): len(inserted_ids)})
+            
+            if sync_source:
+                latest = max(
+                    (row for row in rows.values() if row["date"] is not None),
+                    key=lambda row: (row["date"], row["wb_review_id"]),
+                    default=None
+                )
+                if latest:
+                    await self.db.run_sync(
+                        advance_sync_state, sync_source, latest["date"], latest["wb_review_id"]
+                    )
+            await self.db.commit()
+            
+            new_reviews: List[Review] = []
+            for chunk in chunked(sorted(inserted_ids), chunk_size):
+                result = await self.db.execute(
+                    select(Review).where(Review.id.in_(chunk)).order_by(Review.id)
+                )
+                new_reviews.extend(result.scalars().all())
+        
+        if existing_ids:
+            logger.info(f"Пропущено уже обработанных отзывов: {len(existing_ids)}")
+        logger.info(f"Добавлено новых отзывов в БД: {len(new_reviews)}")
+        return new_reviews
+    
+    async def process_review(self, review_data: Dict):
+        """
+        Обработка одного отзыва
+        
+        Args:
+            review_data: Данные отзыва из WB API
+        """
+        with batch_timeline():
+            for review in await self.ingest_reviews([review_data]):
+                await self.route_review(review)
+        await timeline_recorder.flush()
     
-    async def handle_positive_review(self, review: Review):
+    async def route_review(self, review: Review, draft: Optional[str] = None, usage: Optional[Dict] = None):
+        """
+        Маршрутизация сохраненного отзыва по рейтингу
+        
+        Args:
+            review: Объект отзыва из БД
+            draft: Заранее сгенерированный ответ (опционально)
+            usage: Оценка токенов и время генерации заранее сгенерированного ответа
+        """
+        with review_timeline(review.id):
+            if review.rating >= 4:
+                record_route("positive")
+                await self.handle_positive_review(review, response_text=draft, usage=usage)
+            else:
+                record_route("negative")
+                await self.handle_negative_review(review, draft_response=draft, usage=usage)
+    
+    async def handle_positive_review(self, review: Review, response_text: Optional[str] = None,
+                                     usage: Optional[Dict] = None):
         """
         Обработка положительного отзыва (4+ звезд)
         Автоматическая генерация и публикация ответа
         
         Args:
             review: Объект отзыва из БД
+            response_text: Заранее сгенерированный ответ (опционально)
+            usage: Оценка токенов и время генерации этого ответа
         """
+        usage = dict(usage or {})
         logger.info(f"Обработка положительного отзыва {review.id} (рейтинг: {review.rating})")
         
-        # Генерация ответа
-        response_text = await self.ai_service.generate_response(
-            review_text=review.text or "",
-            rating=review.rating,
-            pros=review.pros,
-            cons=review.cons
-        )
+        # Отзывы без текста получают шаблонный ответ без обращения к ИИ
+        route = ResponseRoute.LLM
+        if self.template_responder.can_respond(review.rating, review.text, review.pros, review.cons):
+            route = ResponseRoute.TEMPLATE
+            response_text = self.template_responder.respond(review.rating)
+            logger.info(f"Шаблонный ответ для отзыва {review.id} без текста")
+        elif not response_text:
+            with self._stage("llm"):
+                response_text = await self.ai_service.generate_response(
+                    review_text=review.text or "",
+                    rating=review.rating,
+                    pros=review.pros,
+                    cons=review.cons,
+                    usage=usage
+                )
         
         if not response_text:
             logger.error(f"Не удалось сгенерировать ответ для отзыва {review.id}")
             review.status = ReviewStatus.PENDING
-            self.db.commit()
+            await self.db.commit()
             return
         
         # Сохранение ответа в БД
@@ -117,17 +488,29 @@ class ReviewHandler:
             review_id=review.id,
             text=response_text,
             status=ResponseStatus.DRAFT,
-            is_manual_edit=False
+            is_manual_edit=False,
+            route=route,
+            **usage
         )
-        self.db.add(response)
-        self.db.commit()
-        self.db.refresh(response)
+        with self._stage("db"):
+            self.db.add(response)
+            if settings.OUTBOX_ENABLED:
+                await self.db.flush()
+                enqueue_publish(self.db, review, response)
+            await self.db.commit()
+        
+        if settings.OUTBOX_ENABLED:
+            # Публикацию выполняют фоновые воркеры (см. handlers.publish_worker)
+            logger.info(f"Ответ на отзыв {review.id} поставлен в очередь публикации")
+            return
         
-        # Публикация ответа
-        success = await self.wb_service.post_response(
-            review.wb_review_id,
-            response_text
-        )
+        # Публикация ответа от имени кабинета продавца
+        wb_service = await self.services.sellers.load(self.db, review.seller_id)
+        with self._stage("wb_publish"):
+            success = await wb_service.post_response(
+                review.wb_review_id,
+                response_text
+            )
         
         if success:
             response.status = ResponseStatus.PUBLISHED
@@ -139,30 +522,38 @@ class ReviewHandler:
             review.status = ReviewStatus.PENDING
             logger.warning(f"Не удалось опубликовать ответ на отзыв {review.id}")
         
-        self.db.commit()
+        with self._stage("db"):
+            await self.db.commit()
     
-    async def handle_negative_review(self, review: Review):
+    async def handle_negative_review(self, review: Review, draft_response: Optional[str] = None,
+                                     usage: Optional[Dict] = None):
         """
         Обработка отрицательного отзыва (<4 звезд)
         Генерация черновика и отправка в Telegram
         
         Args:
             review: Объект отзыва из БД
+            draft_response: Заранее сгенерированный черновик (опционально)
+            usage: Оценка токенов и время генерации этого черновика
         """
+        usage = dict(usage or {})
         logger.info(f"Обработка отрицательного отзыва {review.id} (рейтинг: {review.rating})")
         
         # Генерация черновика ответа
-        draft_response = await self.ai_service.generate_response(
-            review_text=review.text or "",
-            rating=review.rating,
-            pros=review.pros,
-            cons=review.cons
-        )
+        if not draft_response:
+            with self._stage("llm"):
+                draft_response = await self.ai_service.generate_response(
+                    review_text=review.text or "",
+                    rating=review.rating,
+                    pros=review.pros,
+                    cons=review.cons,
+                    usage=usage
+                )
         
         if not draft_response:
             logger.error(f"Не удалось сгенерировать черновик для отзыва {review.id}")
             review.status = ReviewStatus.PENDING
-            self.db.commit()
+            await self.db.commit()
             return
         
         # Сохранение черновика в БД
@@ -170,31 +561,28 @@ class ReviewHandler:
             review_id=review.id,
             text=draft_response,
             status=ResponseStatus.DRAFT,
-            is_manual_edit=False
+            is_manual_edit=False,
+            **usage
         )
-        self.db.add(response)
-        review.status = ReviewStatus.PENDING
-        self.db.commit()
-        self.db.refresh(response)
+        with self._stage("db"):
+            self.db.add(response)
+            review.status = ReviewStatus.PENDING
+            await self.db.commit()
         
-        # Отправка карточки в Telegram
-        review_data = {
-            "rating": review.rating,
-            "author": review.author or "Неизвестно",
-            "date": review.date.isoformat() if review.date else "",
-            "supplier_article": review.supplier_article or "N/A",
-            "nm_id": review.nm_id or "N/A",
-            "text": review.text or "",
-            "pros": review.pros or "",
-            "cons": review.cons or ""
-        }
+        if settings.TELEGRAM_DIGEST_ENABLED:
+            # Карточка уйдет в составе дайджеста (см. handlers.card_digest)
+            with span("telegram_digest"):
+                card_digest.add(review.id, self.telegram_service)
+            return
         
-        message_id = await self.telegram_service.send_review_card(
-            review_data=review_data,
-            draft_response=draft_response,
-            review_id=review.id,
-            nm_id=review.nm_id or "N/A"
-        )
+        # Отправка карточки в Telegram
+        with self._stage("telegram"):
+            message_id = await self.telegram_service.send_review_card(
+                review_data=review_card_data(review),
+                draft_response=draft_response,
+                review_id=review.id,
+                nm_id=review.nm_id or "N/A"
+            )
         
         if message_id:
             # Сохранение информации о Telegram уведомлении
@@ -203,28 +591,44 @@ class ReviewHandler:
                 message_id=str(message_id),
                 status="sent"
             )
-            self.db.add(notification)
-            self.db.commit()
+            with self._stage("db"):
+                self.db.add(notification)
+                await self.db.commit()
             logger.info(f"Карточка отзыва {review.id} отправлена в Telegram")
     
+    async def _latest_response(self, review_id: int) -> Optional[Response]:
+        """Последний ответ на отзыв"""
+        result = await self.db.execute(
+            select(Response).where(Response.review_id == review_id).order_by(Response.created_at.desc()).limit(1)
+        )
+        return result.scalars().first()
+    
+    async def _latest_notification(self, review_id: int) -> Optional[TelegramNotification]:
+        """Последнее Telegram-уведомление по отзыву"""
+        result = await self.db.execute(
+            select(TelegramNotification).where(
+                TelegramNotification.review_id == review_id
+            ).order_by(TelegramNotification.created_at.desc()).limit(1)
+        )
+        return result.scalars().first()
+    
     async def _handle_publish(self, review_id: int, update, context):
         """Обработка нажатия кнопки 'Опубликовать'"""
-        review = self.db.query(Review).filter(Review.id == review_id).first()
+        review = await self.db.get(Review, review_id)
         if not review:
             await update.callback_query.message.reply_text("Отзыв не найден")
             return
         
         # Получение последнего ответа
-        response = self.db.query(Response).filter(
-            Response.review_id == review_id
-        ).order_by(Response.created_at.desc()).first()
+        response = await self._latest_response(review_id)
         
         if not response:
             await update.callback_query.message.reply_text("Ответ не найден")
             return
         
-        # Публикация ответа
-        success = await self.wb_service.post_response(
+        # Публикация ответа от имени кабинета продавца
+        wb_service = await self.services.sellers.load(self.db, review.seller_id)
+        success = await wb_service.post_response(
             review.wb_review_id,
             response.text
         )
@@ -235,77 +639,171 @@ class ReviewHandler:
             review.status = ReviewStatus.PUBLISHED
             
             # Обновление уведомления
-            notification = self.db.query(TelegramNotification).filter(
-                TelegramNotification.review_id == review_id
-            ).order_by(TelegramNotification.created_at.desc()).first()
+            notification = await self._latest_notification(review_id)
             if notification:
                 notification.action_type = "publish"
                 notification.action_taken_at = datetime.utcnow()
                 notification.status = "completed"
             
-            self.db.commit()
+            await self.db.commit()
             await update.callback_query.message.reply_text("✅ Ответ успешно опубликован!")
+        elif settings.OUTBOX_ENABLED:
+            enqueue_publish(self.db, review, response)
+            await self.db.commit()
+            await update.callback_query.message.reply_text(
+                "⏳ WB не принял ответ, публикация будет повторена автоматически"
+            )
         else:
             await update.callback_query.message.reply_text("❌ Ошибка при публикации ответа")
     
     async def _handle_regenerate(self, review_id: int, update, context):
         """Обработка нажатия кнопки 'Перегенерировать'"""
-        review = self.db.query(Review).filter(Review.id == review_id).first()
+        review = await self.db.get(Review, review_id)
         if not review:
             await update.callback_query.message.reply_text("Отзыв не найден")
             return
         
-        # Генерация нового ответа
-        new_response = await self.ai_service.generate_response(
-            review_text=review.text or "",
-            rating=review.rating,
-            pros=review.pros,
-            cons=review.cons
-        )
+        notification = await self._latest_notification(review_id)
+        message_id = notification.message_id if notification and notification.message_id \
+            else update.callback_query.message.message_id
+        # Запрос к ИИ учитывается в доле продавца отзыва
+        current_seller.set(review.seller_id)
+        
+        # Генерация нового ответа (в обход кэша - нужен именно новый вариант);
+        # при потоковой генерации текст появляется в карточке по мере готовности
+        usage: Dict = {}
+        new_response = await self._stream_to_card(review, message_id, usage) if settings.AI_STREAMING_ENABLED else None
+        if not new_response:
+            new_response = await self.ai_service.generate_response(
+                review_text=review.text or "",
+                rating=review.rating,
+                pros=review.pros,
+                cons=review.cons,
+                use_cache=False,
+                usage=usage
+            )
         
         if not new_response:
             await update.callback_query.message.reply_text("❌ Ошибка при генерации ответа")
             return
         
         # Обновление ответа в БД
-        response = self.db.query(Response).filter(
-            Response.review_id == review_id
-        ).order_by(Response.created_at.desc()).first()
+        response = await self._latest_response(review_id)
         
         if response:
             response.text = new_response
+            for key, value in usage.items():
+                setattr(response, key, value)
         else:
             response = Response(
                 review_id=review_id,
                 text=new_response,
                 status=ResponseStatus.DRAFT,
-                is_manual_edit=False
+                is_manual_edit=False,
+                **usage
             )
             self.db.add(response)
         
-        self.db.commit()
-        
-        # Отправка новой карточки
-        review_data = {
-            "rating": review.rating,
-            "author": review.author or "Неизвестно",
-            "date": review.date.isoformat() if review.date else "",
-            "supplier_article": review.supplier_article or "N/A",
-            "nm_id": review.nm_id or "N/A",
-            "text": review.text or "",
-            "pros": review.pros or "",
-            "cons": review.cons or ""
-        }
+        await self.db.commit()
         
-        await self.telegram_service.send_review_card(
-            review_data=review_data,
+        # Обновление карточки на месте; новая карточка - только если сообщение недоступно
+        if await self._edit_card(review, new_response, message_id):
+            return
+        
+        message_id = await self.telegram_service.send_review_card(
+            review_data=review_card_data(review),
             draft_response=new_response,
             review_id=review.id,
             nm_id=review.nm_id or "N/A"
         )
+        if message_id:
+            self.db.add(TelegramNotification(review_id=review.id, message_id=str(message_id), status="sent"))
+            await self.db.commit()
         
         await update.callback_query.message.reply_text("🔁 Ответ перегенерирован! Новая карточка отправлена.")
     
+    async def _stream_to_card(self, review: Review, message_id, usage: Optional[Dict] = None) -> Optional[str]:
+        """
+        Потоковая генерация ответа с постепенным обновлением карточки
+        
+        Правки сообщения выполняются не чаще TELEGRAM_STREAM_EDIT_INTERVAL.
+        В usage записываются оценка токенов и время генерации.
+        
+        Returns:
+            Сгенерированный текст или None, если поток прервался
+            (тогда ответ генерируется обычным запросом)
+        """
+        text = ""
+        last_edit = 0.0
+        try:
+            async for chunk in self.ai_service.stream_response(
+                review_text=review.text or "",
+                rating=review.rating,
+                pros=review.pros,
+                cons=review.cons,
+                usage=usage
+            ):
+                text += chunk
+                if time.monotonic() - last_edit >= settings.TELEGRAM_STREAM_EDIT_INTERVAL:
+                    last_edit = time.monotonic()
+                    # Недописанный текст может обрываться внутри тега - промежуточные
+                    # правки без HTML-разметки, итоговая карточка - как обычно
+                    await self._edit_card(review, text + "▌", message_id, parse_mode=None)
+        except Exception as e:
+            record_failure("llm")
+            logger.warning(f"Потоковая генерация для отзыва {review.id} прервана: {e}")
+            return None
+        return text.strip() or None
+    
+    async def _edit_card(self, review: Review, response_text: str, message_id,
+                         parse_mode: Optional[str] = "HTML") -> bool:
+        """
+        Перерисовка карточки отзыва в уже отправленном сообщении
+        
+        Если сообщение - дайджест, показывается страница этого отзыва.
+        
+        Args:
+            parse_mode: Режим разметки сообщения (см. TelegramService.edit_review_card)
+        
+        Returns:
+            True, если сообщение обновлено
+        """
+        review_ids = await card_review_ids(self.db, message_id)
+        page = (review_ids.index(review.id), len(review_ids)) \
+            if len(review_ids) > 1 and review.id in review_ids else None
+        return await self.telegram_service.edit_review_card(
+            message_id=int(message_id),
+            review_data=review_card_data(review),
+            draft_response=response_text,
+            review_id=review.id,
+            nm_id=review.nm_id or "N/A",
+            page=page,
+            parse_mode=parse_mode
+        )
+    
+    async def _handle_digest(self, index: int, update, context):
+        """Обработка листания дайджеста (кнопки ◀ ▶)"""
+        message_id = update.callback_query.message.message_id
+        review_ids = await card_review_ids(self.db, message_id)
+        if not 0 <= index < len(review_ids):
+            return
+        
+        review = await self.db.get(Review, review_ids[index])
+        if not review:
+            # Запрос уже подтвержден в TelegramService._handle_callback
+            await update.callback_query.message.reply_text("Отзыв не найден")
+            return
+        
+        response = await self._latest_response(review.id)
+        await self.telegram_service.edit_review_card(
+            message_id=message_id,
+            review_data=review_card_data(review),
+            draft_response=response.text if response else "",
+            review_id=review.id,
+            nm_id=review.nm_id or "N/A",
+            page=(index, len(review_ids))
+        )
+    
     async def _handle_edit_manual(self, review_id: int, update, context):
         """Обработка нажатия кнопки 'Правка вручную'"""
         await update.callback_query.message.reply_text(
@@ -316,7 +814,7 @@ class ReviewHandler:
     
     async def _handle_skip(self, review_id: int, update, context):
         """Обработка нажатия кнопки 'Пропустить'"""
-        review = self.db.query(Review).filter(Review.id == review_id).first()
+        review = await self.db.get(Review, review_id)
         if not review:
             await update.callback_query.message.reply_text("Отзыв не найден")
             return
@@ -324,14 +822,12 @@ class ReviewHandler:
         review.status = ReviewStatus.SKIPPED
         
         # Обновление уведомления
-        notification = self.db.query(TelegramNotification).filter(
-            TelegramNotification.review_id == review_id
-        ).order_by(TelegramNotification.created_at.desc()).first()
+        notification = await self._latest_notification(review_id)
         if notification:
             notification.action_type = "skip"
             notification.action_taken_at = datetime.utcnow()
             notification.status = "completed"
         
-        self.db.commit()
+        await self.db.commit()
         await update.callback_query.message.reply_text("🚫 Отзыв пропущен. Переходим к следующему.")
 
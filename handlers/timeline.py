@@ -0,0 +1,203 @@
+"""Хронология этапов обработки отзывов"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+
+from sqlalchemy import delete, insert
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import ReviewTimeline
+
+logger = logging.getLogger(__name__)
+
+
+class Timeline:
+    """
+    Этапы одной обработки в порядке выполнения
+    
+    Смещения отсчитываются от начала обработки пакета: хронология отзыва
+    наследует этапы пакета (сохранение, пакетная генерация), поэтому
+    в ней видно и ожидание свободного воркера.
+    """
+    
+    def __init__(self, parent: Optional["Timeline"] = None):
+        self.started = parent.started if parent else time.perf_counter()
+        self.started_at = parent.started_at if parent else datetime.utcnow()
+        self.spans: List[Tuple[str, int, int]] = list(parent.spans) if parent else []
+    
+    def add(self, name: str, started: float, duration: float):
+        """
+        Добавление этапа
+        
+        Args:
+            name: Название этапа (db, llm, wb_publish, telegram, ...)
+            started: Момент начала по time.perf_counter()
+            duration: Длительность в секундах
+        """
+        self.spans.append((name, round((started - self.started) * 1000), round(duration * 1000)))
+    
+    @property
+    def total_ms(self) -> int:
+        """Время от начала обработки до конца последнего этапа"""
+        return round((time.perf_counter() - self.started) * 1000)
+
+
+_current: ContextVar[Optional[Timeline]] = ContextVar("review_timeline", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Замер этапа в хронологии текущей обработки
+    
+    Вне обработки отзыва (или при выключенном TIMELINE_ENABLED) ничего не делает.
+    
+    Args:
+        name: Название этапа
+    """
+    timeline = _current.get()
+    if timeline is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timeline.add(name, started, time.perf_counter() - started)
+
+
+@contextmanager
+def batch_timeline():
+    """Общая хронология пакета - этапы до маршрутизации отдельных отзывов"""
+    if not settings.TIMELINE_ENABLED:
+        yield None
+        return
+    token = _current.set(Timeline())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def review_timeline(review_id: int):
+    """
+    Хронология обработки одного отзыва
+    
+    Внутри batch_timeline хронология отзыва начинается с этапов пакета.
+    По завершении (в том числе с ошибкой) хронология передается
+    в timeline_recorder.
+    
+    Args:
+        review_id: ID отзыва
+    """
+    if not settings.TIMELINE_ENABLED:
+        yield
+        return
+    timeline = Timeline(_current.get())
+    token = _current.set(timeline)
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        _current.reset(token)
+        timeline_recorder.record(review_id, timeline, failed)
+
+
+class TimelineRecorder:
+    """Буфер хронологий, записываемых в БД одним INSERT на пачку"""
+    
+    def __init__(self):
+        self._pending: List[Dict] = []
+        self._flushing: Optional[asyncio.Task] = None
+    
+    def record(self, review_id: int, timeline: Timeline, failed: bool = False):
+        """Постановка хронологии в очередь на запись"""
+        self._pending.append({
+            "review_id": review_id,
+            "started_at": timeline.started_at,
+            "total_ms": timeline.total_ms,
+            "spans": json.dumps(timeline.spans, ensure_ascii=False, separators=(",", ":")),
+            "failed": failed
+        })
+        if len(self._pending) >= settings.TIMELINE_FLUSH_SIZE and self._flushing is None:
+            self._flushing = asyncio.create_task(self._flush_background())
+    
+    async def _flush_background(self):
+        """Запись заполненного буфера в фоне"""
+        try:
+            await self.flush()
+        finally:
+            self._flushing = None
+    
+    async def flush(self):
+        """Запись накопленных хронологий"""
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(insert(ReviewTimeline), rows)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Ошибка при сохранении хронологии обработки {len(rows)} отзывов: {e}")
+    
+    async def prune(self) -> int:
+        """
+        Удаление хронологий старше TIMELINE_RETENTION_DAYS
+        
+        Returns:
+            Количество удаленных хронологий
+        """
+        if settings.TIMELINE_RETENTION_DAYS <= 0:
+            return 0
+        threshold = datetime.utcnow() - timedelta(days=settings.TIMELINE_RETENTION_DAYS)
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(delete(ReviewTimeline).where(ReviewTimeline.started_at < threshold))
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Ошибка при удалении устаревших хронологий обработки: {e}")
+                return 0
+        if result.rowcount:
+            logger.info(f"Удалено хронологий обработки старше {settings.TIMELINE_RETENTION_DAYS} дн.: {result.rowcount}")
+        return result.rowcount
+
+
+timeline_recorder = TimelineRecorder()
+
+
+def timeline_as_dict(row: ReviewTimeline) -> Dict:
+    """
+    Хронология из БД в виде словаря для API
+    
+    Args:
+        row: Запись хронологии
+    
+    Returns:
+        Этапы с началом и длительностью и суммарное время по каждому этапу
+    """
+    spans = [
+        {"stage": name, "start_ms": start_ms, "duration_ms": duration_ms}
+        for name, start_ms, duration_ms in json.loads(row.spans)
+    ]
+    stages: Dict[str, int] = {}
+    for item in spans:
+        stages[item["stage"]] = stages.get(item["stage"], 0) + item["duration_ms"]
+    return {
+        "started_at": row.started_at.isoformat(),
+        "total_ms": row.total_ms,
+        "failed": row.failed,
+        "stages_ms": stages,
+        "spans": spans
+    }
@@ -1,11 +1,23 @@
-"""Скрипт для инициализации базы данных"""
-from database.db import init_db
+"""Скрипт для инициализации базы данных и добавления продавцов"""
+from database.db import SessionLocal, init_db
+from database.sellers import add_seller
+import argparse
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Инициализация БД WB Reviews Agent")
+    parser.add_argument("--add-seller", metavar="NAME", help="добавить продавца (кабинет WB) с этим именем")
+    parser.add_argument("--wb-api-key", help="API-ключ кабинета добавляемого продавца")
+    parser.add_argument("--llm-weight", type=int, default=1, help="доля продавца в емкости OpenRouter")
+    parser.add_argument("--wb-read-rate-limit", type=float, help="лимит чтения WB API, запросов в секунду")
+    parser.add_argument("--wb-write-rate-limit", type=float, help="лимит публикации в WB API, запросов в секунду")
+    args = parser.parse_args()
+    if args.add_seller and not args.wb_api_key:
+        parser.error("для --add-seller нужен --wb-api-key")
+    
     logger.info("Инициализация базы данных...")
     try:
         init_db()
@@ -13,4 +25,11 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"❌ Ошибка при инициализации БД: {e}")
         raise
-
+    
+    if args.add_seller:
+        db = SessionLocal()
+        try:
+            add_seller(db, args.add_seller, args.wb_api_key, llm_weight=args.llm_weight,
+                       wb_read_rate_limit=args.wb_read_rate_limit, wb_write_rate_limit=args.wb_write_rate_limit)
+        finally:
+            db.close()
@@ -1,18 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Literal, Optional
+import base64
+import hmac
 import platform
 import sys
 import logging
 from contextlib import asynccontextmanager
 
-from database.db import get_db, init_db
-from database.models import Review, Response, TelegramNotification, ReviewStatus
-from services.wb_service import WBService
-from handlers.review_handler import ReviewHandler
-from scheduler.tasks import start_scheduler, stop_scheduler
-from services.telegram_service import TelegramService
+from config import settings
+from database.db import AsyncSessionLocal, SessionLocal, get_read_db, init_db
+from database.models import (
+    Seller, Review, Response, TelegramNotification, PublishJob, ReviewTimeline, ReviewStatus, ResponseStatus,
+    PublishJobStatus
+)
+from database.counters import read_counters, recount, REVIEWS, RESPONSES
+from handlers.review_handler import ReviewHandler, register_callbacks
+from scheduler.tasks import for_each_seller, start_scheduler, stop_scheduler
+from scheduler.leader import leader_election
+from services.container import ServiceContainer
+from services.metrics import QUEUE_DEPTH
+from services.http_clients import init_http_clients, close_http_clients
+from services.response_cache import response_cache
+from services.traffic_recorder import traffic_recorder
+from handlers.publish_worker import publish_worker_pool
+from handlers.card_digest import card_digest
+from handlers.timeline import timeline_recorder, timeline_as_dict
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,6 +45,10 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Инициализация приложения...")
     
+    # Без секрета эндпоинт вебхука не отличит Telegram от поддельных запросов
+    if settings.TELEGRAM_MODE == "webhook" and not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise RuntimeError("Для TELEGRAM_MODE=webhook необходимо задать TELEGRAM_WEBHOOK_SECRET")
+    
     # Инициализация БД
     try:
         init_db()
@@ -35,31 +56,60 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Ошибка при инициализации БД: {e}")
     
-    # Запуск планировщика
-    try:
-        start_scheduler()
-        logger.info("Планировщик запущен")
-    except Exception as e:
-        logger.error(f"Ошибка при запуске планировщика: {e}")
+    # Общие HTTP-клиенты с пулом соединений
+    await init_http_clients()
+    
+    # Сервисы создаются один раз и передаются в обработчики и планировщик
+    services = ServiceContainer()
+    register_callbacks(services)
+    app.state.services = services
+    
+    # Запуск воркеров публикации ответов
+    if settings.OUTBOX_ENABLED:
+        await publish_worker_pool.start(wb_service=services.wb_service, sellers=services.sellers)
     
-    # Запуск Telegram бота в фоне
+    # Запуск Telegram бота в фоне; при выборе ведущего обновления
+    # в режиме polling получает только ведущий процесс
+    import asyncio
+    telegram_started = asyncio.create_task(services.start(poll=not settings.LEADER_ELECTION_ENABLED))
+    logger.info("Telegram бот запущен")
+    
+    async def on_elected():
+        start_scheduler(services)
+        if settings.TELEGRAM_MODE == "polling":
+            await telegram_started
+            await services.telegram_service.resume_polling()
+    
+    async def on_demoted():
+        await stop_scheduler()
+        await services.telegram_service.pause_polling()
+    
+    # Запуск планировщика: в каждом процессе или только в ведущем
     try:
-        import asyncio
-        telegram_service = TelegramService()
-        telegram_service.initialize()
-        # Запуск polling в фоне
-        async def run_bot():
-            await telegram_service.start_polling()
-        asyncio.create_task(run_bot())
-        logger.info("Telegram бот запущен")
+        if settings.LEADER_ELECTION_ENABLED:
+            await leader_election.start(on_elected, on_demoted)
+        else:
+            start_scheduler(services)
+            logger.info("Планировщик запущен")
     except Exception as e:
-        logger.error(f"Ошибка при запуске Telegram бота: {e}")
+        logger.error(f"Ошибка при запуске планировщика: {e}")
     
     yield
     
     # Shutdown
     logger.info("Остановка приложения...")
-    stop_scheduler()
+    if settings.LEADER_ELECTION_ENABLED:
+        # Планировщик останавливается обработчиком on_demoted
+        await leader_election.stop()
+    else:
+        await stop_scheduler()
+    await card_digest.stop()
+    await services.stop()
+    await publish_worker_pool.stop()
+    await timeline_recorder.flush()
+    await close_http_clients()
+    response_cache.close()
+    traffic_recorder.close()
     logger.info("Приложение остановлено")
 
 
@@ -82,7 +132,9 @@ def root():
             "health": "/health",
             "info": "/info",
             "reviews": "/reviews",
+            "sellers": "/sellers",
             "stats": "/stats",
+            "metrics": "/metrics",
             "process": "/reviews/process (POST)"
         }
     }
@@ -93,6 +145,7 @@ def health_check():
     """Health check эндпоинт для мониторинга"""
     return {
         "status": "healthy",
+        "leader": leader_election.is_leader if settings.LEADER_ELECTION_ENABLED else None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -128,16 +181,92 @@ def test_endpoint():
     }
 
 
+def _as_utc_naive(value: datetime) -> datetime:
+    """Дата с часовым поясом в UTC без tzinfo, как хранятся даты в БД"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _encode_cursor(review: Review) -> str:
+    """Курсор keyset-пагинации по (created_at, id)"""
+    raw = f"{review.created_at.isoformat()}|{review.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    """Разбор курсора keyset-пагинации"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, review_id = raw.rsplit("|", 1)
+        return _as_utc_naive(datetime.fromisoformat(created_at)), int(review_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
 @app.get("/reviews")
-def get_reviews(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получение списка всех отзывов"""
-    reviews = db.query(Review).offset(skip).limit(limit).all()
+def get_reviews(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    status: Optional[ReviewStatus] = None,
+    rating_min: Optional[int] = Query(None, ge=1, le=5),
+    rating_max: Optional[int] = Query(None, ge=1, le=5),
+    nm_id: Optional[str] = None,
+    seller_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    total: Literal["none", "estimate", "exact"] = "none",
+    db: Session = Depends(get_read_db)
+):
+    """
+    Получение списка отзывов (от новых к старым)
+    
+    Пагинация по курсору: next_cursor из ответа передается в cursor
+    следующего запроса. total=estimate берет количество из счетчиков
+    статусов (только без фильтров, кроме status), total=exact считает
+    COUNT(*) с фильтрами. created_from/created_to с часовым поясом
+    приводятся к UTC.
+    """
+    query = db.query(Review)
+    if status:
+        query = query.filter(Review.status == status)
+    if rating_min is not None:
+        query = query.filter(Review.rating >= rating_min)
+    if rating_max is not None:
+        query = query.filter(Review.rating <= rating_max)
+    if nm_id:
+        query = query.filter(Review.nm_id == nm_id)
+    if seller_id is not None:
+        query = query.filter(Review.seller_id == seller_id)
+    if created_from:
+        query = query.filter(Review.created_at >= _as_utc_naive(created_from))
+    if created_to:
+        query = query.filter(Review.created_at < _as_utc_naive(created_to))
+    
+    total_count = None
+    if total == "exact":
+        total_count = query.count()
+    elif total == "estimate" and rating_min is None and rating_max is None \
+            and not nm_id and seller_id is None and not created_from and not created_to:
+        counts = read_counters(db).get(REVIEWS, {})
+        total_count = counts.get(status.value, 0) if status else sum(counts.values())
+    
+    if cursor:
+        query = query.filter(tuple_(Review.created_at, Review.id) < _decode_cursor(cursor))
+    
+    reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1).all()
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    
     return {
-        "total": db.query(Review).count(),
+        "total": total_count,
+        "next_cursor": _encode_cursor(reviews[-1]) if has_more else None,
         "reviews": [
             {
                 "id": review.id,
                 "wb_review_id": review.wb_review_id,
+                "seller_id": review.seller_id,
+                "nm_id": review.nm_id,
                 "rating": review.rating,
                 "author": review.author,
                 "status": review.status.value,
@@ -149,7 +278,7 @@ def get_reviews(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
 
 
 @app.get("/reviews/{review_id}")
-def get_review(review_id: int, db: Session = Depends(get_db)):
+def get_review(review_id: int, db: Session = Depends(get_read_db)):
     """Получение детальной информации об отзыве"""
     review = db.query(Review).filter(Review.id == review_id).first()
     if not review:
@@ -160,6 +289,7 @@ def get_review(review_id: int, db: Session = Depends(get_db)):
     return {
         "id": review.id,
         "wb_review_id": review.wb_review_id,
+        "seller_id": review.seller_id,
         "product_id": review.product_id,
         "nm_id": review.nm_id,
         "supplier_article": review.supplier_article,
@@ -177,6 +307,10 @@ def get_review(review_id: int, db: Session = Depends(get_db)):
                 "text": resp.text,
                 "status": resp.status.value,
                 "is_manual_edit": resp.is_manual_edit,
+                "route": resp.route.value if resp.route else None,
+                "prompt_tokens": resp.prompt_tokens,
+                "max_tokens": resp.max_tokens,
+                "generation_ms": resp.generation_ms,
                 "created_at": resp.created_at.isoformat(),
                 "published_at": resp.published_at.isoformat() if resp.published_at else None
             }
@@ -185,52 +319,139 @@ def get_review(review_id: int, db: Session = Depends(get_db)):
     }
 
 
+@app.get("/reviews/{review_id}/timeline")
+def get_review_timeline(review_id: int, db: Session = Depends(get_read_db)):
+    """Хронология этапов обработки отзыва (db, llm, wb_publish, telegram)"""
+    if not db.query(Review.id).filter(Review.id == review_id).first():
+        raise HTTPException(status_code=404, detail="Отзыв не найден")
+    
+    timelines = db.query(ReviewTimeline).filter(
+        ReviewTimeline.review_id == review_id
+    ).order_by(ReviewTimeline.id).all()
+    
+    return {
+        "review_id": review_id,
+        "timelines": [timeline_as_dict(timeline) for timeline in timelines]
+    }
+
+
+@app.get("/sellers")
+def get_sellers(db: Session = Depends(get_read_db)):
+    """Список продавцов (без API-ключей)"""
+    sellers = db.query(Seller).order_by(Seller.id).all()
+    return {
+        "sellers": [
+            {
+                "id": seller.id,
+                "name": seller.name,
+                "is_active": seller.is_active,
+                "llm_weight": seller.llm_weight,
+                "wb_read_rate_limit": seller.wb_read_rate_limit or settings.WB_READ_RATE_LIMIT,
+                "wb_write_rate_limit": seller.wb_write_rate_limit or settings.WB_WRITE_RATE_LIMIT,
+                "created_at": seller.created_at.isoformat()
+            }
+            for seller in sellers
+        ]
+    }
+
+
 @app.post("/reviews/process")
-async def process_reviews(db: Session = Depends(get_db)):
-    """Ручной запуск обработки новых отзывов"""
+async def process_reviews(request: Request):
+    """Ручной запуск обработки новых отзывов всех активных продавцов"""
     try:
-        wb_service = WBService()
-        reviews = await wb_service.get_reviews()
+        services: ServiceContainer = request.app.state.services
         
-        if not reviews:
-            return {"message": "Новых отзывов не найдено", "processed": 0}
+        async def process(seller: Seller):
+            async with AsyncSessionLocal() as db:
+                handler = ReviewHandler(db, services, seller_id=seller.id)
+                return await handler.process_review_stream(handler.wb_service.iter_review_pages())
+        
+        results = await for_each_seller(services, process)
+        processed = sum(stats.total for stats in results.values())
         
-        handler = ReviewHandler(db)
-        await handler.process_reviews(reviews)
+        if not processed:
+            return {"message": "Новых отзывов не найдено", "processed": 0}
         
         return {
             "message": "Обработка завершена",
-            "processed": len(reviews)
+            "processed": processed,
+            "sellers": {name: stats.as_dict() for name, stats in results.items()}
         }
     except Exception as e:
         logger.error(f"Ошибка при обработке отзывов: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(settings.TELEGRAM_WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
+    """Прием обновлений Telegram в режиме webhook"""
+    if settings.TELEGRAM_MODE != "webhook":
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    # Обновления без секрета отклоняются: через них можно опубликовать или пропустить отзыв
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+        raise HTTPException(status_code=403, detail="Неверный секретный токен")
+    
+    services: ServiceContainer = request.app.state.services
+    try:
+        await services.telegram_service.process_webhook_update(await request.json())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректное обновление: {e}")
+    return {"ok": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(db: Session = Depends(get_read_db)):
+    """Метрики в формате Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    # Глубина очереди публикации считается при каждом опросе - одним GROUP BY
+    jobs = dict(db.query(PublishJob.status, func.count(PublishJob.id)).group_by(PublishJob.status).all())
+    QUEUE_DEPTH.labels("publish_outbox").set(
+        jobs.get(PublishJobStatus.PENDING, 0) + jobs.get(PublishJobStatus.IN_PROGRESS, 0)
+    )
+    QUEUE_DEPTH.labels("publish_dead").set(jobs.get(PublishJobStatus.DEAD, 0))
+    
+    return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/stats")
-def get_stats(db: Session = Depends(get_db)):
-    """Статистика обработки отзывов"""
-    total_reviews = db.query(Review).count()
-    published = db.query(Review).filter(Review.status == ReviewStatus.PUBLISHED).count()
-    pending = db.query(Review).filter(Review.status == ReviewStatus.PENDING).count()
-    skipped = db.query(Review).filter(Review.status == ReviewStatus.SKIPPED).count()
-    new_reviews = db.query(Review).filter(Review.status == ReviewStatus.NEW).count()
+def get_stats(exact: bool = False, db: Session = Depends(get_read_db)):
+    """
+    Статистика обработки отзывов
     
-    total_responses = db.query(Response).count()
-    published_responses = db.query(Response).filter(Response.status == "published").count()
+    По умолчанию читается из счетчиков статусов (один запрос);
+    exact=true выполняет полный пересчет и сверяет счетчики.
+    """
+    if exact:
+        # Пересчет перезаписывает счетчики, поэтому идет через пишущую сессию
+        write_db = SessionLocal()
+        try:
+            counters = recount(write_db)
+        finally:
+            write_db.close()
+    else:
+        counters = read_counters(db)
+    reviews = counters.get(REVIEWS, {})
+    responses = counters.get(RESPONSES, {})
     
     return {
         "reviews": {
-            "total": total_reviews,
-            "published": published,
-            "pending": pending,
-            "skipped": skipped,
-            "new": new_reviews
+            "total": sum(reviews.values()),
+            "published": reviews.get(ReviewStatus.PUBLISHED.value, 0),
+            "pending": reviews.get(ReviewStatus.PENDING.value, 0),
+            "skipped": reviews.get(ReviewStatus.SKIPPED.value, 0),
+            "new": reviews.get(ReviewStatus.NEW.value, 0)
         },
         "responses": {
-            "total": total_responses,
-            "published": published_responses
+            "total": sum(responses.values()),
+            "published": responses.get(ResponseStatus.PUBLISHED.value, 0)
         },
+        "response_cache": response_cache.stats(),
+        "exact": exact,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -244,8 +465,11 @@ if __name__ == "__main__":
     print("   - GET  /info          - Информация о системе")
     print("   - GET  /reviews       - Список отзывов")
     print("   - GET  /reviews/{id}  - Детали отзыва")
+    print("   - GET  /reviews/{id}/timeline - Хронология обработки отзыва")
+    print("   - GET  /sellers       - Продавцы")
     print("   - POST /reviews/process - Ручная обработка отзывов")
     print("   - GET  /stats         - Статистика")
+    print("   - GET  /metrics       - Метрики Prometheus")
     print("\n🌐 Откройте в браузере: http://localhost:8000")
     print("📚 Документация API: http://localhost:8000/docs")
     print("⏰ Планировщик проверяет отзывы каждый час")
@@ -0,0 +1,140 @@
+"""Выбор ведущего процесса через аренду в БД"""
+from typing import Awaitable, Callable, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.leases import acquire_lease, release_lease, LEADER_LEASE
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Ведущий процесс среди нескольких воркеров приложения
+    
+    Каждый процесс раз в LEADER_HEARTBEAT_INTERVAL пытается захватить или
+    продлить аренду LEADER_LEASE_SECONDS. Владелец аренды запускает
+    задачи, которые должны работать в одном экземпляре (планировщик,
+    polling Telegram), остальные только отвечают на запросы API. Если
+    ведущий упал, аренду забирает другой процесс после ее истечения,
+    а при штатной остановке - сразу.
+    
+    Обработчики смены роли выполняются в отдельных задачах: цикл продления
+    аренды не ждет их (например, подключения к Telegram), иначе аренда
+    истекла бы у процесса, который продолжает считать себя ведущим.
+    """
+    
+    def __init__(self, name: str = LEADER_LEASE):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._valid_until = 0.0
+        self._on_elected: Optional[Callable[[], Awaitable]] = None
+        self._on_demoted: Optional[Callable[[], Awaitable]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._transition: Optional[asyncio.Task] = None
+    
+    async def start(self, on_elected: Callable[[], Awaitable], on_demoted: Callable[[], Awaitable]):
+        """
+        Запуск цикла выборов
+        
+        Args:
+            on_elected: Вызывается, когда процесс стал ведущим
+            on_demoted: Вызывается, когда процесс перестал быть ведущим
+        """
+        if self._task:
+            return
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Выбор ведущего процесса запущен ({self.holder})")
+    
+    async def stop(self):
+        """Остановка цикла и освобождение аренды (ведущим сразу станет другой процесс)"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self._demote()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(release_lease, self.name, self.holder)
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка при освобождении аренды {self.name}: {e}")
+        if self._transition:
+            await asyncio.gather(self._transition, return_exceptions=True)
+            self._transition = None
+    
+    async def _heartbeat(self) -> bool:
+        """Захват или продление аренды; True - процесс владеет арендой"""
+        started = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            acquired = await db.run_sync(acquire_lease, self.name, self.holder, settings.LEADER_LEASE_SECONDS)
+            await db.commit()
+        if acquired:
+            self._valid_until = started + settings.LEADER_LEASE_SECONDS
+        return acquired
+    
+    async def _run(self):
+        """Цикл выборов: продление аренды и смена роли"""
+        while True:
+            try:
+                acquired = await self._heartbeat()
+            except Exception as e:
+                # Без связи с БД роль сохраняется, пока не истек уже продленный срок аренды
+                logger.error(f"Ошибка продления аренды {self.name}: {e}")
+                acquired = self.is_leader and time.monotonic() < self._valid_until
+            
+            if acquired and not self.is_leader:
+                self._elect()
+            elif not acquired and self.is_leader:
+                self._demote()
+            
+            await asyncio.sleep(settings.LEADER_HEARTBEAT_INTERVAL)
+    
+    def _elect(self):
+        """Переход в роль ведущего"""
+        self.is_leader = True
+        logger.info(f"Процесс {self.holder} стал ведущим")
+        self._switch(self._on_elected, "запуске")
+    
+    def _demote(self):
+        """Выход из роли ведущего"""
+        self.is_leader = False
+        logger.warning(f"Процесс {self.holder} больше не ведущий")
+        self._switch(self._on_demoted, "остановке")
+    
+    def _switch(self, callback: Callable[[], Awaitable], action: str):
+        """
+        Запуск обработчика смены роли в отдельной задаче
+        
+        Незавершенный обработчик предыдущей смены роли отменяется: например,
+        при потере аренды не нужно дожидаться подключения к Telegram.
+        
+        Args:
+            callback: Обработчик (on_elected или on_demoted)
+            action: Описание для журнала ошибок
+        """
+        previous = self._transition
+        
+        async def run():
+            if previous and not previous.done():
+                previous.cancel()
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Ошибка при {action} задач ведущего процесса: {e}")
+        
+        self._transition = asyncio.create_task(run())
+
+
+leader_election = LeaderElection()
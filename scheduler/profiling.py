@@ -0,0 +1,65 @@
+"""Профилирование запусков планировщика"""
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import cProfile
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _pyinstrument_available() -> bool:
+    """Проверка наличия семплирующего профайлера pyinstrument"""
+    try:
+        import pyinstrument  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+@contextmanager
+def profile_run(name: str):
+    """
+    Профилирование блока при включенном SCHEDULER_PROFILE_ENABLED
+    
+    Используется pyinstrument (семплирующий, с учетом async-кода, есть
+    в requirements.txt), отчет сохраняется в HTML. Если он все же не
+    установлен, профиль снимает cProfile (.prof в формате pstats) - с
+    предупреждением в журнале: cProfile не видит ожидание в корутинах.
+    Отчеты пишутся в SCHEDULER_PROFILE_DIR.
+    
+    Args:
+        name: Префикс имени файла отчета
+    """
+    if not settings.SCHEDULER_PROFILE_ENABLED:
+        yield
+        return
+    
+    profile_dir = Path(settings.SCHEDULER_PROFILE_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    stem = profile_dir / f"{name}_{datetime.utcnow():%Y%m%d_%H%M%S}"
+    
+    if _pyinstrument_available():
+        from pyinstrument import Profiler
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = stem.with_suffix(".html")
+            path.write_text(profiler.output_html(), encoding="utf-8")
+            logger.info(f"Профиль запуска сохранен: {path}")
+    else:
+        logger.warning("pyinstrument не установлен (pip install -r requirements.txt), профиль снимается cProfile")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = stem.with_suffix(".prof")
+            profiler.dump_stats(str(path))
+            logger.info(f"Профиль запуска сохранен: {path}")
@@ -1,52 +1,151 @@
 """Планировщик задач для периодической проверки отзывов"""
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy.orm import Session
+from typing import Awaitable, Callable, Dict, Optional, Set
+import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 
-from database.db import SessionLocal
-from services.wb_service import WBService
+from database.db import AsyncSessionLocal
+from database.models import Seller
+from database.sellers import seller_sync_source
+from database.sync_state import get_sync_state
+from services.container import ServiceContainer
+from services.metrics import SCHEDULER_RUN_DURATION, record_failure
+from services.rate_limiter import current_seller
+from handlers.card_digest import card_digest
+from handlers.pipeline_stats import PipelineStats
 from handlers.review_handler import ReviewHandler
+from handlers.timeline import timeline_recorder
+from scheduler.profiling import profile_run
 from config import settings
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
+# Выполняющиеся проверки: APScheduler при остановке их не прерывает
+_running_checks: Set[asyncio.Task] = set()
 
-async def check_new_reviews():
-    """Задача для проверки новых отзывов"""
-    logger.info("Запуск проверки новых отзывов")
+
+async def for_each_seller(services: ServiceContainer,
+                          process: Callable[[Seller], Awaitable[Optional[PipelineStats]]]) -> Dict[str, PipelineStats]:
+    """
+    Конкурентная обработка всех активных продавцов
     
-    db: Session = SessionLocal()
-    try:
-        wb_service = WBService()
-        
-        # Получаем дату последней проверки (например, час назад)
-        date_from = (datetime.utcnow() - timedelta(hours=2)).isoformat()
-        
-        # Получение отзывов из WB API
-        reviews = await wb_service.get_reviews(date_from=date_from)
-        
-        if not reviews:
-            logger.info("Новых отзывов не найдено")
-            return
-        
-        logger.info(f"Найдено {len(reviews)} новых отзывов")
+    Одновременно обрабатываются не более SCHEDULER_SELLER_CONCURRENCY
+    продавцов. У каждого свои ограничители частоты WB, а запросы к ИИ
+    делят общую емкость по весам продавцов (см. FairShare). Ошибка одного
+    продавца не прерывает обработку остальных.
+    
+    Args:
+        services: Общие сервисы процесса
+        process: Обработка одного продавца
+    
+    Returns:
+        Статистика по именам продавцов (только завершившихся без ошибки)
+    """
+    async with AsyncSessionLocal() as db:
+        sellers = await services.sellers.refresh(db)
+    
+    semaphore = asyncio.Semaphore(max(1, settings.SCHEDULER_SELLER_CONCURRENCY))
+    results: Dict[str, PipelineStats] = {}
+    
+    async def run(seller: Seller):
+        async with semaphore:
+            # Задача продавца - отдельный контекст: доля ИИ считается на его ID
+            current_seller.set(seller.id)
+            try:
+                stats = await process(seller)
+                if stats is not None:
+                    results[seller.name] = stats
+            except Exception as e:
+                record_failure("scheduler")
+                logger.error(f"Ошибка при обработке отзывов продавца {seller.name}: {e}")
+    
+    await asyncio.gather(*(run(seller) for seller in sellers))
+    return results
+
+
+async def check_seller_reviews(services: ServiceContainer, seller: Seller) -> PipelineStats:
+    """
+    Загрузка и обработка новых отзывов продавца с его отметки синхронизации
+    
+    Args:
+        services: Общие сервисы процесса
+        seller: Продавец
+    
+    Returns:
+        Статистика обработки
+    """
+    sync_source = seller_sync_source(seller.id)
+    async with AsyncSessionLocal() as db:
+        handler = ReviewHandler(db, services, seller_id=seller.id)
+        # Отзывы, сохраненные ранее, но не дошедшие до маршрутизации
+        await handler.route_stranded()
         
-        # Обработка отзывов
-        handler = ReviewHandler(db)
-        await handler.process_reviews(reviews)
+        # Загрузка продолжается с сохраненной отметки синхронизации
+        sync_state = await db.run_sync(get_sync_state, sync_source)
+        if sync_state and sync_state.last_review_date:
+            date_from = sync_state.last_review_date
+            logger.info(f"Загрузка отзывов продавца {seller.name} с отметки синхронизации "
+                        f"{date_from.isoformat()} ({sync_state.last_review_id})")
+        else:
+            date_from = datetime.utcnow() - timedelta(hours=settings.SYNC_INITIAL_LOOKBACK_HOURS)
         
-    except Exception as e:
-        logger.error(f"Ошибка при проверке новых отзывов: {e}")
+        # Постраничная загрузка и обработка отзывов из WB API
+        stats = await handler.process_review_stream(
+            handler.wb_service.iter_review_pages(date_from=date_from),
+            sync_source=sync_source
+        )
+    
+    if not stats.total:
+        logger.info(f"Новых отзывов продавца {seller.name} не найдено")
+    return stats
+
+
+async def check_new_reviews(services: ServiceContainer):
+    """
+    Задача для проверки новых отзывов всех продавцов
+    
+    Args:
+        services: Общие сервисы процесса
+    """
+    logger.info("Запуск проверки новых отзывов")
+    started = time.perf_counter()
+    task = asyncio.current_task()
+    _running_checks.add(task)
+    
+    try:
+        with profile_run("check_new_reviews"):
+            try:
+                # Карточки, не отправленные до перезапуска или из-за ошибки Telegram
+                await card_digest.recover(services.telegram_service)
+            except Exception as e:
+                logger.error(f"Ошибка при повторной отправке карточек отзывов: {e}")
+            
+            # Хронологии обработки хранятся TIMELINE_RETENTION_DAYS
+            await timeline_recorder.prune()
+            
+            try:
+                await for_each_seller(services, lambda seller: check_seller_reviews(services, seller))
+            except Exception as e:
+                record_failure("scheduler")
+                logger.error(f"Ошибка при проверке новых отзывов: {e}")
     finally:
-        db.close()
+        _running_checks.discard(task)
+    
+    SCHEDULER_RUN_DURATION.observe(time.perf_counter() - started)
 
 
-def start_scheduler():
-    """Запуск планировщика"""
+def start_scheduler(services: ServiceContainer):
+    """
+    Запуск планировщика
+    
+    Args:
+        services: Общие сервисы процесса, передаваемые в задачи
+    """
     interval = settings.SCHEDULER_INTERVAL
     
     scheduler.add_job(
@@ -54,6 +153,7 @@ def start_scheduler():
         trigger=IntervalTrigger(seconds=interval),
         id="check_reviews",
         name="Проверка новых отзывов",
+        kwargs={"services": services},
         replace_existing=True
     )
     
@@ -61,8 +161,22 @@ def start_scheduler():
     logger.info(f"Планировщик запущен. Интервал проверки: {interval} секунд ({interval // 60} минут)")
 
 
-def stop_scheduler():
-    """Остановка планировщика"""
-    scheduler.shutdown()
-    logger.info("Планировщик остановлен")
+async def stop_scheduler():
+    """
+    Остановка планировщика (если он запущен в этом процессе)
+    
+    Выполняющаяся проверка отзывов прерывается: после потери роли ведущего
+    ее продолжил бы уже другой процесс. Повторный вызов ничего не делает.
+    """
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+        logger.info("Планировщик остановлен")
+    
+    running = list(_running_checks)
+    if not running:
+        return
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+    logger.info(f"Прервано выполняющихся проверок отзывов: {len(running)}")
 
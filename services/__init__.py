@@ -2,6 +2,7 @@
 from .wb_service import WBService
 from .ai_service import AIService
 from .telegram_service import TelegramService
+from .container import ServiceContainer
 
-__all__ = ["WBService", "AIService", "TelegramService"]
+__all__ = ["WBService", "AIService", "TelegramService", "ServiceContainer"]
 
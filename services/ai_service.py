@@ -1,12 +1,20 @@
 """Сервис для работы с OpenRouter API (генерация ответов на отзывы)"""
 import httpx
-from typing import Optional
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional
 from config import settings
+from services.rate_limiter import rate_limiters, llm_share, send_with_rate_limit, OPENROUTER
+from services.http_clients import http_client, OPENROUTER_CLIENT
+from services.response_cache import response_cache
+from services.metrics import observe_stage, record_failure, LLM
+from services.prompt_builder import prompt_builder, estimate_tokens, SYSTEM_PROMPT, RESPONSE_REQUIREMENTS
+from services.traffic_recorder import traffic_recorder
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-
 class AIService:
     """Сервис для генерации ответов на отзывы через OpenRouter"""
     
@@ -21,93 +29,75 @@ class AIService:
             "X-Title": "WB Reviews Agent"  # Опционально
         }
     
-    def _build_prompt(self, review_text: str, rating: int, pros: Optional[str] = None, 
-                     cons: Optional[str] = None, product_info: Optional[str] = None) -> str:
-        """
-        Построение промпта для генерации ответа
-        
-        Args:
-            review_text: Текст отзыва
-            rating: Рейтинг отзыва (1-5)
-            pros: Плюсы товара (если есть)
-            cons: Минусы товара (если есть)
-            product_info: Информация о товаре (опционально)
-        
-        Returns:
-            Промпт для ИИ
-        """
-        prompt = f"""Ты - профессиональный менеджер по работе с клиентами интернет-магазина Wildberries.
-
-Твоя задача - написать вежливый, профессиональный и полезный ответ на отзыв покупателя.
-
-Рейтинг отзыва: {rating}/5
-
-"""
-        if pros:
-            prompt += f"Плюсы, которые отметил покупатель:\n{pros}\n\n"
-        if cons:
-            prompt += f"Минусы, которые отметил покупатель:\n{cons}\n\n"
-        
-        prompt += f"Текст отзыва:\n{review_text}\n\n"
-        
-        if product_info:
-            prompt += f"Информация о товаре:\n{product_info}\n\n"
-        
-        prompt += """Требования к ответу:
-1. Будь вежливым и профессиональным
-2. Благодари за отзыв
-3. Если есть проблемы (низкий рейтинг) - извинись и предложи решение
-4. Если отзыв положительный - поблагодари и пригласи оставить еще отзывы
-5. Ответ должен быть кратким (2-4 предложения)
-6. Используй деловой, но дружелюбный тон
-7. Не используй эмодзи в ответе
-
-Напиши ответ на отзыв:"""
-        
-        return prompt
+    def _cache_key(self, review_text: str, rating: int, pros: Optional[str],
+                   cons: Optional[str]) -> Optional[str]:
+        """Ключ кэша ответов или None, если отзыв не кэшируется"""
+        if not settings.RESPONSE_CACHE_ENABLED or not response_cache.is_cacheable(review_text, pros, cons):
+            return None
+        return response_cache.make_key(rating, review_text, pros, cons, self.model)
     
     async def generate_response(self, review_text: str, rating: int, 
                                pros: Optional[str] = None, 
                                cons: Optional[str] = None,
-                               product_info: Optional[str] = None) -> Optional[str]:
+                               product_info: Optional[str] = None,
+                               use_cache: bool = True,
+                               usage: Optional[Dict] = None) -> Optional[str]:
         """
         Генерация ответа на отзыв через OpenRouter API
         
+        Короткие отзывы без информации о товаре обслуживаются из кэша ответов
+        (см. services.response_cache).
+        
         Args:
             review_text: Текст отзыва
             rating: Рейтинг отзыва (1-5)
             pros: Плюсы товара (опционально)
             cons: Минусы товара (опционально)
             product_info: Информация о товаре (опционально)
+            use_cache: Использовать кэш ответов (False - всегда новый ответ)
+            usage: Словарь, в который записываются оценка токенов промпта,
+                лимит ответа и время генерации (для сохранения в Response)
         
         Returns:
             Сгенерированный ответ или None в случае ошибки
         """
+        cache_key = self._cache_key(review_text, rating, pros, cons) if use_cache and not product_info else None
+        if cache_key:
+            cached_text = await response_cache.get(cache_key)
+            if cached_text:
+                logger.info(f"Ответ для отзыва с рейтингом {rating} взят из кэша")
+                return cached_text
+        
         try:
-            prompt = self._build_prompt(review_text, rating, pros, cons, product_info)
+            prompt = prompt_builder.build(review_text, rating, pros, cons, product_info)
             
             payload = {
                 "model": self.model,
                 "messages": [
                     {
                         "role": "system",
-                        "content": "Ты профессиональный менеджер по работе с клиентами. Ты пишешь вежливые и полезные ответы на отзывы покупателей."
+                        "content": SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
-                        "content": prompt
+                        "content": prompt.text
                     }
                 ],
                 "temperature": 0.7,
-                "max_tokens": 300
+                "max_tokens": prompt.max_tokens
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60.0
+            started = time.perf_counter()
+            async with llm_share.slot(), http_client(OPENROUTER_CLIENT) as client:
+                response = await send_with_rate_limit(
+                    rate_limiters.get(OPENROUTER),
+                    lambda: client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=60.0
+                    ),
+                    stage=LLM
                 )
                 response.raise_for_status()
                 data = response.json()
@@ -115,16 +105,354 @@ class AIService:
                 # Извлечение сгенерированного текста
                 if "choices" in data and len(data["choices"]) > 0:
                     generated_text = data["choices"][0]["message"]["content"].strip()
-                    logger.info(f"Ответ успешно сгенерирован для отзыва с рейтингом {rating}")
+                    latency_ms = self._record_usage(usage, prompt, started)
+                    traffic_recorder.record_llm_response(rating, generated_text, latency_ms, prompt.prompt_tokens)
+                    logger.info(
+                        f"Ответ успешно сгенерирован для отзыва с рейтингом {rating} "
+                        f"(~{prompt.prompt_tokens} токенов промпта, {latency_ms} мс)"
+                    )
+                    if cache_key and generated_text:
+                        await response_cache.put(cache_key, generated_text)
                     return generated_text
                 else:
+                    record_failure(LLM)
                     logger.error(f"Неожиданная структура ответа OpenRouter: {data}")
                     return None
                     
         except httpx.HTTPError as e:
+            record_failure(LLM)
             logger.error(f"Ошибка при генерации ответа через OpenRouter: {e}")
             return None
         except Exception as e:
+            record_failure(LLM)
             logger.error(f"Неожиданная ошибка при генерации ответа: {e}")
             return None
-
+    
+    def _record_usage(self, usage: Optional[Dict], prompt, started: float) -> int:
+        """Запись оценки токенов и времени генерации; возвращает время в мс"""
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        if usage is not None:
+            usage.update(prompt_tokens=prompt.prompt_tokens, max_tokens=prompt.max_tokens, generation_ms=latency_ms)
+        return latency_ms
+    
+    async def stream_response(self, review_text: str, rating: int,
+                              pros: Optional[str] = None,
+                              cons: Optional[str] = None,
+                              product_info: Optional[str] = None,
+                              usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Потоковая генерация ответа на отзыв (SSE OpenRouter)
+        
+        Фрагменты текста отдаются по мере генерации, кэш ответов не используется.
+        
+        Args:
+            review_text: Текст отзыва
+            rating: Рейтинг отзыва (1-5)
+            pros: Плюсы товара (опционально)
+            cons: Минусы товара (опционально)
+            product_info: Информация о товаре (опционально)
+            usage: Словарь для оценки токенов и времени генерации (см. generate_response)
+        
+        Yields:
+            Очередной фрагмент ответа
+        
+        Raises:
+            httpx.HTTPError: Ошибка запроса или обрыв потока
+        """
+        prompt = prompt_builder.build(review_text, rating, pros, cons, product_info)
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt.text
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": prompt.max_tokens,
+            "stream": True
+        }
+        
+        started = 0.0
+        
+        async with llm_share.slot(), http_client(OPENROUTER_CLIENT) as client:
+            async def send() -> httpx.Response:
+                # Этап LLM - от запроса до последнего фрагмента, без ожидания ограничителя
+                nonlocal started
+                started = time.perf_counter()
+                return await client.send(client.build_request(
+                    "POST", self.api_url, headers=self.headers, json=payload, timeout=60.0
+                ), stream=True)
+            
+            # Повтор при 429 - как у обычных запросов
+            response = await send_with_rate_limit(rate_limiters.get(OPENROUTER), send, stage=LLM, track_send=False)
+            try:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Строки SSE: "data: {...}", "data: [DONE]" и комментарии ": ..."
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    if "error" in chunk:
+                        raise httpx.HTTPError(f"OpenRouter прервал генерацию: {chunk['error']}")
+                    choices = chunk.get("choices") or []
+                    content = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if content:
+                        yield content
+            finally:
+                await response.aclose()
+        
+        latency_ms = self._record_usage(usage, prompt, started)
+        observe_stage(LLM, latency_ms / 1000)
+        logger.info(f"Потоковый ответ сгенерирован для отзыва с рейтингом {rating} ({latency_ms} мс)")
+    
+    def _build_batch_prompt(self, items: List[Dict]) -> str:
+        """
+        Построение промпта для пакетной генерации ответов
+        
+        Args:
+            items: Отзывы с ключами id, review_text, rating, pros, cons
+        
+        Returns:
+            Промпт для ИИ
+        """
+        reviews = [
+            {
+                "id": item["id"],
+                "rating": item["rating"],
+                "pros": item.get("pros") or "",
+                "cons": item.get("cons") or "",
+                "text": item.get("review_text") or ""
+            }
+            for item in items
+        ]
+        return (
+            "Ты - профессиональный менеджер по работе с клиентами интернет-магазина Wildberries.\n\n"
+            "Твоя задача - написать вежливый, профессиональный и полезный ответ на каждый из отзывов покупателей.\n\n"
+            f"Отзывы (JSON):\n{json.dumps(reviews, ensure_ascii=False)}\n\n"
+            f"{RESPONSE_REQUIREMENTS}\n\n"
+            "Верни только JSON-объект, где ключ - id отзыва, а значение - текст ответа на него."
+        )
+    
+    def _parse_batch_output(self, content: str, ids: List[str]) -> Dict[str, str]:
+        """
+        Разбор и проверка JSON-ответа пакетной генерации
+        
+        Args:
+            content: Текст ответа модели
+            ids: Ожидаемые id отзывов
+        
+        Returns:
+            Ответы по id (только корректные непустые строки для ожидаемых id)
+        """
+        content = content.strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            if content.startswith("json"):
+                content = content[4:]
+        
+        try:
+            data = json.loads(content)
+        except ValueError:
+            logger.error("Пакетный ответ OpenRouter не является корректным JSON")
+            return {}
+        
+        if not isinstance(data, dict):
+            logger.error(f"Неожиданная структура пакетного ответа OpenRouter: {type(data).__name__}")
+            return {}
+        
+        return {
+            review_id: data[review_id].strip()
+            for review_id in ids
+            if isinstance(data.get(review_id), str) and data[review_id].strip()
+        }
+    
+    def _pack_batches(self, items: List[Dict]) -> List[List[Dict]]:
+        """Разбиение отзывов на пакеты с учетом размера пакета и бюджета токенов"""
+        batches: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_tokens = 0
+        
+        for item in items:
+            item_tokens = settings.AI_BATCH_RESPONSE_TOKENS + sum(
+                estimate_tokens(item.get(key)) for key in ("review_text", "pros", "cons")
+            )
+            if current and (len(current) >= settings.AI_BATCH_SIZE
+                            or current_tokens + item_tokens > settings.AI_BATCH_TOKEN_BUDGET):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += item_tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _generate_batch(self, items: List[Dict], usage: Optional[Dict] = None) -> Dict[str, str]:
+        """
+        Генерация ответов на пакет отзывов одним запросом
+        
+        Args:
+            items: Отзывы с ключами id, review_text, rating, pros, cons
+            usage: Словарь, в который записывается число токенов промпта пакета
+                (из ответа OpenRouter, без него - оценка)
+        
+        Returns:
+            Успешно разобранные ответы по id
+        """
+        prompt_text = self._build_batch_prompt(items)
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt_text
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": settings.AI_BATCH_RESPONSE_TOKENS * len(items),
+            "response_format": {"type": "json_object"}
+        }
+        
+        try:
+            async with llm_share.slot(), http_client(OPENROUTER_CLIENT) as client:
+                response = await send_with_rate_limit(
+                    rate_limiters.get(OPENROUTER),
+                    lambda: client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=60.0
+                    ),
+                    stage=LLM
+                )
+                response.raise_for_status()
+                data = response.json()
+        except httpx.HTTPError as e:
+            record_failure(LLM)
+            logger.error(f"Ошибка при пакетной генерации ответов через OpenRouter: {e}")
+            return {}
+        except ValueError as e:
+            record_failure(LLM)
+            logger.error(f"Некорректный ответ OpenRouter при пакетной генерации: {e}")
+            return {}
+        
+        if not data.get("choices"):
+            record_failure(LLM)
+            logger.error(f"Неожиданная структура ответа OpenRouter: {data}")
+            return {}
+        
+        if usage is not None:
+            prompt_tokens = (data.get("usage") or {}).get("prompt_tokens")
+            usage["prompt_tokens"] = prompt_tokens or estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt_text)
+        
+        content = data["choices"][0]["message"]["content"] or ""
+        return self._parse_batch_output(content, [item["id"] for item in items])
+    
+    async def _run_batch(self, batch: List[Dict]):
+        """Генерация пакета с замером времени; возвращает ответы и usage пакета"""
+        batch_usage: Dict = {}
+        started = time.perf_counter()
+        generated = await self._generate_batch(batch, usage=batch_usage)
+        batch_usage["generation_ms"] = int((time.perf_counter() - started) * 1000)
+        logger.info(
+            f"Пакетная генерация: {len(generated)}/{len(batch)} ответов получено за {batch_usage['generation_ms']} мс"
+        )
+        return generated, batch_usage
+    
+    async def generate_responses_batch(self, items: List[Dict],
+                                       usage: Optional[Dict[str, Dict]] = None) -> Dict[str, Optional[str]]:
+        """
+        Пакетная генерация ответов: до AI_BATCH_SIZE отзывов в одном запросе
+        
+        Отзывы, для которых ответ не удалось получить или разобрать,
+        генерируются по одному через generate_response.
+        
+        Args:
+            items: Отзывы с ключами id, review_text, rating, pros, cons
+            usage: Словарь, в который по id записываются токены промпта
+                и время генерации (для пакета - доля отзыва в токенах промпта пакета)
+        
+        Returns:
+            Ответы по id (None для отзывов, ответ на которые получить не удалось)
+        """
+        results: Dict[str, Optional[str]] = {}
+        cache_keys: Dict[str, str] = {}
+        pending: List[Dict] = []
+        
+        for item in items:
+            cache_key = self._cache_key(item.get("review_text") or "", item["rating"], item.get("pros"), item.get("cons"))
+            if cache_key:
+                cached_text = await response_cache.get(cache_key)
+                if cached_text:
+                    results[item["id"]] = cached_text
+                    continue
+                cache_keys[item["id"]] = cache_key
+            # Длинные отзывы сокращаются до бюджета промпта (ключ кэша - по исходному тексту)
+            fields, _ = prompt_builder.fit({key: item.get(key) for key in ("review_text", "pros", "cons")})
+            pending.append({**item, **fields})
+        
+        # Пакеты отправляются одновременно; число запросов в полете ограничивает llm_share
+        packed = self._pack_batches(pending)
+        batches = [batch for batch in packed if len(batch) > 1]
+        fallback: List[Dict] = [batch[0] for batch in packed if len(batch) == 1]
+        outcomes = await asyncio.gather(*(self._run_batch(batch) for batch in batches))
+        
+        for batch, (generated, batch_usage) in zip(batches, outcomes):
+            # Токены промпта пакета делятся между отзывами пропорционально их длине
+            weights = {
+                item["id"]: 1 + sum(estimate_tokens(item.get(key)) for key in ("review_text", "pros", "cons"))
+                for item in batch
+            }
+            total_weight = sum(weights.values())
+            for item in batch:
+                text = generated.get(item["id"])
+                if text:
+                    results[item["id"]] = text
+                    traffic_recorder.record_llm_response(item["rating"], text, batch_usage["generation_ms"])
+                    if usage is not None:
+                        usage[item["id"]] = {
+                            "prompt_tokens": batch_usage["prompt_tokens"] * weights[item["id"]] // total_weight,
+                            "max_tokens": settings.AI_BATCH_RESPONSE_TOKENS,
+                            "generation_ms": batch_usage["generation_ms"]
+                        }
+                    if item["id"] in cache_keys:
+                        await response_cache.put(cache_keys[item["id"]], text)
+                else:
+                    fallback.append(item)
+        
+        if fallback:
+            fallback_usage = {item["id"]: {} for item in fallback}
+            texts = await asyncio.gather(*(
+                self.generate_response(
+                    review_text=item.get("review_text") or "",
+                    rating=item["rating"],
+                    pros=item.get("pros"),
+                    cons=item.get("cons"),
+                    use_cache=False,
+                    usage=fallback_usage[item["id"]]
+                )
+                for item in fallback
+            ))
+            for item, text in zip(fallback, texts):
+                results[item["id"]] = text
+                if usage is not None and fallback_usage[item["id"]]:
+                    usage[item["id"]] = fallback_usage[item["id"]]
+                if text and item["id"] in cache_keys:
+                    await response_cache.put(cache_keys[item["id"]], text)
+        
+        return results
@@ -0,0 +1,47 @@
+"""Контейнер долгоживущих сервисов процесса"""
+from typing import Optional
+from services.wb_service import WBService
+from services.ai_service import AIService
+from services.telegram_service import TelegramService
+from services.template_responder import TemplateResponder
+from services.sellers import SellerRegistry
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Сервисы, создаваемые один раз при старте приложения
+    
+    Передается в обработчики и задачи планировщика, чтобы они работали
+    с уже прогретыми клиентами и с тем же Telegram-ботом, который принимает
+    нажатия кнопок.
+    """
+    
+    def __init__(self, wb_service: Optional[WBService] = None, ai_service: Optional[AIService] = None,
+                 telegram_service: Optional[TelegramService] = None,
+                 template_responder: Optional[TemplateResponder] = None):
+        self.wb_service = wb_service or WBService()
+        self.sellers = SellerRegistry(self.wb_service)
+        self.ai_service = ai_service or AIService()
+        self.template_responder = template_responder or TemplateResponder()
+        self.telegram_service = telegram_service or TelegramService()
+        if not self.telegram_service.application:
+            self.telegram_service.initialize()
+    
+    async def start(self, poll: bool = True):
+        """
+        Запуск Telegram-бота
+        
+        Args:
+            poll: Получать обновления в режиме polling (только в ведущем процессе)
+        """
+        await self.telegram_service.start(poll=poll)
+    
+    async def stop(self):
+        """Остановка Telegram-бота"""
+        try:
+            await self.telegram_service.stop_polling()
+        except Exception as e:
+            logger.error(f"Ошибка при остановке Telegram бота: {e}")
@@ -0,0 +1,87 @@
+"""Общие HTTP-клиенты с пулом keep-alive соединений для внешних API"""
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+WB_CLIENT = "wb"
+OPENROUTER_CLIENT = "openrouter"
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """Проверка наличия пакета h2, необходимого для HTTP/2"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Создание HTTP-клиента с настройками пула соединений из конфигурации
+    
+    Returns:
+        Новый httpx.AsyncClient
+    """
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+    
+    http2 = settings.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 включен, но пакет h2 не установлен - используется HTTP/1.1")
+        http2 = False
+    
+    return httpx.AsyncClient(limits=limits, http2=http2)
+
+
+async def init_http_clients():
+    """Создание общих клиентов (вызывается при старте приложения)"""
+    for name in (WB_CLIENT, OPENROUTER_CLIENT):
+        if name not in _clients:
+            _clients[name] = create_client()
+    logger.info(f"HTTP-клиенты инициализированы: {', '.join(_clients)}")
+
+
+async def close_http_clients():
+    """Закрытие общих клиентов (вызывается при остановке приложения)"""
+    while _clients:
+        name, client = _clients.popitem()
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии HTTP-клиента {name}: {e}")
+    logger.info("HTTP-клиенты закрыты")
+
+
+def get_http_client(name: str) -> Optional[httpx.AsyncClient]:
+    """Получение общего клиента по имени (None, если клиенты не инициализированы)"""
+    return _clients.get(name)
+
+
+@asynccontextmanager
+async def http_client(name: str) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Клиент для выполнения запроса
+    
+    Возвращает общий клиент с пулом соединений, а вне жизненного цикла
+    приложения (скрипты) - временный клиент, закрываемый после запроса.
+    
+    Args:
+        name: Имя клиента (WB_CLIENT или OPENROUTER_CLIENT)
+    """
+    client = _clients.get(name)
+    if client is not None:
+        yield client
+        return
+    
+    async with create_client() as temporary_client:
+        yield temporary_client
@@ -0,0 +1,121 @@
+"""Метрики Prometheus для эндпоинта /metrics"""
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Этапы обработки с отдельной гистограммой длительности
+WB_FETCH = "wb_fetch"
+LLM = "llm"
+WB_PUBLISH = "wb_publish"
+TELEGRAM = "telegram"
+DB_COMMIT = "db_commit"
+
+STAGE_DURATION = Histogram(
+    "wb_agent_stage_duration_seconds",
+    "Длительность этапов обработки отзывов",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+REVIEWS_ROUTED = Counter(
+    "wb_agent_reviews_routed_total",
+    "Отзывы, направленные на автоответ (positive) или модерацию (negative)",
+    ["route"]
+)
+FAILURES = Counter(
+    "wb_agent_failures_total",
+    "Ошибки по типу",
+    ["type"]
+)
+QUEUE_DEPTH = Gauge(
+    "wb_agent_queue_depth",
+    "Глубина очередей обработки",
+    ["queue"]
+)
+SCHEDULER_RUN_DURATION = Histogram(
+    "wb_agent_scheduler_run_duration_seconds",
+    "Длительность запуска проверки новых отзывов",
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+)
+
+
+def wait_stage(stage: str) -> str:
+    """Этап ожидания ограничителя частоты (и паузы Retry-After) перед запросом этапа stage"""
+    return f"{stage}_wait"
+
+
+# Дочерние метрики с метками создаются заранее - на горячем пути только observe/inc
+_stage_histograms = {
+    stage: STAGE_DURATION.labels(stage) for stage in (
+        WB_FETCH, LLM, WB_PUBLISH, TELEGRAM, DB_COMMIT,
+        *(wait_stage(stage) for stage in (WB_FETCH, LLM, WB_PUBLISH, TELEGRAM))
+    )
+}
+
+# Дополнительные получатели замеров этапов (например, бенчмарки со своими перцентилями)
+_stage_observers: List[Callable[[str, float], None]] = []
+
+
+@contextmanager
+def track_stage(stage: str):
+    """
+    Замер длительности этапа в гистограмме wb_agent_stage_duration_seconds
+    
+    Args:
+        stage: Название этапа (WB_FETCH, LLM, WB_PUBLISH, TELEGRAM, DB_COMMIT)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def observe_stage(stage: str, duration: float):
+    """Учет длительности этапа в секундах"""
+    histogram = _stage_histograms.get(stage) or STAGE_DURATION.labels(stage)
+    histogram.observe(duration)
+    for observer in _stage_observers:
+        observer(stage, duration)
+
+
+def add_stage_observer(observer: Callable[[str, float], None]):
+    """
+    Подписка на замеры этапов
+    
+    Args:
+        observer: Функция (этап, длительность в секундах), вызывается на каждый замер
+    """
+    _stage_observers.append(observer)
+
+
+def remove_stage_observer(observer: Callable[[str, float], None]):
+    """Отписка от замеров этапов"""
+    if observer in _stage_observers:
+        _stage_observers.remove(observer)
+
+
+def record_failure(failure_type: str):
+    """Учет ошибки указанного типа (llm, wb_fetch, wb_publish, telegram, review, ...)"""
+    FAILURES.labels(failure_type).inc()
+
+
+def record_route(route: str):
+    """Учет маршрута отзыва (positive или negative)"""
+    REVIEWS_ROUTED.labels(route).inc()
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    """Отметка начала коммита (для гистограммы db_commit)"""
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    """Учет длительности коммита в гистограмме db_commit"""
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        observe_stage(DB_COMMIT, time.perf_counter() - started)
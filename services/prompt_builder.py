@@ -0,0 +1,216 @@
+"""Построение промптов для генерации ответов с учетом бюджета токенов"""
+from typing import Dict, List, Optional, Tuple
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "Ты профессиональный менеджер по работе с клиентами. Ты пишешь вежливые и полезные ответы на отзывы покупателей."
+
+RESPONSE_REQUIREMENTS = """Требования к ответу:
+1. Будь вежливым и профессиональным
+2. Благодари за отзыв
+3. Если есть проблемы (низкий рейтинг) - извинись и предложи решение
+4. Если отзыв положительный - поблагодари и пригласи оставить еще отзывы
+5. Ответ должен быть кратким (2-4 предложения)
+6. Используй деловой, но дружелюбный тон
+7. Не используй эмодзи в ответе"""
+
+TRUNCATION_MARK = " […] "
+
+# Поля, которые не сокращаются: без названия товара ответ теряет привязку к нему
+PRESERVED_FIELDS = ("product_info",)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Грубая оценка числа токенов (кириллица - около 3 символов на токен)"""
+    return len(text) // 3 + 1 if text else 0
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """
+    Сокращение текста до бюджета токенов
+    
+    Сохраняются начало (2/3 бюджета) и конец (1/3) текста - в отзывах
+    суть обычно в первых фразах, а вывод - в последней. Разрез идет
+    по границе слов.
+    
+    Args:
+        text: Исходный текст
+        max_tokens: Бюджет токенов
+    
+    Returns:
+        Текст, укладывающийся в бюджет
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # estimate_tokens(text) <= max_tokens при len(text) <= max_tokens * 3 - 1
+    max_chars = max(max_tokens * 3 - 1 - len(TRUNCATION_MARK), 0)
+    if max_chars == 0:
+        return ""
+    
+    head_chars = max_chars * 2 // 3
+    tail_start = len(text) - (max_chars - head_chars)
+    head = text[:head_chars]
+    tail = text[tail_start:]
+    # Без пробелов (одно длинное "слово") текст режется как есть
+    if " " in text:
+        if not text[head_chars].isspace():
+            head = head.rsplit(" ", 1)[0] if " " in head else ""
+        if not text[tail_start - 1].isspace():
+            tail = tail.split(" ", 1)[1] if " " in tail else ""
+    return head.rstrip() + TRUNCATION_MARK + tail.lstrip()
+
+
+def fit_fields(fields: Dict[str, str], budget: int) -> Tuple[Dict[str, str], bool]:
+    """
+    Распределение бюджета токенов между полями отзыва
+    
+    Короткие поля сохраняются целиком, остаток бюджета поровну делится
+    между длинными, которые сокращаются через truncate_text.
+    
+    Args:
+        fields: Тексты полей (pros, cons, review_text, ...)
+        budget: Бюджет токенов на все поля
+    
+    Returns:
+        (поля после сокращения, было ли что-то сокращено)
+    """
+    sizes = {name: estimate_tokens(value) for name, value in fields.items() if value}
+    if sum(sizes.values()) <= budget:
+        return fields, False
+    
+    limits: Dict[str, int] = {}
+    remaining = max(budget, 0)
+    pending = sorted(sizes, key=sizes.get)
+    while pending:
+        share = remaining // len(pending)
+        name = pending[0]
+        if sizes[name] > share:
+            break
+        limits[name] = sizes[name]
+        remaining -= sizes[name]
+        pending.pop(0)
+    for name in pending:
+        limits[name] = remaining // len(pending)
+    
+    fitted = {
+        name: truncate_text(value, limits[name]) if value and sizes[name] > limits[name] else value
+        for name, value in fields.items()
+    }
+    return fitted, True
+
+
+class BuiltPrompt:
+    """Готовый промпт и его оценка в токенах"""
+    
+    def __init__(self, text: str, prompt_tokens: int, max_tokens: int, truncated: bool):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.truncated = truncated
+
+
+class PromptTemplate:
+    """
+    Шаблон промпта для одного отзыва
+    
+    Статичные части (вступление, заголовки полей, требования) собираются
+    и оцениваются в токенах один раз при создании шаблона; при построении
+    промпта в список частей подставляются только значения.
+    """
+    
+    def __init__(self, intro: str, sections: Dict[str, str], outro: str):
+        self.intro = intro
+        self.sections = sections
+        self.outro = outro
+        self.static_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(intro) + estimate_tokens(outro) + sum(
+            estimate_tokens(header) for header in sections.values()
+        )
+    
+    def render(self, rating: int, fields: Dict[str, Optional[str]]) -> str:
+        """Подстановка рейтинга и полей отзыва"""
+        parts: List[str] = [self.intro, str(rating), "/5\n\n"]
+        for name, header in self.sections.items():
+            value = fields.get(name)
+            # Текст отзыва выводится всегда, остальные поля - только непустые
+            if value or name == "review_text":
+                parts += [header, value or "", "\n\n"]
+        parts.append(self.outro)
+        return "".join(parts)
+
+
+REVIEW_PROMPT = PromptTemplate(
+    intro=(
+        "Ты - профессиональный менеджер по работе с клиентами интернет-магазина Wildberries.\n\n"
+        "Твоя задача - написать вежливый, профессиональный и полезный ответ на отзыв покупателя.\n\n"
+        "Рейтинг отзыва: "
+    ),
+    sections={
+        "pros": "Плюсы, которые отметил покупатель:\n",
+        "cons": "Минусы, которые отметил покупатель:\n",
+        "review_text": "Текст отзыва:\n",
+        "product_info": "Информация о товаре:\n"
+    },
+    outro=RESPONSE_REQUIREMENTS + "\n\nНапиши ответ на отзыв:"
+)
+
+
+class PromptBuilder:
+    """Построение промптов с ограничением размера входа и ответа"""
+    
+    def __init__(self, template: PromptTemplate = REVIEW_PROMPT):
+        self.template = template
+    
+    @property
+    def fields_budget(self) -> int:
+        """Бюджет токенов на поля отзыва (бюджет промпта за вычетом статичных частей)"""
+        return max(settings.AI_PROMPT_TOKEN_BUDGET - self.template.static_tokens, 0)
+    
+    def max_tokens_for(self, rating: int) -> int:
+        """Лимит токенов ответа для рейтинга (AI_MAX_TOKENS_BY_RATING)"""
+        return settings.AI_MAX_TOKENS_BY_RATING.get(rating, settings.AI_MAX_TOKENS)
+    
+    def fit(self, fields: Dict[str, Optional[str]]) -> Tuple[Dict[str, Optional[str]], bool]:
+        """Сокращение полей отзыва до бюджета промпта (PRESERVED_FIELDS сохраняются целиком)"""
+        preserved = {name: value for name, value in fields.items() if name in PRESERVED_FIELDS}
+        budget = self.fields_budget - sum(estimate_tokens(value) for value in preserved.values())
+        fitted, truncated = fit_fields(
+            {name: value for name, value in fields.items() if name not in PRESERVED_FIELDS}, budget
+        )
+        return {name: fitted.get(name, value) for name, value in fields.items()}, truncated
+    
+    def build(self, review_text: str, rating: int, pros: Optional[str] = None,
+              cons: Optional[str] = None, product_info: Optional[str] = None) -> BuiltPrompt:
+        """
+        Построение промпта для генерации ответа
+        
+        Args:
+            review_text: Текст отзыва
+            rating: Рейтинг отзыва (1-5)
+            pros: Плюсы товара (если есть)
+            cons: Минусы товара (если есть)
+            product_info: Информация о товаре (опционально)
+        
+        Returns:
+            Промпт с оценкой токенов и лимитом ответа
+        """
+        fields, truncated = self.fit({
+            "pros": pros,
+            "cons": cons,
+            "review_text": review_text,
+            "product_info": product_info
+        })
+        if truncated:
+            logger.info(f"Отзыв с рейтингом {rating} сокращен до бюджета промпта ({settings.AI_PROMPT_TOKEN_BUDGET} токенов)")
+        
+        prompt_tokens = self.template.static_tokens + sum(estimate_tokens(value) for value in fields.values())
+        return BuiltPrompt(
+            text=self.template.render(rating, fields),
+            prompt_tokens=prompt_tokens,
+            max_tokens=self.max_tokens_for(rating),
+            truncated=truncated
+        )
+
+
+prompt_builder = PromptBuilder()
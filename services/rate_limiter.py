@@ -0,0 +1,270 @@
+"""Ограничение частоты исходящих запросов (token bucket) по направлениям"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+import httpx
+from config import settings
+from services.metrics import track_stage, wait_stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+WB_READ = "wb_read"
+WB_WRITE = "wb_write"
+OPENROUTER = "openrouter"
+TELEGRAM_CHAT = "telegram_chat"
+
+# Продавец, для которого выполняются запросы текущей задачи (доля в FairShare)
+current_seller: ContextVar[Optional[int]] = ContextVar("current_seller", default=None)
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate запросов в секунду со всплеском до capacity"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float):
+        """Пополнение токенов за прошедшее время"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+    
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Ожидание разрешения на запрос
+        
+        Args:
+            tokens: Стоимость запроса в токенах
+        """
+        if self.rate <= 0:
+            # Без лимита частоты пауза по Retry-After все равно соблюдается
+            delay = self._blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+    
+    def pause(self, seconds: float):
+        """
+        Приостановка выдачи токенов (например, по Retry-After)
+        
+        Args:
+            seconds: Длительность паузы в секундах
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+class RateLimiterRegistry:
+    """Реестр ограничителей частоты по направлениям"""
+    
+    def __init__(self):
+        self._limiters: Dict[str, TokenBucket] = {}
+    
+    def _default_rate(self, name: str, key: Optional[str] = None) -> float:
+        """Лимит направления из конфигурации"""
+        if name == TELEGRAM_CHAT and key and key.startswith("-"):
+            # Группы и каналы: ID чата отрицательный, лимит Telegram ниже, чем для личных чатов
+            return settings.TELEGRAM_GROUP_RATE_LIMIT
+        rates = {
+            WB_READ: settings.WB_READ_RATE_LIMIT,
+            WB_WRITE: settings.WB_WRITE_RATE_LIMIT,
+            OPENROUTER: settings.OPENROUTER_RATE_LIMIT,
+            TELEGRAM_CHAT: settings.TELEGRAM_CHAT_RATE_LIMIT
+        }
+        return rates[name.split(":", 1)[0]]
+    
+    def get(self, name: str, key: Optional[str] = None, rate: Optional[float] = None) -> TokenBucket:
+        """
+        Ограничитель направления (создается при первом обращении)
+        
+        Args:
+            name: Направление (WB_READ, WB_WRITE, OPENROUTER, TELEGRAM_CHAT)
+            key: Ключ внутри направления, например ID чата Telegram или продавца
+            rate: Собственный лимит ключа (по умолчанию - лимит направления из конфигурации)
+        """
+        full_name = f"{name}:{key}" if key else name
+        rate = self._default_rate(name, key) if rate is None else rate
+        limiter = self._limiters.get(full_name)
+        if limiter is None:
+            limiter = TokenBucket(rate)
+            self._limiters[full_name] = limiter
+        elif limiter.rate != rate:
+            # Лимит продавца изменен в БД - накопленные токены сохраняются
+            limiter.rate = rate
+            limiter.capacity = max(1.0, rate)
+        return limiter
+
+
+class FairShare:
+    """
+    Общая емкость (одновременные запросы), разделяемая между продавцами
+    
+    Пока емкость свободна, слот выдается сразу. Когда она занята, ожидающие
+    обслуживаются не по порядку прихода, а по очереди продавцов
+    пропорционально весам (stride scheduling): продавец с тысячами отзывов
+    не отодвигает запросы остальных в конец общей очереди.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._active = 0
+        self._waiters: Dict[Optional[int], Deque[asyncio.Future]] = {}
+        self._weights: Dict[Optional[int], int] = {}
+        self._passes: Dict[Optional[int], float] = {}
+        self._clock = 0.0
+    
+    def set_weight(self, seller_id: Optional[int], weight: int):
+        """
+        Доля продавца относительно остальных
+        
+        Args:
+            seller_id: ID продавца
+            weight: Вес (1 - обычная доля)
+        """
+        self._weights[seller_id] = max(1, weight)
+    
+    @asynccontextmanager
+    async def slot(self, seller_id: Optional[int] = None) -> AsyncIterator[None]:
+        """
+        Занятие слота на время запроса
+        
+        Args:
+            seller_id: ID продавца (по умолчанию - из current_seller)
+        """
+        if self.capacity <= 0:
+            yield
+            return
+        
+        if seller_id is None:
+            seller_id = current_seller.get()
+        if self._active < self.capacity and not any(self._waiters.values()):
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(seller_id, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но задача отменена до его использования
+                    self._release()
+                elif future in self._waiters.get(seller_id, ()):
+                    self._waiters[seller_id].remove(future)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def _release(self):
+        """Освобождение слота и передача его следующему продавцу"""
+        self._active -= 1
+        while self._active < self.capacity:
+            waiting = [seller_id for seller_id, queue in self._waiters.items() if queue]
+            if not waiting:
+                return
+            # Продавец с наименьшим проходом; вернувшийся после простоя начинает с текущего момента
+            seller_id = min(waiting, key=lambda key: max(self._passes.get(key, 0.0), self._clock))
+            self._clock = max(self._passes.get(seller_id, 0.0), self._clock)
+            self._passes[seller_id] = self._clock + 1.0 / self._weights.get(seller_id, 1)
+            
+            future = self._waiters[seller_id].popleft()
+            if not self._waiters[seller_id]:
+                del self._waiters[seller_id]
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+
+rate_limiters = RateLimiterRegistry()
+llm_share = FairShare(settings.LLM_MAX_CONCURRENCY)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """
+    Разбор Retry-After: число секунд, HTTP-дата или timedelta
+    
+    Returns:
+        Задержка в секундах (не больше RATE_LIMIT_MAX_RETRY_AFTER) или None
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, timedelta):
+        seconds = value.total_seconds()
+    else:
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            try:
+                seconds = parsedate_to_datetime(str(value)).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+    return min(max(seconds, 0.0), settings.RATE_LIMIT_MAX_RETRY_AFTER)
+
+
+async def send_with_rate_limit(limiter: TokenBucket,
+                               send: Callable[[], Awaitable[httpx.Response]],
+                               stage: Optional[str] = None, track_send: bool = True) -> httpx.Response:
+    """
+    Выполнение HTTP-запроса с учетом лимита и повтором при 429
+    
+    Задержка повтора берется из Retry-After (или X-Ratelimit-Retry у WB),
+    на это время приостанавливается весь ограничитель направления.
+    Ответ 429 закрывается перед повтором - send может открывать потоковые
+    запросы (client.send(..., stream=True)).
+    
+    Ожидание ограничителя (включая паузы по Retry-After) учитывается
+    отдельным этапом wait_stage(stage), а сам этап - только время запросов.
+    
+    Args:
+        limiter: Ограничитель направления
+        send: Функция, выполняющая запрос
+        stage: Этап для метрик длительности (WB_FETCH, LLM, ...)
+        track_send: Замерять запрос как этап stage (False - вызывающий код
+            замеряет сам, например потоковый ответ до последнего фрагмента)
+    
+    Returns:
+        Ответ (последний, если повторы исчерпаны)
+    """
+    attempt = 0
+    while True:
+        with track_stage(wait_stage(stage)) if stage else nullcontext():
+            await limiter.acquire()
+        with track_stage(stage) if stage and track_send else nullcontext():
+            response = await send()
+        if response.status_code != 429 or attempt >= settings.RATE_LIMIT_MAX_RETRIES:
+            return response
+        
+        attempt += 1
+        delay = parse_retry_after(
+            response.headers.get("Retry-After") or response.headers.get("X-Ratelimit-Retry")
+        )
+        if delay is None:
+            delay = min(2 ** attempt, settings.RATE_LIMIT_MAX_RETRY_AFTER)
+        limiter.pause(delay)
+        await response.aclose()
+        logger.warning(f"429 от {response.request.url.host}, повтор через {delay:.1f}с (попытка {attempt})")
@@ -0,0 +1,306 @@
+"""Кэш сгенерированных ответов с адресацией по содержимому отзыва"""
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Как часто (в записях) проверять размер постоянного кэша
+_EVICT_EVERY = 100
+
+# Сколько обращений копить в памяти до записи last_used_at без других записей
+_TOUCH_BATCH = 100
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Нормализация текста для ключа кэша: регистр, ё, пунктуация, эмодзи, пробелы"""
+    if not value:
+        return ""
+    value = value.lower().replace("ё", "е")
+    value = _PUNCTUATION_RE.sub(" ", value)
+    return _WHITESPACE_RE.sub(" ", value).strip()
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов ИИ: LRU в памяти и постоянный SQLite
+    
+    На один ключ хранится до N вариантов ответа. Пока вариантов меньше N,
+    обращение считается промахом и ответ генерируется заново; после этого
+    кэш выдает сохраненные варианты по очереди, чтобы ответы не повторялись
+    дословно.
+    
+    Запросы к SQLite выполняются в пуле потоков (asyncio.to_thread) и не
+    блокируют цикл событий. Время последнего использования ключей копится
+    в памяти и записывается вместе с очередной записью или очисткой кэша,
+    а не отдельным коммитом на каждое чтение.
+    """
+    
+    def __init__(self, path: Optional[str] = None, ttl: Optional[int] = None,
+                 memory_size: Optional[int] = None, max_entries: Optional[int] = None,
+                 variants: Optional[int] = None):
+        self.path = path or settings.RESPONSE_CACHE_PATH
+        self.ttl = ttl if ttl is not None else settings.RESPONSE_CACHE_TTL
+        self.memory_size = memory_size or settings.RESPONSE_CACHE_MEMORY_SIZE
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.variants = max(1, variants or settings.RESPONSE_CACHE_VARIANTS)
+        
+        self._memory: "OrderedDict[str, List[Tuple[str, float]]]" = OrderedDict()
+        self._rotation: Dict[str, int] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._touches: Dict[str, float] = {}
+        self._puts_since_evict = 0
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(rating: int, review_text: Optional[str], pros: Optional[str],
+                 cons: Optional[str], model: str) -> str:
+        """
+        Ключ кэша - хэш нормализованных входных данных промпта
+        
+        Args:
+            rating: Рейтинг отзыва
+            review_text: Текст отзыва
+            pros: Плюсы
+            cons: Минусы
+            model: Модель ИИ
+        
+        Returns:
+            SHA-256 в hex
+        """
+        raw = "\x1f".join([
+            str(rating), normalize_text(review_text), normalize_text(pros), normalize_text(cons), model
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def is_cacheable(review_text: Optional[str], pros: Optional[str], cons: Optional[str]) -> bool:
+        """Кэшируются только короткие отзывы: на развернутые нужен индивидуальный ответ"""
+        length = sum(len(normalize_text(value)) for value in (review_text, pros, cons))
+        return length <= settings.RESPONSE_CACHE_MAX_TEXT_LENGTH
+    
+    def _db(self) -> sqlite3.Connection:
+        """Ленивое открытие постоянного хранилища (вызывается под _lock)"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: чтения не ждут записи, а коммит не требует fsync журнала отката
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT NOT NULL,
+                    variant INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    PRIMARY KEY (key, variant)
+                )"""
+            )
+            self._connection.commit()
+        return self._connection
+    
+    def _take_touches(self) -> Dict[str, float]:
+        """Накопленное время использования ключей для записи вместе с ближайшим коммитом"""
+        touches, self._touches = self._touches, {}
+        return touches
+    
+    @staticmethod
+    def _apply_touches(db: sqlite3.Connection, touches: Dict[str, float]):
+        """Обновление last_used_at (без коммита)"""
+        if touches:
+            db.executemany(
+                "UPDATE response_cache SET last_used_at = MAX(last_used_at, ?) WHERE key = ?",
+                [(used_at, key) for key, used_at in touches.items()]
+            )
+    
+    def _read(self, key: str, now: float) -> List[Tuple[str, float]]:
+        """Чтение действующих вариантов из SQLite (в пуле потоков)"""
+        try:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT text, created_at FROM response_cache WHERE key = ? AND created_at > ? ORDER BY variant",
+                    (key, now - self.ttl)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша ответов: {e}")
+            rows = []
+        return [(text, created_at) for text, created_at in rows]
+    
+    async def _load(self, key: str) -> List[Tuple[str, float]]:
+        """Загрузка действующих вариантов из памяти или постоянного хранилища"""
+        now = time.time()
+        entries = self._memory.get(key)
+        if entries is None:
+            entries = await asyncio.to_thread(self._read, key, now)
+        
+        entries = [(text, created_at) for text, created_at in entries if created_at > now - self.ttl]
+        if entries:
+            self._touches[key] = now
+            if len(self._touches) >= _TOUCH_BATCH:
+                await asyncio.to_thread(self._flush_touches, self._take_touches())
+        self._remember(key, entries)
+        return entries
+    
+    def _flush_touches(self, touches: Dict[str, float]):
+        """Запись накопленных обращений одним коммитом (в пуле потоков)"""
+        try:
+            with self._lock:
+                db = self._db()
+                self._apply_touches(db, touches)
+                db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в кэш ответов: {e}")
+    
+    def _remember(self, key: str, entries: List[Tuple[str, float]]):
+        """Сохранение вариантов в LRU-кэше в памяти"""
+        self._memory[key] = entries
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            evicted_key, _ = self._memory.popitem(last=False)
+            self._rotation.pop(evicted_key, None)
+    
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Получение ответа из кэша
+        
+        Args:
+            key: Ключ кэша (см. make_key)
+        
+        Returns:
+            Очередной сохраненный вариант или None, если вариантов пока меньше N
+        """
+        entries = await self._load(key)
+        if len(entries) < self.variants:
+            self.misses += 1
+            return None
+        
+        index = self._rotation.get(key, 0) % len(entries)
+        self._rotation[key] = index + 1
+        self.hits += 1
+        return entries[index][0]
+    
+    async def put(self, key: str, text: str):
+        """
+        Добавление нового варианта ответа
+        
+        Args:
+            key: Ключ кэша (см. make_key)
+            text: Сгенерированный ответ
+        """
+        now = time.time()
+        entries = await self._load(key)
+        if len(entries) >= self.variants:
+            return
+        
+        entries = await asyncio.to_thread(self._write, key, text, now, self._take_touches())
+        if entries is None:
+            return
+        self._remember(key, entries)
+        
+        self._puts_since_evict += 1
+        if self._puts_since_evict >= _EVICT_EVERY:
+            self._puts_since_evict = 0
+            await self.evict()
+    
+    def _write(self, key: str, text: str, now: float,
+               touches: Dict[str, float]) -> Optional[List[Tuple[str, float]]]:
+        """
+        Добавление варианта ключа и накопленных обращений одной транзакцией (в пуле потоков)
+        
+        Варианты ключа перечитываются внутри транзакции, а новый занимает
+        следующий свободный номер (INSERT OR IGNORE): одновременные записи
+        одного ключа, в том числе из других процессов, дополняют друг друга,
+        а не затирают.
+        
+        Returns:
+            Действующие варианты ключа после записи или None при ошибке
+        """
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._apply_touches(db, touches)
+                    db.execute("DELETE FROM response_cache WHERE key = ? AND created_at <= ?", (key, now - self.ttl))
+                    rows = db.execute(
+                        "SELECT variant, text, created_at FROM response_cache WHERE key = ? ORDER BY variant",
+                        (key,)
+                    ).fetchall()
+                    if len(rows) < self.variants:
+                        variant = rows[-1][0] + 1 if rows else 0
+                        db.execute(
+                            "INSERT OR IGNORE INTO response_cache (key, variant, text, created_at, last_used_at) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (key, variant, text, now, now)
+                        )
+                        rows.append((variant, text, now))
+                    db.commit()
+                except BaseException:
+                    db.rollback()
+                    raise
+            return [(entry_text, created_at) for _, entry_text, created_at in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в кэш ответов: {e}")
+            return None
+    
+    async def evict(self):
+        """Удаление устаревших записей и самых давно использованных ключей сверх лимита"""
+        await asyncio.to_thread(self._evict, self._take_touches())
+    
+    def _evict(self, touches: Dict[str, float]):
+        """Очистка постоянного хранилища (в пуле потоков)"""
+        try:
+            with self._lock:
+                db = self._db()
+                self._apply_touches(db, touches)
+                db.execute("DELETE FROM response_cache WHERE created_at <= ?", (time.time() - self.ttl,))
+                db.execute(
+                    """DELETE FROM response_cache WHERE key IN (
+                        SELECT key FROM response_cache GROUP BY key
+                        ORDER BY MAX(last_used_at) DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка очистки кэша ответов: {e}")
+    
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "memory_keys": len(self._memory)
+        }
+    
+    def close(self):
+        """Запись накопленных обращений и закрытие постоянного хранилища"""
+        touches = self._take_touches()
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._apply_touches(self._connection, touches)
+                self._connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи в кэш ответов: {e}")
+            self._connection.close()
+            self._connection = None
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,88 @@
+"""WB-клиенты продавцов: по одному на кабинет, со своими ключом и лимитами"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+import logging
+
+from database.models import Seller
+from database.sellers import get_active_sellers
+from services.wb_service import WBService
+from services.rate_limiter import llm_share
+
+logger = logging.getLogger(__name__)
+
+
+class SellerRegistry:
+    """
+    Реестр WB-клиентов продавцов
+    
+    Клиент продавца создается при первом обращении и пересоздается, если
+    в БД изменились его ключ или лимиты. Для отзывов без продавца
+    (и разовых скриптов) используется клиент из WB_API_KEY.
+    """
+    
+    def __init__(self, default: WBService):
+        self.default = default
+        self._services: Dict[int, WBService] = {}
+    
+    def _update(self, seller: Seller) -> WBService:
+        """Клиент продавца с актуальными ключом и лимитами"""
+        service = self._services.get(seller.id)
+        if service is None or (service.api_key, service.read_rate_limit, service.write_rate_limit) != \
+                (seller.wb_api_key, seller.wb_read_rate_limit, seller.wb_write_rate_limit):
+            service = WBService(
+                api_key=seller.wb_api_key,
+                seller_id=seller.id,
+                read_rate_limit=seller.wb_read_rate_limit,
+                write_rate_limit=seller.wb_write_rate_limit
+            )
+            self._services[seller.id] = service
+        llm_share.set_weight(seller.id, seller.llm_weight or 1)
+        return service
+    
+    async def refresh(self, db: AsyncSession) -> List[Seller]:
+        """
+        Перечитывание активных продавцов (перед каждым запуском планировщика)
+        
+        Args:
+            db: Сессия БД
+        
+        Returns:
+            Активные продавцы в порядке добавления
+        """
+        sellers = await db.run_sync(get_active_sellers)
+        for seller in sellers:
+            self._update(seller)
+        return sellers
+    
+    def get(self, seller_id: Optional[int]) -> WBService:
+        """
+        Клиент продавца из уже загруженных
+        
+        Args:
+            seller_id: ID продавца (None - клиент из WB_API_KEY)
+        """
+        if seller_id is None:
+            return self.default
+        return self._services.get(seller_id, self.default)
+    
+    async def load(self, db: AsyncSession, seller_id: Optional[int]) -> WBService:
+        """
+        Клиент продавца, при необходимости загружаемого из БД
+        
+        Используется при публикации: отзыв мог быть загружен до перезапуска
+        или принадлежать отключенному продавцу.
+        
+        Args:
+            db: Сессия БД
+            seller_id: ID продавца отзыва
+        """
+        if seller_id is None:
+            return self.default
+        service = self._services.get(seller_id)
+        if service is not None:
+            return service
+        seller = await db.get(Seller, seller_id)
+        if seller is None:
+            logger.warning(f"Продавец {seller_id} не найден, используется WB_API_KEY")
+            return self.default
+        return self._update(seller)
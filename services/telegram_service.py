@@ -1,8 +1,11 @@
 """Сервис для работы с Telegram ботом"""
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import Application, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from typing import Optional
+from typing import Awaitable, Callable, Optional, Tuple
 from config import settings
+from services.rate_limiter import rate_limiters, parse_retry_after, TELEGRAM_CHAT
+from services.metrics import track_stage, wait_stage, record_failure, TELEGRAM
 import logging
 from datetime import datetime
 
@@ -20,7 +23,15 @@ class TelegramService:
     
     def initialize(self):
         """Инициализация Telegram бота"""
-        self.application = Application.builder().token(self.bot_token).build()
+        builder = Application.builder().token(self.bot_token).base_url(
+            settings.TELEGRAM_API_BASE_URL
+        ).concurrent_updates(
+            max(1, settings.TELEGRAM_CONCURRENT_UPDATES)
+        )
+        if settings.TELEGRAM_MODE == "webhook":
+            # Обновления приходят через эндпоинт приложения, Updater не нужен
+            builder = builder.updater(None)
+        self.application = builder.build()
         
         # Регистрация обработчиков
         self.application.add_handler(CallbackQueryHandler(self._handle_callback))
@@ -30,27 +41,141 @@ class TelegramService:
         
         logger.info("Telegram бот инициализирован")
     
-    async def start_polling(self):
-        """Запуск бота в режиме polling"""
+    async def start_polling(self, poll: bool = True):
+        """
+        Запуск бота в режиме polling
+        
+        Args:
+            poll: Получать обновления (False - только отправка сообщений,
+                обновления получает ведущий процесс, см. scheduler.leader)
+        """
         if not self.application:
             self.initialize()
         
         try:
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling(drop_pending_updates=True)
+            if poll:
+                await self.resume_polling()
+        except Exception as e:
+            logger.error(f"Ошибка при запуске Telegram бота: {e}")
+            raise
+    
+    async def resume_polling(self):
+        """Начало получения обновлений в режиме polling (процесс стал ведущим)"""
+        updater = self.application.updater if self.application else None
+        if updater and not updater.running:
+            await updater.start_polling(drop_pending_updates=True)
             logger.info("Telegram бот запущен в режиме polling")
+    
+    async def pause_polling(self):
+        """Прекращение получения обновлений (ведущим стал другой процесс)"""
+        updater = self.application.updater if self.application else None
+        if updater and updater.running:
+            await updater.stop()
+            logger.info("Получение обновлений Telegram остановлено")
+    
+    async def start_webhook(self):
+        """
+        Запуск бота в режиме webhook
+        
+        Обновления принимает эндпоинт FastAPI (см. process_webhook_update).
+        Если TELEGRAM_WEBHOOK_URL не задан, вебхук в Telegram не регистрируется -
+        так режим можно проверять локально, отправляя записанные обновления.
+        """
+        if not self.application:
+            self.initialize()
+        
+        try:
+            await self.application.initialize()
+            await self.application.start()
+            if settings.TELEGRAM_WEBHOOK_URL:
+                await self.application.bot.set_webhook(
+                    url=settings.TELEGRAM_WEBHOOK_URL.rstrip("/") + settings.TELEGRAM_WEBHOOK_PATH,
+                    secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+                    allowed_updates=["callback_query", "message"],
+                    drop_pending_updates=True
+                )
+            logger.info("Telegram бот запущен в режиме webhook")
         except Exception as e:
             logger.error(f"Ошибка при запуске Telegram бота: {e}")
             raise
     
+    async def start(self, poll: bool = True):
+        """
+        Запуск бота в режиме из настройки TELEGRAM_MODE
+        
+        Args:
+            poll: Получать обновления в режиме polling (см. start_polling)
+        """
+        if settings.TELEGRAM_MODE == "webhook":
+            await self.start_webhook()
+        else:
+            await self.start_polling(poll=poll)
+    
+    async def process_webhook_update(self, data: dict):
+        """
+        Передача обновления из вебхука в очередь приложения
+        
+        Обработка выполняется приложением асинхронно (до TELEGRAM_CONCURRENT_UPDATES
+        обновлений одновременно), поэтому эндпоинт отвечает Telegram сразу.
+        
+        Args:
+            data: JSON обновления от Telegram
+        
+        Raises:
+            ValueError: Данные не являются обновлением Telegram
+        """
+        if not self.application:
+            self.initialize()
+        if not isinstance(data, dict):
+            raise ValueError("ожидается JSON-объект")
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(str(e)) from e
+        await self.application.update_queue.put(update)
+    
     async def stop_polling(self):
         """Остановка бота"""
         if self.application:
-            await self.application.updater.stop()
-            await self.application.stop()
+            if self.application.updater and self.application.updater.running:
+                await self.application.updater.stop()
+            if self.application.running:
+                await self.application.stop()
             await self.application.shutdown()
     
+    async def _call_with_rate_limit(self, chat_id, call: Callable[..., Awaitable], **kwargs):
+        """
+        Вызов метода Bot API с учетом лимита сообщений в чат
+        
+        При RetryAfter от Telegram отправка в этот чат приостанавливается
+        на указанное время, после чего вызов повторяется.
+        
+        Args:
+            chat_id: ID чата (лимиты Telegram действуют на каждый чат отдельно)
+            call: Метод бота, например self.application.bot.send_message
+            **kwargs: Аргументы метода
+        
+        Returns:
+            Результат метода бота
+        """
+        limiter = rate_limiters.get(TELEGRAM_CHAT, str(chat_id))
+        attempt = 0
+        while True:
+            with track_stage(wait_stage(TELEGRAM)):
+                await limiter.acquire()
+            try:
+                with track_stage(TELEGRAM):
+                    return await call(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > settings.RATE_LIMIT_MAX_RETRIES:
+                    raise
+                delay = parse_retry_after(e.retry_after) or 1.0
+                limiter.pause(delay)
+                logger.warning(f"Telegram ограничил отправку в чат {chat_id}, повтор через {delay:.1f}с")
+    
     def format_review_card(self, review_data: dict, draft_response: str) -> str:
         """
         Форматирование карточки отзыва для отправки в Telegram
@@ -104,13 +229,15 @@ class TelegramService:
         
         return card
     
-    def create_review_keyboard(self, review_id: int, nm_id: str) -> InlineKeyboardMarkup:
+    def create_review_keyboard(self, review_id: int, nm_id: str,
+                               page: Optional[Tuple[int, int]] = None) -> InlineKeyboardMarkup:
         """
         Создание клавиатуры с кнопками для карточки отзыва
         
         Args:
             review_id: ID отзыва в нашей БД
             nm_id: nmId товара для ссылки
+            page: (номер, всего) для страницы дайджеста - добавляет кнопки ◀ ▶
         
         Returns:
             InlineKeyboardMarkup с кнопками
@@ -126,10 +253,27 @@ class TelegramService:
                 InlineKeyboardButton("📎 Показать товар", callback_data=f"show_product_{nm_id}")
             ]
         ]
+        if page:
+            index, total = page
+            keyboard.append([
+                InlineKeyboardButton("◀", callback_data=f"digest_{(index - 1) % total}"),
+                InlineKeyboardButton(f"{index + 1}/{total}", callback_data=f"digest_{index}"),
+                InlineKeyboardButton("▶", callback_data=f"digest_{(index + 1) % total}")
+            ])
         return InlineKeyboardMarkup(keyboard)
     
+    def _render_card(self, review_data: dict, draft_response: str, review_id: int, nm_id: str,
+                     page: Optional[Tuple[int, int]] = None) -> Tuple[str, InlineKeyboardMarkup]:
+        """Текст и клавиатура карточки (для страницы дайджеста - с заголовком и навигацией)"""
+        card_text = self.format_review_card(review_data, draft_response)
+        if page:
+            index, total = page
+            card_text = f"📚 Отзыв {index + 1} из {total}\n\n{card_text}"
+        return card_text, self.create_review_keyboard(review_id, nm_id, page)
+    
     async def send_review_card(self, review_data: dict, draft_response: str, 
-                              review_id: int, nm_id: str) -> Optional[int]:
+                              review_id: int, nm_id: str,
+                              page: Optional[Tuple[int, int]] = None) -> Optional[int]:
         """
         Отправка карточки отзыва в Telegram
         
@@ -138,6 +282,7 @@ class TelegramService:
             draft_response: Черновик ответа ИИ
             review_id: ID отзыва в нашей БД
             nm_id: nmId товара
+            page: (номер, всего), если карточка - страница дайджеста
         
         Returns:
             message_id отправленного сообщения или None
@@ -146,11 +291,11 @@ class TelegramService:
             if not self.application:
                 self.initialize()
             
-            card_text = self.format_review_card(review_data, draft_response)
-            keyboard = self.create_review_keyboard(review_id, nm_id)
+            card_text, keyboard = self._render_card(review_data, draft_response, review_id, nm_id, page)
             
-            message = await self.application.bot.send_message(
-                chat_id=self.chat_id,
+            message = await self._call_with_rate_limit(
+                self.chat_id,
+                self.application.bot.send_message,
                 text=card_text,
                 reply_markup=keyboard,
                 parse_mode="HTML"
@@ -160,9 +305,59 @@ class TelegramService:
             return message.message_id
             
         except Exception as e:
+            record_failure(TELEGRAM)
             logger.error(f"Ошибка при отправке карточки отзыва в Telegram: {e}")
             return None
     
+    async def edit_review_card(self, message_id: int, review_data: dict, draft_response: str,
+                               review_id: int, nm_id: str, page: Optional[Tuple[int, int]] = None,
+                               parse_mode: Optional[str] = "HTML") -> bool:
+        """
+        Замена содержимого уже отправленной карточки (edit_message_text)
+        
+        Args:
+            message_id: ID сообщения с карточкой
+            review_data: Данные отзыва
+            draft_response: Черновик ответа ИИ
+            review_id: ID отзыва в нашей БД
+            nm_id: nmId товара
+            page: (номер, всего), если карточка - страница дайджеста
+            parse_mode: Режим разметки (None - обычный текст, например недописанный
+                ответ потоковой генерации с незакрытыми тегами)
+        
+        Returns:
+            True, если карточка обновлена
+        """
+        try:
+            if not self.application:
+                self.initialize()
+            
+            card_text, keyboard = self._render_card(review_data, draft_response, review_id, nm_id, page)
+            
+            await self._call_with_rate_limit(
+                self.chat_id,
+                self.application.bot.edit_message_text,
+                message_id=message_id,
+                text=card_text,
+                reply_markup=keyboard,
+                parse_mode=parse_mode
+            )
+            
+            logger.info(f"Карточка отзыва {review_id} обновлена в Telegram (message_id: {message_id})")
+            return True
+            
+        except BadRequest as e:
+            # Повторное нажатие на ту же страницу не меняет сообщение - это не ошибка
+            if "not modified" in str(e).lower():
+                return True
+            record_failure(TELEGRAM)
+            logger.error(f"Ошибка при обновлении карточки отзыва в Telegram: {e}")
+            return False
+        except Exception as e:
+            record_failure(TELEGRAM)
+            logger.error(f"Ошибка при обновлении карточки отзыва в Telegram: {e}")
+            return False
+    
     def register_callback_handler(self, action_type: str, handler):
         """
         Регистрация обработчика callback для определенного действия
@@ -205,6 +400,12 @@ class TelegramService:
             if handler:
                 await handler(review_id, update, context)
         
+        elif callback_data.startswith("digest_"):
+            index = int(callback_data.split("_")[1])
+            handler = self.callback_handlers.get("digest")
+            if handler:
+                await handler(index, update, context)
+        
         elif callback_data.startswith("show_product_"):
             nm_id = callback_data.split("_")[2]
             product_url = f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx"
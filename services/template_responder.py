@@ -0,0 +1,78 @@
+"""Шаблонные ответы на отзывы без текста (без обращения к ИИ)"""
+import json
+import random
+from typing import Dict, List, Optional
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATES: Dict[int, List[str]] = {
+    5: [
+        "Спасибо за высокую оценку! Рады, что покупка вам понравилась. Будем ждать вас снова!",
+        "Благодарим за отличную оценку! Нам очень приятно, что вы довольны товаром. Приходите к нам еще!",
+        "Спасибо, что выбрали нас и поставили пять звезд! Желаем приятного использования и ждем новых покупок.",
+        "Большое спасибо за оценку! Рады, что товар оправдал ваши ожидания. Будем рады видеть вас снова!"
+    ],
+    4: [
+        "Спасибо за хорошую оценку! Рады, что покупка вам понравилась. Будем благодарны, если в следующий раз поделитесь впечатлениями подробнее.",
+        "Благодарим за отзыв и оценку! Мы стараемся становиться лучше и будем рады видеть вас снова.",
+        "Спасибо, что нашли время оценить товар! Если у вас есть пожелания, напишите нам - мы обязательно их учтем."
+    ]
+}
+
+
+class TemplateResponder:
+    """Ответы из пула шаблонов для отзывов с высокой оценкой без текста"""
+    
+    def __init__(self, templates_path: Optional[str] = None):
+        self.min_rating = settings.TEMPLATE_RESPONSES_MIN_RATING
+        self.templates = self._load_templates(templates_path or settings.TEMPLATE_RESPONSES_PATH)
+    
+    def _load_templates(self, templates_path: Optional[str]) -> Dict[int, List[str]]:
+        """
+        Загрузка пула шаблонов
+        
+        Args:
+            templates_path: Путь к JSON-файлу {"<рейтинг>": ["шаблон", ...]}
+        
+        Returns:
+            Шаблоны по рейтингу (встроенные, если файл не задан или не читается)
+        """
+        if not templates_path:
+            return DEFAULT_TEMPLATES
+        
+        try:
+            with open(templates_path, encoding="utf-8") as f:
+                data = json.load(f)
+            templates = {int(rating): [t for t in items if t] for rating, items in data.items()}
+            logger.info(f"Загружены шаблоны ответов из {templates_path}")
+            return templates
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Ошибка при загрузке шаблонов ответов из {templates_path}: {e}")
+            return DEFAULT_TEMPLATES
+    
+    def can_respond(self, rating: int, review_text: Optional[str], pros: Optional[str],
+                    cons: Optional[str]) -> bool:
+        """
+        Можно ли ответить на отзыв шаблоном
+        
+        Args:
+            rating: Рейтинг отзыва
+            review_text: Текст отзыва
+            pros: Плюсы
+            cons: Минусы
+        
+        Returns:
+            True для отзывов с высокой оценкой без текста, плюсов и минусов
+        """
+        if not settings.TEMPLATE_RESPONSES_ENABLED or rating < self.min_rating:
+            return False
+        if any(value and value.strip() for value in (review_text, pros, cons)):
+            return False
+        return bool(self.templates.get(rating))
+    
+    def respond(self, rating: int) -> Optional[str]:
+        """Случайный шаблон для рейтинга"""
+        templates = self.templates.get(rating)
+        return random.choice(templates) if templates else None
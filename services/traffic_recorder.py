@@ -0,0 +1,149 @@
+"""Запись входящего трафика (отзывы WB, ответы OpenRouter) для последующего воспроизведения"""
+from typing import Dict, List, Optional
+import gzip
+import hashlib
+import json
+import logging
+import re
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+WB_FEEDBACK = "wb_feedback"
+LLM_RESPONSE = "llm_response"
+
+# Поля отзыва, которые читает WBService.parse_review; остальное (фото, данные покупателя) не записывается
+FEEDBACK_FIELDS = ("productId", "nmId", "supplierArticle", "rating", "text", "pros", "cons", "createdDate", "date")
+TEXT_FIELDS = ("text", "pros", "cons")
+
+_REDACTIONS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[email]"),
+    (re.compile(r"https?://\S+|www\.\S+"), "[url]"),
+    (re.compile(r"(?:\+7|\b8)[\s(-]*\d{3}[\s)-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}\b"), "[phone]"),
+    (re.compile(r"\b\d[\d\s-]{5,}\d\b"), "[number]"),
+)
+
+
+def redact_text(text: Optional[str]) -> Optional[str]:
+    """Замена email, ссылок, телефонов и длинных номеров (заказы, карты) метками"""
+    if not text:
+        return text
+    for pattern, mark in _REDACTIONS:
+        text = pattern.sub(mark, text)
+    return text
+
+
+def redact_feedback(feedback: Dict) -> Dict:
+    """
+    Обезличенная копия отзыва WB
+    
+    ID заменяется хешем (уникальность сохраняется), имя автора не
+    записывается, в текстах убираются контактные данные.
+    
+    Args:
+        feedback: Отзыв в формате WB API
+    
+    Returns:
+        Отзыв только с полями, нужными для воспроизведения
+    """
+    redacted = {key: feedback[key] for key in FEEDBACK_FIELDS if key in feedback}
+    for key in TEXT_FIELDS:
+        if key in redacted:
+            redacted[key] = redact_text(redacted[key])
+    redacted["id"] = hashlib.sha1(str(feedback.get("id", "")).encode()).hexdigest()[:16]
+    return redacted
+
+
+class TrafficRecorder:
+    """
+    Запись трафика в gzip JSONL (TRAFFIC_RECORD_PATH)
+    
+    Каждая строка - {"t": время записи, "kind": wb_feedback | llm_response, ...}.
+    Файл дописывается: новые запуски добавляют gzip-блоки в конец,
+    gzip читает такой файл целиком.
+    """
+    
+    def __init__(self):
+        self._file = None
+    
+    @property
+    def enabled(self) -> bool:
+        """Включена ли запись"""
+        return bool(settings.TRAFFIC_RECORD_PATH)
+    
+    def _write(self, record: Dict):
+        """Запись одной строки"""
+        try:
+            if self._file is None:
+                self._file = gzip.open(settings.TRAFFIC_RECORD_PATH, "at", encoding="utf-8")
+                logger.info(f"Запись трафика в {settings.TRAFFIC_RECORD_PATH}")
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.error(f"Ошибка записи трафика: {e}")
+    
+    def record_feedbacks(self, feedbacks: List[Dict]):
+        """
+        Запись страницы отзывов WB
+        
+        Args:
+            feedbacks: Отзывы в формате WB API
+        """
+        if not self.enabled:
+            return
+        now = round(time.time(), 3)
+        for feedback in feedbacks:
+            self._write({"t": now, "kind": WB_FEEDBACK, "feedback": redact_feedback(feedback)})
+    
+    def record_llm_response(self, rating: int, text: str, latency_ms: int, prompt_tokens: Optional[int] = None):
+        """
+        Запись ответа OpenRouter
+        
+        Args:
+            rating: Рейтинг отзыва, на который сгенерирован ответ
+            text: Текст ответа
+            latency_ms: Время генерации
+            prompt_tokens: Оценка токенов промпта
+        """
+        if not self.enabled:
+            return
+        self._write({
+            "t": round(time.time(), 3),
+            "kind": LLM_RESPONSE,
+            "rating": rating,
+            "text": redact_text(text),
+            "latency_ms": latency_ms,
+            "prompt_tokens": prompt_tokens
+        })
+    
+    def close(self):
+        """Закрытие файла записи (при остановке приложения)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_traffic(path: str) -> List[Dict]:
+    """
+    Чтение записанного трафика
+    
+    Args:
+        path: Файл gzip JSONL
+    
+    Returns:
+        Записи в порядке записи
+    """
+    records: List[Dict] = []
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if line.strip():
+                    records.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            # Хвост записи процесса, остановленного без close(), может быть неполным
+            logger.warning(f"Файл трафика {path} прочитан не полностью ({len(records)} записей): {e}")
+    return records
+
+
+traffic_recorder = TrafficRecorder()
@@ -1,23 +1,48 @@
 """Сервис для работы с Wildberries API"""
 import httpx
-from typing import List, Dict, Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Dict, Optional, Set, Union
 from config import settings
+from services.rate_limiter import rate_limiters, send_with_rate_limit, WB_READ, WB_WRITE
+from services.http_clients import http_client, WB_CLIENT
+from services.metrics import record_failure, WB_FETCH, WB_PUBLISH
+from services.traffic_recorder import traffic_recorder
 import logging
 
 logger = logging.getLogger(__name__)
 
+WB_MAX_TAKE = 5000  # максимальный take в /api/v1/feedbacks
+
 
 class WBService:
     """Сервис для взаимодействия с Wildberries API"""
     
-    def __init__(self):
-        self.api_key = settings.WB_API_KEY
+    def __init__(self, api_key: Optional[str] = None, seller_id: Optional[int] = None,
+                 read_rate_limit: Optional[float] = None, write_rate_limit: Optional[float] = None):
+        """
+        Args:
+            api_key: API-ключ кабинета (по умолчанию WB_API_KEY)
+            seller_id: ID продавца - у каждого продавца свои ограничители частоты
+            read_rate_limit: Лимит чтения продавца (по умолчанию WB_READ_RATE_LIMIT)
+            write_rate_limit: Лимит публикации продавца (по умолчанию WB_WRITE_RATE_LIMIT)
+        """
+        self.api_key = api_key or settings.WB_API_KEY or ""
         self.base_url = settings.WB_API_URL
+        self.seller_id = seller_id
+        self.read_rate_limit = read_rate_limit
+        self.write_rate_limit = write_rate_limit
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
     
+    def _limiter(self, name: str):
+        """Ограничитель направления для кабинета этого сервиса"""
+        key = str(self.seller_id) if self.seller_id is not None else None
+        rate = self.read_rate_limit if name == WB_READ else self.write_rate_limit
+        return rate_limiters.get(name, key=key, rate=rate)
+    
     async def get_reviews(self, date_from: Optional[str] = None) -> List[Dict]:
         """
         Получение отзывов из Wildberries API
@@ -34,12 +59,16 @@ class WBService:
             if date_from:
                 params["dateFrom"] = date_from
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=30.0
+            async with http_client(WB_CLIENT) as client:
+                response = await send_with_rate_limit(
+                    self._limiter(WB_READ),
+                    lambda: client.get(
+                        url,
+                        headers=self.headers,
+                        params=params,
+                        timeout=30.0
+                    ),
+                    stage=WB_FETCH
                 )
                 response.raise_for_status()
                 data = response.json()
@@ -55,12 +84,140 @@ class WBService:
                     return []
                     
         except httpx.HTTPError as e:
+            record_failure(WB_FETCH)
             logger.error(f"Ошибка при получении отзывов из WB API: {e}")
             raise
         except Exception as e:
             logger.error(f"Неожиданная ошибка при получении отзывов: {e}")
             raise
     
+    def _extract_feedbacks(self, data) -> List[Dict]:
+        """Извлечение списка отзывов из ответа WB API"""
+        if isinstance(data, dict) and "data" in data:
+            data = data["data"]
+            if isinstance(data, dict):
+                return data.get("feedbacks") or []
+        if isinstance(data, list):
+            return data
+        logger.warning(f"Неожиданная структура ответа WB API: {data}")
+        return []
+    
+    @staticmethod
+    def _to_timestamp(value: Union[str, datetime, None]) -> Optional[int]:
+        """Преобразование даты (ISO или datetime, naive = UTC) в Unix-время для фильтров WB API"""
+        if not value:
+            return None
+        if not isinstance(value, datetime):
+            try:
+                value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            except ValueError:
+                return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    
+    async def _fetch_page(self, params: Dict) -> List[Dict]:
+        """Загрузка одной страницы отзывов"""
+        try:
+            async with http_client(WB_CLIENT) as client:
+                response = await send_with_rate_limit(
+                    self._limiter(WB_READ),
+                    lambda: client.get(
+                        f"{self.base_url}/api/v1/feedbacks",
+                        headers=self.headers,
+                        params=params,
+                        timeout=30.0
+                    ),
+                    stage=WB_FETCH
+                )
+                response.raise_for_status()
+                feedbacks = self._extract_feedbacks(response.json())
+                traffic_recorder.record_feedbacks(feedbacks)
+                return feedbacks
+        except httpx.HTTPError:
+            record_failure(WB_FETCH)
+            raise
+    
+    async def iter_review_pages(self, date_from: Union[str, datetime, None] = None,
+                                page_size: Optional[int] = None,
+                                is_answered: bool = False) -> AsyncIterator[List[Dict]]:
+        """
+        Постраничная загрузка отзывов из Wildberries API (take/skip)
+        
+        Следующая страница загружается в фоне, пока вызывающий код обрабатывает
+        текущую, а в памяти одновременно находятся не более двух страниц.
+        Страницы запрашиваются по возрастанию даты, и dateFrom каждой следующей
+        страницы сдвигается на дату последнего полученного отзыва. Вместо
+        смещения skip на этой границе запоминаются ID уже полученных отзывов:
+        следующая страница запрашивается с запасом на них и очищается от
+        повторов, поэтому ответы, опубликованные во время обхода (отзыв
+        пропадает из выдачи isAnswered=false), не приводят к пропуску отзывов.
+        
+        Args:
+            date_from: Дата начала периода (ISO или datetime, опционально)
+            page_size: Размер страницы (по умолчанию WB_PAGE_SIZE)
+            is_answered: Загружать отвеченные (True) или неотвеченные (False) отзывы
+        
+        Yields:
+            Списки отзывов в формате WB API (постранично)
+        """
+        page_size = page_size or settings.WB_PAGE_SIZE
+        params = {
+            "isAnswered": "true" if is_answered else "false",
+            "take": page_size,
+            "skip": 0,
+            "order": "dateAsc"
+        }
+        timestamp = self._to_timestamp(date_from)
+        if timestamp is not None:
+            params["dateFrom"] = timestamp
+        # ID отзывов с датой dateFrom, уже отданных вызывающему коду
+        boundary_ids: Set[str] = set()
+        
+        next_page: Optional[asyncio.Task] = asyncio.create_task(self._fetch_page(dict(params)))
+        try:
+            while next_page is not None:
+                try:
+                    page = await next_page
+                except httpx.HTTPError as e:
+                    logger.error(f"Ошибка при получении отзывов из WB API: {e}")
+                    raise
+                next_page = None
+                
+                is_full = len(page) >= params["take"]
+                page = [item for item in page if str(item.get("id")) not in boundary_ids]
+                if not page:
+                    return
+                
+                if is_full:
+                    last_timestamp = self._to_timestamp(page[-1].get("createdDate") or page[-1].get("date"))
+                    if last_timestamp is not None:
+                        # Продолжение с даты последнего отзыва без уже полученных отзывов с этой датой
+                        if params.get("dateFrom") != last_timestamp:
+                            boundary_ids = set()
+                        boundary_ids.update(
+                            str(item.get("id")) for item in page
+                            if self._to_timestamp(item.get("createdDate") or item.get("date")) == last_timestamp
+                        )
+                        params["dateFrom"] = last_timestamp
+                        params["skip"] = 0
+                        params["take"] = min(page_size + len(boundary_ids), WB_MAX_TAKE)
+                    else:
+                        params["skip"] += params["take"]
+                    if params["take"] > len(boundary_ids):
+                        next_page = asyncio.create_task(self._fetch_page(dict(params)))
+                    else:
+                        logger.warning(
+                            f"Больше {WB_MAX_TAKE} отзывов WB с одной датой ({last_timestamp}), загрузка прервана"
+                        )
+                
+                logger.info(f"Получена страница отзывов WB: {len(page)} шт.")
+                yield page
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+                await asyncio.gather(next_page, return_exceptions=True)
+    
     async def post_response(self, review_id: str, response_text: str) -> bool:
         """
         Публикация ответа на отзыв
@@ -78,21 +235,27 @@ class WBService:
                 "text": response_text
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30.0
+            async with http_client(WB_CLIENT) as client:
+                response = await send_with_rate_limit(
+                    self._limiter(WB_WRITE),
+                    lambda: client.post(
+                        url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=30.0
+                    ),
+                    stage=WB_PUBLISH
                 )
                 response.raise_for_status()
                 logger.info(f"Ответ успешно опубликован на отзыв {review_id}")
                 return True
                 
         except httpx.HTTPError as e:
+            record_failure(WB_PUBLISH)
             logger.error(f"Ошибка при публикации ответа на отзыв {review_id}: {e}")
             return False
         except Exception as e:
+            record_failure(WB_PUBLISH)
             logger.error(f"Неожиданная ошибка при публикации ответа: {e}")
             return False
     
@@ -117,6 +280,6 @@ class WBService:
             "pros": wb_review_data.get("pros", ""),
             "cons": wb_review_data.get("cons", ""),
             "author": wb_review_data.get("author", ""),
-            "date": wb_review_data.get("date", ""),
+            "date": wb_review_data.get("createdDate") or wb_review_data.get("date", ""),
         }
 
@@ -0,0 +1,61 @@
+"""Общие настройки тестов: окружение приложения и чистая БД для каждого теста"""
+import asyncio
+import os
+import tempfile
+
+# Настройки читаются при первом импорте config - окружение задается до импорта модулей приложения
+_workdir = tempfile.mkdtemp(prefix="wb_tests_")
+os.environ.update({
+    "WB_API_KEY": "test-wb-key",
+    "OPENROUTER_API_KEY": "test-openrouter-key",
+    "TELEGRAM_BOT_TOKEN": "123:test",
+    "TELEGRAM_CHAT_ID": "-1001",
+    "DATABASE_URL": f"sqlite:///{_workdir}/test.db",
+    "RESPONSE_CACHE_PATH": f"{_workdir}/response_cache.db",
+    "TRAFFIC_RECORD_PATH": "",
+    "TELEGRAM_DIGEST_ENABLED": "false",
+    "WB_READ_RATE_LIMIT": "0",
+    "WB_WRITE_RATE_LIMIT": "0",
+    "OPENROUTER_RATE_LIMIT": "0",
+    "TELEGRAM_CHAT_RATE_LIMIT": "0",
+    "TELEGRAM_GROUP_RATE_LIMIT": "0"
+})
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Пустая БД со схемой приложения; синхронная сессия для подготовки и проверок"""
+    from database.db import Base, SessionLocal, engine, init_db
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def mock_http():
+    """
+    Подмена общего HTTP-клиента: install(name, handler) направляет запросы
+    клиента в handler(request) -> httpx.Response (может быть корутиной)
+    """
+    from services import http_clients
+    installed = []
+    
+    def install(name: str, handler):
+        http_clients._clients[name] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        installed.append(name)
+    
+    yield install
+    for name in installed:
+        http_clients._clients.pop(name, None)
+
+
+def run(coro):
+    """Выполнение корутины в новом цикле событий"""
+    return asyncio.run(coro)
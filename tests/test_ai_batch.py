@@ -0,0 +1,68 @@
+"""Пакетная генерация ответов"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from config import settings
+from services import ai_service as ai_module
+from services.ai_service import AIService
+from services.http_clients import OPENROUTER_CLIENT
+from services.rate_limiter import FairShare
+from tests.conftest import run
+
+
+@pytest.fixture(autouse=True)
+def batch_settings(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "AI_BATCH_SIZE", 2)
+
+
+def make_items(count):
+    return [
+        {"id": str(n), "review_text": "Хороший товар" * (n + 1), "rating": 5, "pros": None, "cons": None}
+        for n in range(count)
+    ]
+
+
+def batch_openrouter(state, prompt_tokens=None):
+    """OpenRouter, отвечающий на каждый отзыв пакета и считающий одновременные запросы"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.05)
+        state["in_flight"] -= 1
+        
+        prompt = json.loads(request.content)["messages"][1]["content"]
+        reviews = json.loads(prompt.split("Отзывы (JSON):\n", 1)[1].split("\n\n", 1)[0])
+        body = {"choices": [{"message": {"content": json.dumps({r["id"]: f"Ответ {r['id']}" for r in reviews})}}]}
+        if prompt_tokens:
+            body["usage"] = {"prompt_tokens": prompt_tokens}
+        return httpx.Response(200, json=body)
+    
+    return handler
+
+
+def test_batches_run_concurrently_within_llm_share(monkeypatch, mock_http):
+    state = {"in_flight": 0, "max_in_flight": 0}
+    mock_http(OPENROUTER_CLIENT, batch_openrouter(state))
+    monkeypatch.setattr(ai_module, "llm_share", FairShare(2))
+    
+    results = run(AIService().generate_responses_batch(make_items(8)))
+    
+    assert results == {str(n): f"Ответ {n}" for n in range(8)}
+    assert state["max_in_flight"] == 2
+
+
+def test_batch_prompt_tokens_split_from_real_usage(mock_http):
+    state = {"in_flight": 0, "max_in_flight": 0}
+    mock_http(OPENROUTER_CLIENT, batch_openrouter(state, prompt_tokens=1000))
+    usage = {}
+    
+    run(AIService().generate_responses_batch(make_items(2), usage=usage))
+    
+    shares = [usage[review_id]["prompt_tokens"] for review_id in ("0", "1")]
+    # Более длинный отзыв получает большую долю, сумма - реальные токены пакета
+    assert shares[0] < shares[1]
+    assert 998 <= sum(shares) <= 1000
@@ -0,0 +1,148 @@
+"""Дайджест карточек отрицательных отзывов"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Review, Response, ResponseStatus, ReviewStatus, TelegramNotification
+from handlers.card_digest import CardDigest
+from handlers.review_handler import ReviewHandler
+from tests.conftest import run
+
+
+class FakeTelegram:
+    """Отправка карточек: дайджесты (с page) и отдельные карточки могут не проходить"""
+    
+    def __init__(self, digest_ok=True, card_ok=True):
+        self.digest_ok = digest_ok
+        self.card_ok = card_ok
+        self.sent = []
+    
+    async def send_review_card(self, review_data, draft_response, review_id, nm_id, page=None):
+        ok = self.digest_ok if page else self.card_ok
+        if not ok:
+            return None
+        self.sent.append((review_id, page))
+        return 1000 + len(self.sent)
+
+
+@pytest.fixture
+def reviews(db, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_DIGEST_WINDOW", 0.05)
+    monkeypatch.setattr(settings, "TELEGRAM_DIGEST_MAX_SIZE", 3)
+    ids = []
+    for n in range(3):
+        review = Review(wb_review_id=f"wb-{n}", rating=2, text="Плохо", status=ReviewStatus.PENDING)
+        db.add(review)
+        db.flush()
+        db.add(Response(review_id=review.id, text="Черновик", status=ResponseStatus.DRAFT))
+        ids.append(review.id)
+    db.commit()
+    return ids
+
+
+def notifications(db):
+    db.expire_all()
+    return {(n.review_id, n.message_id) for n in db.query(TelegramNotification)}
+
+
+def test_full_digest_flush_is_awaited_on_stop(db, reviews):
+    telegram = FakeTelegram()
+    
+    async def scenario():
+        digest = CardDigest()
+        for review_id in reviews:
+            digest.add(review_id, telegram)
+        # Досрочная отправка по размеру идет в фоне; stop() ее дожидается
+        assert digest._flushes
+        await digest.stop()
+    
+    run(scenario())
+    assert telegram.sent == [(reviews[0], (0, 3))]
+    assert {review_id for review_id, _ in notifications(db)} == set(reviews)
+
+
+def test_failed_digest_falls_back_to_single_cards(db, reviews):
+    telegram = FakeTelegram(digest_ok=False)
+    
+    async def scenario():
+        digest = CardDigest()
+        digest.add(reviews[0], telegram)
+        digest.add(reviews[1], telegram)
+        await digest.flush()
+    
+    run(scenario())
+    assert telegram.sent == [(reviews[0], None), (reviews[1], None)]
+    assert len(notifications(db)) == 2
+
+
+def test_unsent_cards_are_requeued(db, reviews):
+    telegram = FakeTelegram(digest_ok=False, card_ok=False)
+    
+    async def scenario():
+        digest = CardDigest()
+        digest.add(reviews[0], telegram)
+        digest.add(reviews[1], telegram)
+        await digest.flush()
+        assert digest._pending == reviews[:2]
+        
+        # Telegram снова доступен: отзывы уходят со следующим окном
+        telegram.digest_ok = telegram.card_ok = True
+        await digest.stop()
+    
+    run(scenario())
+    assert telegram.sent == [(reviews[0], (0, 2))]
+    assert {review_id for review_id, _ in notifications(db)} == set(reviews[:2])
+
+
+def test_recover_sends_cards_lost_on_restart(db, reviews, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_DIGEST_ENABLED", True)
+    old = datetime.utcnow() - timedelta(seconds=settings.SYNC_STRANDED_GRACE_SECONDS + 60)
+    for response in db.query(Response).filter(Response.review_id.in_(reviews[:2])):
+        response.created_at = old
+    # Карточка первого отзыва была отправлена до перезапуска, третий отзыв только что получил черновик
+    db.add(TelegramNotification(review_id=reviews[0], message_id="1", status="sent"))
+    db.commit()
+    telegram = FakeTelegram()
+    
+    async def scenario():
+        # Новый буфер после перезапуска пуст
+        digest = CardDigest()
+        assert await digest.recover(telegram) == 1
+        await digest.stop()
+        assert await digest.recover(telegram) == 0
+    
+    run(scenario())
+    assert telegram.sent == [(reviews[1], None)]
+
+
+def test_digest_page_of_deleted_review_is_reported(db, reviews):
+    db.add(TelegramNotification(review_id=reviews[0], message_id="500", status="sent"))
+    db.add(TelegramNotification(review_id=reviews[1], message_id="500", status="sent"))
+    db.commit()
+    db.query(Response).filter(Response.review_id == reviews[1]).delete()
+    db.query(Review).filter(Review.id == reviews[1]).delete()
+    db.commit()
+    replies = []
+    
+    async def reply_text(text):
+        replies.append(text)
+    
+    update = SimpleNamespace(callback_query=SimpleNamespace(
+        message=SimpleNamespace(message_id=500, reply_text=reply_text)
+    ))
+    services = SimpleNamespace(
+        sellers=SimpleNamespace(get=lambda seller_id: None),
+        ai_service=None,
+        template_responder=None,
+        telegram_service=None
+    )
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            await ReviewHandler(session, services)._handle_digest(1, update, None)
+    
+    run(scenario())
+    assert replies == ["Отзыв не найден"]
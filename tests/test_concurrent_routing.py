@@ -0,0 +1,62 @@
+"""Конкурентная маршрутизация отзывов пулом воркеров"""
+import asyncio
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Review, ReviewStatus
+from handlers.review_handler import ReviewHandler
+from services.container import ServiceContainer
+from tests.conftest import run
+
+REVIEWS = [
+    {"id": f"wb-{n}", "rating": 5, "text": f"Отзыв {n}", "createdDate": f"2026-01-01T10:00:{n:02d}Z"}
+    for n in range(12)
+]
+
+
+def process(monkeypatch, route_review, workers=None):
+    monkeypatch.setattr(settings, "AI_BATCH_SIZE", 1)
+    monkeypatch.setattr(ReviewHandler, "route_review", route_review)
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            return await ReviewHandler(session, ServiceContainer()).process_reviews(REVIEWS, workers=workers)
+    
+    return run(scenario())
+
+
+def test_workers_limit_concurrency(db, monkeypatch):
+    monkeypatch.setattr(settings, "REVIEW_PROCESSING_WORKERS", 3)
+    active, peak = [0], [0]
+    
+    async def route_review(self, review, draft=None, usage=None):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        review.status = ReviewStatus.PENDING
+        await self.db.commit()
+    
+    stats = process(monkeypatch, route_review)
+    
+    assert peak[0] == 3
+    assert stats.processed == 12
+    assert db.query(Review).filter(Review.status == ReviewStatus.PENDING).count() == 12
+
+
+def test_failing_review_does_not_stop_batch(db, monkeypatch):
+    async def route_review(self, review, draft=None, usage=None):
+        review.status = ReviewStatus.PENDING
+        if review.wb_review_id == "wb-3":
+            # Ошибка после изменения отзыва: сессия этого воркера откатывается
+            await self.db.flush()
+            raise RuntimeError("boom")
+        await asyncio.sleep(0)
+        await self.db.commit()
+    
+    stats = process(monkeypatch, route_review, workers=4)
+    
+    assert (stats.processed, stats.failed) == (11, 1)
+    statuses = {review.wb_review_id: review.status for review in db.query(Review)}
+    assert statuses.pop("wb-3") == ReviewStatus.NEW
+    assert set(statuses.values()) == {ReviewStatus.PENDING}
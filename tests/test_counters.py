@@ -0,0 +1,51 @@
+"""Счетчики записей по статусам"""
+from database.counters import REVIEWS, RESPONSES, read_counters, recount
+from database.models import Response, ResponseStatus, Review, ReviewStatus
+
+
+def add_review(db, wb_review_id="wb-1"):
+    review = Review(wb_review_id=wb_review_id, rating=2, text="Плохо")
+    db.add(review)
+    db.commit()
+    return review
+
+
+def test_new_records_are_counted(db):
+    review = add_review(db)
+    db.add(Response(review_id=review.id, text="Черновик"))
+    db.commit()
+    
+    counters = read_counters(db)
+    assert counters[REVIEWS] == {ReviewStatus.NEW.value: 1}
+    assert counters[RESPONSES] == {ResponseStatus.DRAFT.value: 1}
+
+
+def test_status_change_of_expired_object_is_counted(db):
+    review = add_review(db)
+    # После коммита атрибуты истекли: прежний статус в истории не загружен
+    db.expire(review)
+    review.status = ReviewStatus.PENDING
+    db.commit()
+    
+    assert read_counters(db)[REVIEWS] == {ReviewStatus.NEW.value: 0, ReviewStatus.PENDING.value: 1}
+
+
+def test_delete_of_expired_object_is_counted(db):
+    review = add_review(db)
+    db.expire(review)
+    db.delete(review)
+    db.commit()
+    
+    assert read_counters(db)[REVIEWS] == {ReviewStatus.NEW.value: 0}
+
+
+def test_counters_match_recount(db):
+    for n in range(3):
+        add_review(db, f"wb-{n}")
+    for review in db.query(Review).limit(2):
+        db.expire(review)
+        review.status = ReviewStatus.SKIPPED
+    db.commit()
+    
+    counted = read_counters(db)[REVIEWS]
+    assert {status: count for status, count in counted.items() if count} == recount(db)[REVIEWS]
@@ -0,0 +1,109 @@
+"""Сохранение отзывов из WB: дедупликация, отметка синхронизации, повторная маршрутизация"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Review, ReviewStatus
+from database.sync_state import get_sync_state
+from handlers.review_handler import ReviewHandler
+from services.container import ServiceContainer
+from tests.conftest import run
+
+SOURCE = "wb_feedbacks:test"
+
+
+def wb_review(n, day=1):
+    return {"id": f"wb-{n}", "rating": 5, "text": f"Отзыв {n}", "createdDate": f"2026-01-{day:02d}T10:00:00Z"}
+
+
+@pytest.fixture
+def services():
+    return ServiceContainer()
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    """Маршрутизация без внешних сервисов: отзыв переводится в PENDING"""
+    calls = []
+    
+    async def route_review(self, review, draft=None, usage=None):
+        calls.append(review.id)
+        review.status = ReviewStatus.PENDING
+        await self.db.commit()
+    
+    monkeypatch.setattr(ReviewHandler, "route_review", route_review)
+    return calls
+
+
+def ingest(services, reviews):
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            created = await ReviewHandler(session, services).ingest_reviews(reviews, sync_source=SOURCE)
+            return [review.wb_review_id for review in created]
+    
+    return run(scenario())
+
+
+def test_ingest_skips_known_and_repeated_reviews(db, services):
+    assert ingest(services, [wb_review(1), wb_review(2), wb_review(1)]) == ["wb-1", "wb-2"]
+    assert ingest(services, [wb_review(2), wb_review(3)]) == ["wb-3"]
+    assert db.query(Review).count() == 3
+
+
+def test_ingest_advances_sync_state_to_latest_review(db, services):
+    ingest(services, [wb_review(1, day=3), wb_review(2, day=5), wb_review(3, day=4)])
+    state = get_sync_state(db, SOURCE)
+    assert (state.last_review_date, state.last_review_id) == (datetime(2026, 1, 5, 10), "wb-2")
+    
+    # Отметка не сдвигается назад
+    ingest(services, [wb_review(4, day=2)])
+    db.expire_all()
+    assert get_sync_state(db, SOURCE).last_review_id == "wb-2"
+
+
+def test_stranded_new_reviews_are_routed(db, services, routed):
+    old = datetime.utcnow() - timedelta(seconds=settings.SYNC_STRANDED_GRACE_SECONDS + 60)
+    stranded = Review(wb_review_id="stranded", rating=5, status=ReviewStatus.NEW, created_at=old)
+    recent = Review(wb_review_id="recent", rating=5, status=ReviewStatus.NEW)
+    done = Review(wb_review_id="done", rating=5, status=ReviewStatus.PUBLISHED, created_at=old)
+    db.add_all([stranded, recent, done])
+    db.commit()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            return await ReviewHandler(session, services).route_stranded(workers=1)
+    
+    stats = run(scenario())
+    assert routed == [stranded.id]
+    assert stats.processed == 1
+    
+    # Повторный запуск: отзыв уже маршрутизирован
+    run(scenario())
+    assert routed == [stranded.id]
+
+
+def test_review_left_new_by_routing_error_is_retried(db, services, monkeypatch):
+    attempts = []
+    
+    async def flaky_route(self, review, draft=None, usage=None):
+        attempts.append(review.id)
+        if len(attempts) == 1:
+            raise RuntimeError("сбой маршрутизации")
+        review.status = ReviewStatus.PENDING
+        await self.db.commit()
+    
+    monkeypatch.setattr(ReviewHandler, "route_review", flaky_route)
+    monkeypatch.setattr(settings, "SYNC_STRANDED_GRACE_SECONDS", 0)
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            handler = ReviewHandler(session, services)
+            await handler.process_reviews([wb_review(1)], workers=1, sync_source=SOURCE)
+            await handler.route_stranded(workers=1)
+    
+    run(scenario())
+    db.expire_all()
+    assert len(attempts) == 2
+    assert db.query(Review).one().status == ReviewStatus.PENDING
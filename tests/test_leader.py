@@ -0,0 +1,82 @@
+"""Выбор ведущего процесса через аренду в БД"""
+import asyncio
+
+import pytest
+
+from config import settings
+from database.leases import get_lease, LEADER_LEASE
+from scheduler.leader import LeaderElection
+from tests.conftest import run
+
+
+@pytest.fixture(autouse=True)
+def fast_lease(monkeypatch):
+    monkeypatch.setattr(settings, "LEADER_LEASE_SECONDS", 0.6)
+    monkeypatch.setattr(settings, "LEADER_HEARTBEAT_INTERVAL", 0.1)
+
+
+async def _noop():
+    pass
+
+
+def test_single_leader_and_release_on_stop(db):
+    async def scenario():
+        first, second = LeaderElection(), LeaderElection()
+        await first.start(_noop, _noop)
+        await asyncio.sleep(0.2)
+        await second.start(_noop, _noop)
+        await asyncio.sleep(0.3)
+        assert first.is_leader and not second.is_leader
+        
+        await first.stop()
+        await asyncio.sleep(0.3)
+        assert second.is_leader
+        await second.stop()
+    
+    run(scenario())
+    db.expire_all()
+    assert get_lease(db, LEADER_LEASE).holder is not None
+
+
+def test_failover_after_lease_expires(db):
+    async def scenario():
+        first, second = LeaderElection(), LeaderElection()
+        await first.start(_noop, _noop)
+        await asyncio.sleep(0.2)
+        await second.start(_noop, _noop)
+        # Падение ведущего: продление прекращается, аренда не освобождается
+        first._task.cancel()
+        await asyncio.gather(first._task, return_exceptions=True)
+        await asyncio.sleep(0.2)
+        assert not second.is_leader
+        await asyncio.sleep(0.8)
+        assert second.is_leader
+        await second.stop()
+    
+    run(scenario())
+
+
+def test_slow_election_callback_does_not_block_heartbeat(db):
+    async def scenario():
+        released = asyncio.Event()
+        demoted = []
+        
+        async def slow_elected():
+            await released.wait()
+        
+        async def on_demoted():
+            demoted.append(True)
+        
+        first, second = LeaderElection(), LeaderElection()
+        await first.start(slow_elected, on_demoted)
+        await asyncio.sleep(0.2)
+        await second.start(_noop, _noop)
+        # Обработчик висит дольше срока аренды, но аренда продлевается
+        await asyncio.sleep(1.0)
+        assert first.is_leader and not second.is_leader
+        
+        await first.stop()
+        assert demoted == [True]
+        await second.stop()
+    
+    run(scenario())
@@ -0,0 +1,28 @@
+"""Профилирование запусков планировщика"""
+import logging
+
+from config import settings
+from scheduler import profiling
+
+
+def test_profile_is_written_when_enabled(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SCHEDULER_PROFILE_ENABLED", True)
+    monkeypatch.setattr(settings, "SCHEDULER_PROFILE_DIR", str(tmp_path))
+    
+    with caplog.at_level(logging.WARNING, logger=profiling.__name__):
+        with profiling.profile_run("check"):
+            sum(range(1000))
+    
+    reports = list(tmp_path.iterdir())
+    assert len(reports) == 1
+    if not profiling._pyinstrument_available():
+        # Замена профайлера не должна проходить незаметно
+        assert reports[0].suffix == ".prof"
+        assert "pyinstrument" in caplog.text
+
+
+def test_profiling_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_PROFILE_DIR", str(tmp_path / "profiles"))
+    with profiling.profile_run("check"):
+        pass
+    assert not (tmp_path / "profiles").exists()
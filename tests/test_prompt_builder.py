@@ -0,0 +1,69 @@
+"""Сокращение полей отзыва до бюджета промпта"""
+import pytest
+
+from config import settings
+from services.prompt_builder import (
+    TRUNCATION_MARK, PromptBuilder, estimate_tokens, fit_fields, truncate_text
+)
+
+WORDS = " ".join(f"слово{n}" for n in range(2000))
+
+
+def words(text):
+    return set(text.replace(TRUNCATION_MARK, " ").split())
+
+
+def test_empty_and_short_text_are_unchanged():
+    assert truncate_text("", 10) == ""
+    assert truncate_text("Хороший товар", 10) == "Хороший товар"
+    assert fit_fields({"review_text": None, "pros": ""}, 0) == ({"review_text": None, "pros": ""}, False)
+
+
+@pytest.mark.parametrize("max_tokens", [3, 10, 57, 300])
+def test_long_text_fits_budget_without_split_words(max_tokens):
+    result = truncate_text(WORDS, max_tokens)
+    
+    assert estimate_tokens(result) <= max_tokens
+    # Каждое слово результата - целое слово исходного текста
+    assert words(result) <= words(WORDS)
+
+
+def test_head_and_tail_are_kept():
+    result = truncate_text(WORDS, 100)
+    
+    assert result.startswith("слово0 ")
+    assert result.endswith(" слово1999")
+    assert TRUNCATION_MARK in result
+
+
+def test_short_fields_are_kept_and_long_share_the_rest():
+    fields = {"pros": "Удобный", "cons": WORDS, "review_text": WORDS}
+    
+    fitted, truncated = fit_fields(fields, 200)
+    
+    assert truncated
+    assert fitted["pros"] == "Удобный"
+    assert sum(estimate_tokens(value) for value in fitted.values()) <= 200
+
+
+def test_budget_smaller_than_fixed_prompt_keeps_rating_and_product(monkeypatch):
+    builder = PromptBuilder()
+    monkeypatch.setattr(settings, "AI_PROMPT_TOKEN_BUDGET", builder.template.static_tokens // 2)
+    
+    prompt = builder.build(WORDS, 2, pros=WORDS, cons=WORDS, product_info="Чайник электрический X100")
+    
+    assert prompt.truncated
+    assert "Рейтинг отзыва: 2/5" in prompt.text
+    assert "Чайник электрический X100" in prompt.text
+    assert "слово1000" not in prompt.text
+
+
+def test_product_name_is_not_truncated_with_long_review(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROMPT_TOKEN_BUDGET", PromptBuilder().template.static_tokens + 50)
+    product = "Набор кастрюль " + "из нержавеющей стали " * 10
+    
+    fields, truncated = PromptBuilder().fit({"review_text": WORDS, "product_info": product})
+    
+    assert truncated
+    assert fields["product_info"] == product
+    assert fields["review_text"] == ""
@@ -0,0 +1,126 @@
+"""Публикация ответов через outbox"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import (
+    PublishJob, PublishJobStatus, Response, ResponseStatus, Review, ReviewStatus
+)
+from handlers.publish_worker import PublishWorkerPool, enqueue_publish
+from tests.conftest import run
+
+
+class FakeWB:
+    def __init__(self, results):
+        self.results = list(results)
+        self.posted = []
+    
+    async def post_response(self, wb_review_id, text):
+        self.posted.append((wb_review_id, text))
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def job(db):
+    review = Review(wb_review_id="wb-1", rating=5, text="Отлично", status=ReviewStatus.NEW)
+    db.add(review)
+    db.flush()
+    response = Response(review_id=review.id, text="Спасибо!", status=ResponseStatus.DRAFT)
+    db.add(response)
+    db.flush()
+    job = enqueue_publish(db, review, response)
+    db.commit()
+    return job.id
+
+
+def process_once(wb):
+    """Один проход воркера: захват задачи и публикация"""
+    pool = PublishWorkerPool(workers=1)
+    pool.wb_service = wb
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            job_id = await pool._claim(session)
+            if job_id is not None:
+                await pool._publish(session, job_id)
+            return job_id
+    
+    return run(scenario())
+
+
+def test_published_job_is_done(db, job):
+    wb = FakeWB([True])
+    assert process_once(wb) == job
+    
+    db.expire_all()
+    published = db.get(PublishJob, job)
+    assert published.status == PublishJobStatus.DONE
+    assert db.get(Review, published.review_id).status == ReviewStatus.PUBLISHED
+    assert db.get(Response, published.response_id).status == ResponseStatus.PUBLISHED
+    assert wb.posted == [("wb-1", "Спасибо!")]
+
+
+def test_failed_job_backs_off_then_dies(db, job, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "OUTBOX_BACKOFF_BASE", 0)
+    wb = FakeWB([False, False])
+    
+    process_once(wb)
+    db.expire_all()
+    assert db.get(PublishJob, job).status == PublishJobStatus.PENDING
+    assert db.get(PublishJob, job).attempts == 1
+    
+    process_once(wb)
+    db.expire_all()
+    assert db.get(PublishJob, job).status == PublishJobStatus.DEAD
+    assert process_once(wb) is None
+
+
+@pytest.mark.parametrize("missing", [Review, Response])
+def test_job_with_missing_row_is_dead(db, job, missing):
+    stored = db.get(PublishJob, job)
+    row_id = stored.review_id if missing is Review else stored.response_id
+    db.delete(db.get(missing, row_id))
+    db.commit()
+    wb = FakeWB([])
+    
+    assert process_once(wb) == job
+    db.expire_all()
+    dead = db.get(PublishJob, job)
+    assert dead.status == PublishJobStatus.DEAD
+    assert dead.last_error
+    # Закрытая задача больше не захватывается
+    assert process_once(wb) is None
+    assert wb.posted == []
+
+
+def test_job_crashing_worker_ends_dead(db, job, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    pool = PublishWorkerPool(workers=1)
+    pool.wb_service = FakeWB([])
+    
+    async def claim():
+        async with AsyncSessionLocal() as session:
+            return await pool._claim(session)
+    
+    def expire_lease():
+        db.expire_all()
+        db.get(PublishJob, job).locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+    
+    # Воркер захватывает задачу и падает до публикации - аренда истекает
+    for attempt in (1, 2):
+        assert run(claim()) == job
+        db.expire_all()
+        assert db.get(PublishJob, job).attempts == attempt
+        expire_lease()
+    
+    assert process_once(pool.wb_service) == job
+    db.expire_all()
+    dead = db.get(PublishJob, job)
+    assert dead.status == PublishJobStatus.DEAD
+    assert dead.attempts == 3
+    assert pool.wb_service.posted == []
+    assert process_once(pool.wb_service) is None
@@ -0,0 +1,85 @@
+"""Ограничение частоты запросов и повтор при 429"""
+import time
+
+import httpx
+
+from config import settings
+from services import metrics
+from services.metrics import LLM, wait_stage
+from services.rate_limiter import (
+    RateLimiterRegistry, TokenBucket, TELEGRAM_CHAT, parse_retry_after, send_with_rate_limit
+)
+from tests.conftest import run
+
+
+def response(status, **headers):
+    return httpx.Response(status, headers=headers, request=httpx.Request("GET", "https://example.test"))
+
+
+def test_token_bucket_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - started
+    
+    # Первый запрос сразу, остальные четыре - по 1/20 с
+    assert 0.15 <= run(scenario()) < 0.5
+
+
+def test_pause_applies_without_rate_limit():
+    async def scenario():
+        bucket = TokenBucket(rate=0)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+    
+    assert run(scenario()) >= 0.19
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("not a date") is None
+
+
+def test_429_is_retried_after_pause():
+    replies = [response(429, **{"Retry-After": "0.2"}), response(200)]
+    observed = []
+    
+    def observe(stage, duration):
+        observed.append((stage, duration))
+    
+    metrics.add_stage_observer(observe)
+    
+    async def send():
+        return replies.pop(0)
+    
+    async def scenario():
+        started = time.monotonic()
+        result = await send_with_rate_limit(TokenBucket(rate=100), send, stage=LLM)
+        return result, time.monotonic() - started
+    
+    try:
+        result, elapsed = run(scenario())
+    finally:
+        metrics.remove_stage_observer(observe)
+    
+    assert result.status_code == 200
+    assert elapsed >= 0.2
+    # Пауза Retry-After попадает в ожидание ограничителя, а не во время запроса
+    assert [stage for stage, _ in observed] == [wait_stage(LLM), LLM, wait_stage(LLM), LLM]
+    assert max(duration for stage, duration in observed if stage == LLM) < 0.1
+    assert max(duration for stage, duration in observed if stage == wait_stage(LLM)) >= 0.2
+
+
+def test_group_chats_get_group_limit(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_RATE_LIMIT", 1.0)
+    monkeypatch.setattr(settings, "TELEGRAM_GROUP_RATE_LIMIT", 0.33)
+    registry = RateLimiterRegistry()
+    
+    assert registry.get(TELEGRAM_CHAT, "-1001234").rate == 0.33
+    assert registry.get(TELEGRAM_CHAT, "12345").rate == 1.0
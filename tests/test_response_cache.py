@@ -0,0 +1,113 @@
+"""Кэш ответов ИИ"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from services import response_cache as cache_module
+from services.response_cache import ResponseCache
+from tests.conftest import run
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), ttl=3600, memory_size=10, max_entries=100, variants=2)
+    yield cache
+    cache.close()
+
+
+def last_used(path, key):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT MAX(last_used_at) FROM response_cache WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_variants_rotate_after_n_puts(cache):
+    async def scenario():
+        assert await cache.get("k") is None
+        await cache.put("k", "первый")
+        assert await cache.get("k") is None
+        await cache.put("k", "второй")
+        return [await cache.get("k") for _ in range(3)]
+    
+    assert run(scenario()) == ["первый", "второй", "первый"]
+    assert cache.stats()["hits"] == 3
+
+
+def test_persistent_layer_survives_restart(cache, tmp_path):
+    async def fill():
+        await cache.put("k", "первый")
+        await cache.put("k", "второй")
+    
+    run(fill())
+    cache.close()
+    
+    reopened = ResponseCache(path=cache.path, ttl=3600, memory_size=10, max_entries=100, variants=2)
+    assert run(reopened.get("k")) == "первый"
+    reopened.close()
+
+
+def test_wal_enabled(cache):
+    run(cache.put("k", "ответ"))
+    with sqlite3.connect(cache.path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_reads_do_not_commit_until_batched(cache):
+    async def fill():
+        await cache.put("k", "первый")
+        await cache.put("k", "второй")
+    
+    run(fill())
+    written = last_used(cache.path, "k")
+    
+    cache._memory.clear()
+    run(cache.get("k"))
+    # Обращение отложено: запись - при следующем коммите или закрытии
+    assert last_used(cache.path, "k") == written
+    assert "k" in cache._touches
+    
+    cache.close()
+    assert last_used(cache.path, "k") > written
+
+
+def test_touch_batch_is_flushed(cache, monkeypatch):
+    monkeypatch.setattr(cache_module, "_TOUCH_BATCH", 2)
+    
+    async def scenario():
+        for key in ("a", "b"):
+            await cache.put(key, "1")
+            await cache.put(key, "2")
+        written = last_used(cache.path, "b")
+        cache._memory.clear()
+        await cache.get("a")
+        await cache.get("b")
+        return written
+    
+    written = run(scenario())
+    assert not cache._touches
+    assert last_used(cache.path, "b") > written
+
+
+def test_concurrent_puts_keep_all_variants(cache):
+    async def scenario():
+        await asyncio.gather(cache.put("k", "первый"), cache.put("k", "второй"))
+        return {await cache.get("k") for _ in range(2)}
+    
+    assert run(scenario()) == {"первый", "второй"}
+
+
+def test_puts_from_other_process_are_not_overwritten(cache):
+    # Второй процесс с тем же файлом кэша
+    other = ResponseCache(path=cache.path, ttl=3600, memory_size=10, max_entries=100, variants=2)
+    
+    async def scenario():
+        assert await cache.get("k") is None
+        assert await other.get("k") is None
+        await cache.put("k", "первый")
+        await other.put("k", "второй")
+    
+    run(scenario())
+    other.close()
+    with sqlite3.connect(cache.path) as db:
+        rows = db.execute("SELECT variant, text FROM response_cache WHERE key = 'k' ORDER BY variant").fetchall()
+    assert rows == [(0, "первый"), (1, "второй")]
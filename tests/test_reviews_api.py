@@ -0,0 +1,69 @@
+"""Список отзывов: keyset-пагинация и фильтры"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database.models import Review, ReviewStatus
+
+CREATED = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def reviews(db):
+    # Девять отзывов с одинаковым created_at и три более поздних
+    for n in range(12):
+        db.add(Review(
+            wb_review_id=f"wb-{n}",
+            rating=n % 5 + 1,
+            nm_id="100" if n % 2 else "200",
+            status=ReviewStatus.PENDING if n % 3 else ReviewStatus.NEW,
+            created_at=CREATED if n < 9 else CREATED.replace(hour=13 + n - 9)
+        ))
+    db.commit()
+    return {review.wb_review_id: review.id for review in db.query(Review)}
+
+
+def walk(limit, **params):
+    client = TestClient(main.app)
+    ids, cursor = [], None
+    while True:
+        response = client.get("/reviews", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        ids += [review["wb_review_id"] for review in body["reviews"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_pages_split_inside_equal_created_at(reviews):
+    ids = walk(limit=4)
+    
+    assert len(ids) == len(set(ids)) == 12
+    assert ids == walk(limit=100)
+
+
+@pytest.mark.parametrize("params", [
+    {"status": "pending"},
+    {"rating_min": 2, "rating_max": 4},
+    {"nm_id": "100", "status": "new"},
+    {"created_from": "2026-01-01T12:00:00", "created_to": "2026-01-01T14:00:00", "rating_min": 3},
+])
+def test_pages_with_filters_match_single_page(reviews, params):
+    assert walk(limit=2, **params) == walk(limit=100, **params)
+
+
+def test_timezone_aware_range_is_compared_in_utc(reviews):
+    # 15:00+03:00 = 12:00 UTC: отзывы с одинаковым created_at попадают в диапазон
+    ids = walk(limit=100, created_from="2026-01-01T15:00:00+03:00", created_to="2026-01-01T16:00:00+03:00")
+    
+    assert sorted(ids) == sorted(f"wb-{n}" for n in range(9))
+
+
+@pytest.mark.parametrize("cursor", ["garbage!", "bm90LWEtY3Vyc29y", "MjAyNi0wMS0wMVQxMjowMDowMHx4"])
+def test_invalid_cursor_is_rejected(reviews, cursor):
+    response = TestClient(main.app).get("/reviews", params={"cursor": cursor})
+    
+    assert response.status_code == 400
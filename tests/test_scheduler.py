@@ -0,0 +1,29 @@
+"""Остановка планировщика и выполняющейся проверки отзывов"""
+import asyncio
+
+from scheduler import tasks
+from tests.conftest import run
+
+
+def test_stop_scheduler_cancels_running_check(monkeypatch):
+    started = asyncio.Event()
+    finished = []
+    
+    async def slow_for_each_seller(services, process):
+        started.set()
+        await asyncio.sleep(60)
+        finished.append(True)
+    
+    monkeypatch.setattr(tasks, "for_each_seller", slow_for_each_seller)
+    
+    async def scenario():
+        check = asyncio.create_task(tasks.check_new_reviews(services=None))
+        await started.wait()
+        await tasks.stop_scheduler()
+        assert check.cancelled()
+        assert not tasks._running_checks
+        # Повторная остановка (on_demoted и завершение приложения) ничего не делает
+        await tasks.stop_scheduler()
+    
+    run(scenario())
+    assert finished == []
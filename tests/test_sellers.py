@@ -0,0 +1,115 @@
+"""Несколько кабинетов продавцов в одном процессе"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import database.sellers
+from config import settings
+from database.db import SessionLocal, get_insert
+
+from database.models import Review, Seller, SyncState
+from database.sellers import add_seller, ensure_default_seller, seller_sync_source
+from database.sync_state import WB_FEEDBACKS_SOURCE
+from services.rate_limiter import FairShare
+from services.sellers import SellerRegistry
+from services.wb_service import WBService
+from tests.conftest import run
+
+
+def test_default_seller_takes_over_legacy_reviews_and_watermark(db):
+    db.query(Seller).delete()
+    db.add(Review(wb_review_id="legacy", rating=5))
+    db.add(SyncState(source=WB_FEEDBACKS_SOURCE, last_review_date=datetime(2026, 1, 1), last_review_id="legacy"))
+    db.commit()
+    
+    seller = ensure_default_seller(db)
+    
+    assert db.query(Review).one().seller_id == seller.id
+    assert db.get(SyncState, seller_sync_source(seller.id)).last_review_id == "legacy"
+    assert ensure_default_seller(db) is None
+
+
+def test_no_default_seller_without_key_or_legacy_data(db, monkeypatch):
+    db.query(Seller).delete()
+    db.commit()
+    monkeypatch.setattr(settings, "WB_API_KEY", None)
+    
+    assert ensure_default_seller(db) is None
+    assert db.query(Seller).count() == 0
+
+
+def test_legacy_reviews_without_key_go_to_inactive_seller(db, monkeypatch):
+    db.query(Seller).delete()
+    db.add(Review(wb_review_id="legacy", rating=5))
+    db.commit()
+    monkeypatch.setattr(settings, "WB_API_KEY", None)
+    
+    seller = ensure_default_seller(db)
+    
+    assert not seller.is_active
+    assert db.query(Review).one().seller_id == seller.id
+
+
+def test_default_seller_created_once_by_concurrent_workers(db, monkeypatch):
+    db.query(Seller).delete()
+    db.add(Review(wb_review_id="legacy", rating=5))
+    db.commit()
+    
+    # Оба воркера проходят проверку "продавцов нет" до вставки
+    barrier = threading.Barrier(2)
+    
+    def get_insert_after_barrier(session):
+        barrier.wait(timeout=5)
+        return get_insert(session)
+    
+    monkeypatch.setattr(database.sellers, "get_insert", get_insert_after_barrier)
+    
+    def worker():
+        session = SessionLocal()
+        try:
+            return ensure_default_seller(session)
+        finally:
+            session.close()
+    
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(lambda _: worker(), range(2)))
+    
+    assert sum(result is not None for result in results) == 1
+    assert db.query(Seller).count() == 1
+
+
+def test_registry_rebuilds_client_when_key_changes(db):
+    seller = add_seller(db, "second", "key-1")
+    registry = SellerRegistry(WBService())
+    first = registry._update(seller)
+    assert registry._update(seller) is first
+    
+    seller.wb_api_key = "key-2"
+    db.commit()
+    assert registry._update(seller) is not first
+    assert registry.get(seller.id).api_key == "key-2"
+    assert registry.get(None) is registry.default
+
+
+def test_fair_share_serves_sellers_in_turn():
+    order = []
+    
+    async def scenario():
+        share = FairShare(1)
+        
+        async def request(seller_id, n):
+            async with share.slot(seller_id):
+                order.append(seller_id)
+                await asyncio.sleep(0.01)
+        
+        # Продавец 1 ставит в очередь много запросов раньше продавца 2
+        tasks = [asyncio.create_task(request(1, n)) for n in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request(2, n)) for n in range(2)]
+        await asyncio.gather(*tasks)
+    
+    run(scenario())
+    # Запросы продавца 2 не ждут всей очереди продавца 1
+    assert order.index(2) <= 2
+    assert order[-1] == 1
@@ -0,0 +1,76 @@
+"""Потоковая генерация ответа и обновление карточки"""
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Review
+from handlers.review_handler import ReviewHandler
+from services.ai_service import AIService
+from services.http_clients import OPENROUTER_CLIENT
+from tests.conftest import run
+
+
+def sse(*chunks):
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}" for chunk in chunks]
+    return ("\n\n".join(lines + ["data: [DONE]"]) + "\n\n").encode()
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_retries_after_429(mock_http):
+    requests = []
+    
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, content=sse("Спасибо", " за отзыв"))
+    
+    mock_http(OPENROUTER_CLIENT, handler)
+    chunks = run(collect(AIService().stream_response("Плохо", 2)))
+    
+    assert chunks == ["Спасибо", " за отзыв"]
+    assert len(requests) == 2
+
+
+class FakeAI:
+    async def stream_response(self, **kwargs):
+        for chunk in ("<b>Спа", "сибо</b>"):
+            yield chunk
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.edits = []
+    
+    async def edit_review_card(self, message_id, review_data, draft_response, review_id, nm_id,
+                               page=None, parse_mode="HTML"):
+        self.edits.append((draft_response, parse_mode))
+        return True
+
+
+def test_partial_stream_edits_are_sent_without_html(db, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_STREAM_EDIT_INTERVAL", 0)
+    review = Review(wb_review_id="wb-1", rating=2, text="Плохо")
+    db.add(review)
+    db.commit()
+    telegram = FakeTelegram()
+    services = SimpleNamespace(
+        sellers=SimpleNamespace(get=lambda seller_id: None),
+        ai_service=FakeAI(),
+        template_responder=None,
+        telegram_service=telegram
+    )
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            handler = ReviewHandler(session, services)
+            return await handler._stream_to_card(await session.get(Review, review.id), 100)
+    
+    assert run(scenario()) == "<b>Спасибо</b>"
+    assert telegram.edits == [("<b>Спа▌", None), ("<b>Спасибо</b>▌", None)]
@@ -0,0 +1,57 @@
+"""Шаблонные ответы на отзывы без текста: без обращения к ИИ"""
+import pytest
+
+from config import settings
+from database.db import AsyncSessionLocal
+from database.models import Response, ResponseRoute
+from handlers.review_handler import ReviewHandler
+from services.container import ServiceContainer
+from tests.conftest import run
+
+
+class StubAI:
+    """ИИ, записывающий тексты отзывов, для которых запрошен ответ"""
+    
+    def __init__(self):
+        self.requested = []
+    
+    async def generate_response(self, review_text, rating, pros=None, cons=None, product_info=None, usage=None):
+        self.requested.append(review_text)
+        return f"Ответ ИИ: {review_text}"
+    
+    async def generate_responses_batch(self, items, usage=None):
+        self.requested += [item["review_text"] for item in items]
+        return {item["id"]: f"Ответ ИИ: {item['review_text']}" for item in items}
+
+
+REVIEWS = [
+    {"id": "wb-1", "rating": 5, "text": "", "createdDate": "2026-01-01T10:00:00Z"},
+    {"id": "wb-2", "rating": 4, "createdDate": "2026-01-01T10:00:01Z"},
+    {"id": "wb-3", "rating": 5, "text": "Отличный чайник", "createdDate": "2026-01-01T10:00:02Z"},
+    {"id": "wb-4", "rating": 5, "pros": "Быстро закипает", "createdDate": "2026-01-01T10:00:03Z"},
+]
+
+
+@pytest.mark.parametrize("batch_size", [1, 5])
+def test_reviews_without_text_skip_llm(db, monkeypatch, batch_size):
+    monkeypatch.setattr(settings, "AI_BATCH_SIZE", batch_size)
+    monkeypatch.setattr(settings, "OUTBOX_ENABLED", True)
+    ai = StubAI()
+    services = ServiceContainer(ai_service=ai)
+    
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            return await ReviewHandler(session, services).process_reviews(REVIEWS, workers=1)
+    
+    stats = run(scenario())
+    
+    assert stats.processed == 4
+    # Ответы ИИ запрошены только для отзывов с текстом или плюсами
+    assert sorted(ai.requested) == ["", "Отличный чайник"]
+    routes = {response.review.wb_review_id: response.route for response in db.query(Response)}
+    assert routes == {
+        "wb-1": ResponseRoute.TEMPLATE,
+        "wb-2": ResponseRoute.TEMPLATE,
+        "wb-3": ResponseRoute.LLM,
+        "wb-4": ResponseRoute.LLM
+    }
@@ -0,0 +1,37 @@
+"""Хранение хронологий обработки отзывов"""
+from datetime import datetime, timedelta
+
+from config import settings
+from database.models import Review, ReviewTimeline
+from handlers.timeline import TimelineRecorder
+from tests.conftest import run
+
+
+def add_timelines(db, *ages_days):
+    review = Review(wb_review_id="wb-1", rating=5)
+    db.add(review)
+    db.flush()
+    for age in ages_days:
+        db.add(ReviewTimeline(
+            review_id=review.id,
+            started_at=datetime.utcnow() - timedelta(days=age),
+            total_ms=10,
+            spans="[]"
+        ))
+    db.commit()
+
+
+def test_prune_deletes_timelines_older_than_retention(db, monkeypatch):
+    monkeypatch.setattr(settings, "TIMELINE_RETENTION_DAYS", 30)
+    add_timelines(db, 1, 29, 31, 90)
+    
+    assert run(TimelineRecorder().prune()) == 2
+    assert db.query(ReviewTimeline).count() == 2
+
+
+def test_zero_retention_keeps_everything(db, monkeypatch):
+    monkeypatch.setattr(settings, "TIMELINE_RETENTION_DAYS", 0)
+    add_timelines(db, 1, 365)
+    
+    assert run(TimelineRecorder().prune()) == 0
+    assert db.query(ReviewTimeline).count() == 2
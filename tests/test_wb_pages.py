@@ -0,0 +1,99 @@
+"""Постраничная загрузка отзывов WB: граница страниц по ID отзыва"""
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from handlers.review_handler import ReviewHandler
+from services.http_clients import WB_CLIENT
+from services.wb_service import WBService
+from tests.conftest import run
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeFeedbacks:
+    """Выдача отзывов как в WB API: dateAsc, dateFrom включительно, take/skip"""
+    
+    def __init__(self, count, per_second):
+        self.reviews = [
+            {
+                "id": f"wb-{n}",
+                "rating": 5,
+                "createdDate": (START + timedelta(seconds=n // per_second)).isoformat().replace("+00:00", "Z")
+            }
+            for n in range(count)
+        ]
+        self.answered = set()
+        self.requests = 0
+        self.on_request = None
+    
+    def __call__(self, request):
+        self.requests += 1
+        if self.on_request:
+            self.on_request(self)
+        params = request.url.params
+        date_from = int(params.get("dateFrom", 0))
+        skip, take = int(params["skip"]), int(params["take"])
+        visible = [
+            review for review in self.reviews
+            if review["id"] not in self.answered
+            and WBService._to_timestamp(review["createdDate"]) >= date_from
+        ]
+        return httpx.Response(200, json={"data": {"feedbacks": visible[skip:skip + take]}})
+
+
+async def collect(pages):
+    return [review["id"] async for page in pages for review in page]
+
+
+def walk(mock_http, feedbacks, page_size=5):
+    mock_http(WB_CLIENT, feedbacks)
+    return run(collect(WBService(api_key="key").iter_review_pages(page_size=page_size)))
+
+
+def test_reviews_sharing_timestamp_across_pages_are_all_returned(mock_http):
+    feedbacks = FakeFeedbacks(25, per_second=7)
+    
+    ids = walk(mock_http, feedbacks)
+    
+    assert ids == [f"wb-{n}" for n in range(25)]
+
+
+def test_review_answered_mid_walk_does_not_hide_others(mock_http):
+    feedbacks = FakeFeedbacks(25, per_second=7)
+    
+    def answer_first_review(fake):
+        # Ответ на уже полученный отзыв публикуется после первой страницы
+        if fake.requests == 2:
+            fake.answered.add("wb-0")
+    
+    feedbacks.on_request = answer_first_review
+    
+    ids = walk(mock_http, feedbacks)
+    
+    assert ids == [f"wb-{n}" for n in range(25)]
+
+
+def test_stream_closes_pages_when_processing_fails(mock_http, monkeypatch):
+    closed = []
+    
+    async def pages():
+        try:
+            yield [{"id": "wb-1"}]
+            yield [{"id": "wb-2"}]
+        finally:
+            closed.append(True)
+    
+    async def fail(self, page, workers, sync_source):
+        raise RuntimeError("boom")
+    
+    monkeypatch.setattr(ReviewHandler, "_process_batch", fail)
+    
+    async def scenario():
+        try:
+            await ReviewHandler(None, None).process_review_stream(pages())
+        except RuntimeError:
+            # Генератор закрыт сразу, а не при завершении цикла событий
+            return list(closed)
+    
+    assert run(scenario()) == [True]
@@ -0,0 +1,74 @@
+"""Эндпоинт вебхука Telegram"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+from services.telegram_service import TelegramService
+from tests.conftest import run
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+UPDATE = {
+    "update_id": 1,
+    "callback_query": {
+        "id": "1",
+        "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+        "chat_instance": "1",
+        "data": "skip:1"
+    }
+}
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MODE", "webhook")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    service = TelegramService()
+    # Без lifespan: проверяется только эндпоинт, обновления остаются в очереди
+    main.app.state.services = SimpleNamespace(telegram_service=service)
+    yield service
+    del main.app.state.services
+
+
+def post(body, **headers):
+    client = TestClient(main.app)
+    if isinstance(body, dict):
+        return client.post(settings.TELEGRAM_WEBHOOK_PATH, json=body, headers=headers)
+    return client.post(settings.TELEGRAM_WEBHOOK_PATH, content=body, headers=headers)
+
+
+def test_accepts_update_with_secret(telegram):
+    response = post(UPDATE, **{SECRET_HEADER: "s3cret"})
+    assert response.status_code == 200
+    assert telegram.application.update_queue.qsize() == 1
+
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_HEADER: "wrong"}])
+def test_rejects_missing_or_wrong_secret(telegram, headers):
+    assert post(UPDATE, **headers).status_code == 403
+    assert telegram.application is None
+
+
+def test_rejects_updates_when_secret_not_configured(telegram, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+    assert post(UPDATE, **{SECRET_HEADER: ""}).status_code == 403
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"[1, 2]", b'{"message": {}}'])
+def test_malformed_update_is_bad_request(telegram, body):
+    response = post(body, **{SECRET_HEADER: "s3cret", "Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_webhook_mode_requires_secret(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MODE", "webhook")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+    
+    async def start():
+        async with main.lifespan(main.app):
+            pass
+    
+    with pytest.raises(RuntimeError, match="TELEGRAM_WEBHOOK_SECRET"):
+        run(start())